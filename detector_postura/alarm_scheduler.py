@@ -0,0 +1,191 @@
+import logging
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# --- PLANIFICADOR DE ALARMAS ---
+#
+# Un único hilo, creado una vez, atiende todas las alarmas. Duerme sobre una variable de condición
+# hasta que alguien llama a activar() (sin sondeo mientras no hay alarma) y entonces ejecuta un
+# episodio: avisa a los sinks, emite un pulso cada `intervalo_pulso` segundos durante `duracion`
+# segundos o hasta desactivar(), y después respeta un `enfriamiento` antes de poder empezar otro.
+# activar() y desactivar() se pueden llamar en cada frame: si el estado no cambia no toman el lock.
+#
+# La salida de la alarma va a sinks intercambiables (sonido, notificación de escritorio, log).
+# Cada sink tiene un `intervalo_minimo` entre episodios: si no ha pasado, ese sink no avisa.
+
+class AlarmSink:
+    """Destino de la alarma. Las subclases implementan los métodos que necesiten."""
+    intervalo_minimo = 0.0  # Segundos mínimos entre dos episodios avisados por este sink
+    disponible = True
+
+    def iniciar(self):
+        pass
+
+    def pulso(self):
+        pass
+
+    def detener(self, interrumpida):
+        pass
+
+
+class SoundSink(AlarmSink):
+    """Pitido en cada pulso (solo Windows, con winsound)."""
+    disponible = sys.platform.startswith('win')
+
+    def __init__(self, frecuencia=400, duracion_ms=100):
+        self.frecuencia = frecuencia
+        self.duracion_ms = duracion_ms
+
+    def pulso(self):
+        import winsound
+        winsound.Beep(self.frecuencia, self.duracion_ms)
+
+
+class DesktopNotificationSink(AlarmSink):
+    """Notificación del sistema al empezar un episodio (notify-send en Linux, osascript en macOS)."""
+    def __init__(self, titulo="Detector de Postura", mensaje="Corrige tu postura.", intervalo_minimo=60.0):
+        self.titulo = titulo
+        self.mensaje = mensaje
+        self.intervalo_minimo = intervalo_minimo
+        if sys.platform == 'darwin':
+            self._comando = ['osascript', '-e', f'display notification "{mensaje}" with title "{titulo}"']
+        elif shutil.which('notify-send'):
+            self._comando = ['notify-send', titulo, mensaje]
+        else:
+            self._comando = None
+        self.disponible = self._comando is not None
+
+    def iniciar(self):
+        # Popen no espera a que termine: el hilo de la alarma nunca se bloquea en el escritorio
+        subprocess.Popen(self._comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class LogSink(AlarmSink):
+    """Una línea de log al empezar y al interrumpirse cada episodio (nunca por pulso)."""
+    def __init__(self, intervalo_minimo=0.0):
+        self.intervalo_minimo = intervalo_minimo
+
+    def iniciar(self):
+        log.warning("Postura incorrecta: alarma activada.")
+
+    def detener(self, interrumpida):
+        if interrumpida:
+            log.warning("Alarma interrumpida.")
+
+
+def sinks_por_defecto():
+    """Sonido si la plataforma lo permite, notificación de escritorio si existe, y siempre el log."""
+    return [sink for sink in (SoundSink(), DesktopNotificationSink(), LogSink()) if sink.disponible]
+
+
+class AlarmScheduler(threading.Thread):
+    """Hilo único de alarma con episodios de `duracion` segundos y `enfriamiento` entre episodios."""
+    def __init__(self, sinks=None, duracion=5.0, intervalo_pulso=0.2, enfriamiento=10.0):
+        super().__init__(daemon=True, name='AlarmScheduler')
+        self.sinks = sinks_por_defecto() if sinks is None else list(sinks)
+        self.duracion = duracion
+        self.intervalo_pulso = intervalo_pulso
+        self.enfriamiento = enfriamiento
+
+        self._cond = threading.Condition()
+        self._solicitada = False
+        self._cerrar = False
+        self._fin_enfriamiento = 0.0
+        self._ultimo_aviso = {}  # id(sink) -> instante del último episodio avisado
+        self.sonando = False
+        self.episodios = 0
+
+    # --- API (cualquier hilo) ---
+
+    def activar(self):
+        """La postura es incorrecta: empieza un episodio si no hay uno en curso ni en enfriamiento."""
+        if self._solicitada:
+            return
+        with self._cond:
+            self._solicitada = True
+            self._cond.notify()
+
+    def desactivar(self):
+        """La postura vuelve a ser correcta: interrumpe el episodio en curso, si lo hay."""
+        if not self._solicitada:
+            return
+        with self._cond:
+            self._solicitada = False
+            self._cond.notify()
+
+    def cerrar(self, timeout=1.0):
+        with self._cond:
+            self._cerrar = True
+            self._cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+    # --- Hilo ---
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._cerrar:
+                    restante = self._fin_enfriamiento - time.monotonic()
+                    if self._solicitada and restante <= 0:
+                        break
+                    # Sin alarma pedida se duerme sin límite; en enfriamiento, solo lo que falte
+                    self._cond.wait(restante if self._solicitada else None)
+                if self._cerrar:
+                    return
+                self.sonando = True
+                self.episodios += 1
+
+            interrumpida = self._episodio()
+
+            with self._cond:
+                self.sonando = False
+                self._fin_enfriamiento = time.monotonic() + self.enfriamiento
+
+            if interrumpida is None:
+                return
+
+    def _episodio(self):
+        """Ejecuta un episodio. Devuelve si se interrumpió, o None si se cerró el planificador."""
+        ahora = time.monotonic()
+        sinks = [s for s in self.sinks if ahora - self._ultimo_aviso.get(id(s), float('-inf')) >= s.intervalo_minimo]
+        for sink in sinks:
+            self._ultimo_aviso[id(sink)] = ahora
+        self._emitir(sinks, 'iniciar')
+
+        fin = ahora + self.duracion
+        interrumpida = False
+        while True:
+            self._emitir(sinks, 'pulso')
+            with self._cond:
+                siguiente = min(time.monotonic() + self.intervalo_pulso, fin)
+                while self._solicitada and not self._cerrar and time.monotonic() < siguiente:
+                    self._cond.wait(siguiente - time.monotonic())
+                if self._cerrar:
+                    interrumpida = None
+                    break
+                if not self._solicitada:
+                    interrumpida = True
+                    break
+                if time.monotonic() >= fin:
+                    break
+
+        self._emitir(sinks, 'detener', bool(interrumpida))
+        return interrumpida
+
+    def _emitir(self, sinks, metodo, *args):
+        # Los sinks se llaman sin el lock: un pitido bloqueante no frena a activar()/desactivar()
+        for sink in list(sinks):
+            try:
+                getattr(sink, metodo)(*args)
+            except Exception as e:
+                # Un sink roto se retira para no repetir el error en cada pulso
+                log.error(f"Sink de alarma {type(sink).__name__} desactivado: {e}")
+                sinks.remove(sink)
+                if sink in self.sinks:
+                    self.sinks.remove(sink)
@@ -0,0 +1,117 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import sys
+from collections import deque
+
+# --- LOG DE LA APLICACIÓN ---
+#
+# Todos los módulos escriben con logging.getLogger(__name__) y configurar_logging() instala, una
+# sola vez y en el logger raíz, dos caminos:
+#   - Un RingBufferHandler con las últimas `capacidad` líneas ya formateadas, que la GUI lee a su
+#     ritmo (ver log_view.py). Registrar una línea es añadirla a un deque acotado: memoria constante.
+#   - Una cola acotada hacia un hilo propio que escribe en la consola y, si se indica, en un archivo
+#     rotativo. El hilo que registra (p.ej. el de inferencia) nunca espera a la terminal ni al disco;
+#     si la cola se llena, las líneas se descartan en lugar de bloquear.
+#
+# Formato de las líneas: "[ETIQUETA] mensaje". La etiqueta es el nivel (INFO, ALERTA para
+# warning, ERROR) o la que se pase con extra={'etiqueta': ...} (p.ej. ML en model_training).
+
+LOG_BUFFER_LINES = 2000 # Líneas que conserva el ring buffer en memoria
+LOG_QUEUE_SIZE = 10000 # Registros pendientes de escribir en consola/archivo antes de descartar
+LOG_FILE_MAX_BYTES = 1_000_000 # Tamaño a partir del cual se rota el archivo de log
+LOG_FILE_BACKUPS = 3 # Archivos rotados que se conservan (log.1, log.2, ...)
+
+_ETIQUETAS = {logging.WARNING: 'ALERTA'}
+
+class EtiquetaFormatter(logging.Formatter):
+    """Formatter que expone %(etiqueta)s: la de extra={'etiqueta': ...} o el nombre del nivel."""
+    def __init__(self, fmt='[%(etiqueta)s] %(message)s', datefmt=None):
+        super().__init__(fmt, datefmt)
+
+    def format(self, record):
+        if not hasattr(record, 'etiqueta'):
+            record.etiqueta = _ETIQUETAS.get(record.levelno, record.levelname)
+        return super().format(record)
+
+
+class RingBufferHandler(logging.Handler):
+    """Guarda las últimas `capacidad` líneas formateadas, numeradas para que un lector pida solo las nuevas."""
+    def __init__(self, capacidad=LOG_BUFFER_LINES):
+        super().__init__()
+        self._lineas = deque(maxlen=capacidad)
+        self._seq = 0
+
+    def emit(self, record):
+        try:
+            texto = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        # handle() ya tiene tomado el lock del handler
+        self._seq += 1
+        self._lineas.append(texto)
+
+    def leer_desde(self, seq):
+        """
+        Devuelve (ultimo_seq, líneas, perdidas): las líneas registradas después de `seq`, en orden.
+        Si el lector se quedó atrás más de la capacidad, `perdidas` cuenta las que ya no están.
+        """
+        with self.lock:
+            ultimo = self._seq
+            nuevas = min(ultimo - seq, len(self._lineas))
+            lineas = list(itertools.islice(reversed(self._lineas), nuevas))
+        lineas.reverse()
+        return ultimo, lineas, ultimo - seq - nuevas
+
+
+class _QueueHandlerSinBloqueo(logging.handlers.QueueHandler):
+    """QueueHandler sobre una cola acotada que descarta (y cuenta) los registros si está llena."""
+    descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_buffer = None
+
+def configurar_logging(ruta_archivo=None, capacidad=LOG_BUFFER_LINES, nivel=logging.INFO):
+    """
+    Configura el log de la aplicación y devuelve su RingBufferHandler. Con `ruta_archivo` se
+    añade un archivo rotativo (LOG_FILE_MAX_BYTES x LOG_FILE_BACKUPS). Solo la primera llamada
+    configura; las siguientes devuelven el mismo buffer.
+    """
+    global _buffer
+    if _buffer is not None:
+        return _buffer
+
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+
+    buffer = RingBufferHandler(capacidad)
+    buffer.setFormatter(EtiquetaFormatter())
+    raiz.addHandler(buffer)
+
+    consola = logging.StreamHandler(sys.stdout)
+    consola.setFormatter(EtiquetaFormatter())
+    sinks = [consola]
+    if ruta_archivo:
+        archivo = logging.handlers.RotatingFileHandler(ruta_archivo, maxBytes=LOG_FILE_MAX_BYTES,
+                                                       backupCount=LOG_FILE_BACKUPS, encoding='utf-8', delay=True)
+        archivo.setFormatter(EtiquetaFormatter('%(asctime)s %(threadName)s [%(etiqueta)s] %(message)s'))
+        sinks.append(archivo)
+
+    cola = queue.Queue(LOG_QUEUE_SIZE)
+    raiz.addHandler(_QueueHandlerSinBloqueo(cola))
+    listener = logging.handlers.QueueListener(cola, *sinks, respect_handler_level=True)
+    listener.start()
+    # Al salir se escribe lo que quede en la cola
+    atexit.register(listener.stop)
+
+    _buffer = buffer
+    return buffer
@@ -0,0 +1,291 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from app_logging import configurar_logging
+
+log = logging.getLogger(__name__)
+
+# --- BENCHMARK DEL BUCLE DE DETECCIÓN ---
+#
+# Mide, etapa por etapa y sin cámara, el mismo camino que recorre cada frame del detector:
+# flip -> cvtColor -> pose.process -> extraer features -> predicción RF -> PredictionFilter
+# -> draw_landmarks -> escalado para mostrar (FrameRenderer). Informa p50/p95/p99 por etapa y los
+# FPS totales, y guarda el resultado en JSON para comparar entre commits:
+#
+#   python benchmark.py --salida bench_base.json
+#   python benchmark.py --comparar bench_base.json      (código de salida 1 si hay regresiones)
+
+FRAME_SIZE = (640, 480)
+DISPLAY_SIZE = (700, 500)  # Tamaño mínimo de camera_label en el detector
+DEFAULT_FRAMES = 300
+DEFAULT_TOLERANCE = 0.15   # 15% más lento en p50 o p95 se considera regresión
+
+STAGES = ['flip', 'cvtColor', 'pose_process', 'extraer_features', 'rf_predict',
+          'prediction_filter', 'draw_landmarks', 'display_image']
+
+# Postura sentada aproximada (x, y) para los 33 landmarks de MediaPipe; se usa cuando el frame
+# no contiene una persona real, para que las etapas posteriores a pose también se midan.
+_POSE_SINTETICA = np.array([
+    (0.50, 0.30), (0.52, 0.27), (0.53, 0.27), (0.54, 0.27), (0.48, 0.27), (0.47, 0.27), (0.46, 0.27),
+    (0.56, 0.28), (0.44, 0.28), (0.52, 0.33), (0.48, 0.33), (0.62, 0.45), (0.38, 0.45), (0.66, 0.62),
+    (0.34, 0.62), (0.60, 0.75), (0.40, 0.75), (0.60, 0.78), (0.40, 0.78), (0.59, 0.78), (0.41, 0.78),
+    (0.59, 0.77), (0.41, 0.77), (0.57, 0.80), (0.43, 0.80), (0.58, 0.95), (0.42, 0.95), (0.58, 1.10),
+    (0.42, 1.10), (0.58, 1.12), (0.42, 1.12), (0.57, 1.15), (0.43, 1.15)], dtype=np.float32)
+
+def landmarks_sinteticos(rng):
+    """Devuelve un NormalizedLandmarkList de MediaPipe con una postura sentada con algo de ruido."""
+    from mediapipe.framework.formats import landmark_pb2
+
+    lista = landmark_pb2.NormalizedLandmarkList()
+    ruido = rng.normal(scale=0.005, size=_POSE_SINTETICA.shape)
+    for (x, y), (dx, dy) in zip(_POSE_SINTETICA, ruido):
+        lista.landmark.add(x=float(x + dx), y=float(y + dy), z=float(rng.normal(scale=0.05)), visibility=0.99)
+    return lista
+
+def generar_video_sintetico(ruta, n_frames=90, size=FRAME_SIZE, fps=30):
+    """Escribe un clip corto sintético (figura en movimiento sobre fondo con ruido) para medir la decodificación."""
+    writer = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    rng = np.random.default_rng(0)
+    w, h = size
+    for i in range(n_frames):
+        img = rng.integers(40, 80, size=(h, w, 3), dtype=np.uint8)
+        cx = int(w / 2 + 40 * np.sin(i / 10))
+        cv2.circle(img, (cx, h // 3), 40, (180, 160, 140), -1)
+        cv2.rectangle(img, (cx - 80, h // 3 + 50), (cx + 80, h - 20), (90, 60, 160), -1)
+        writer.write(img)
+    writer.release()
+    return ruta
+
+def frames_sinteticos(n, size=FRAME_SIZE, seed=0):
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+    for i in range(n):
+        yield np.roll(base, i * 3, axis=1)
+
+def frames_video(ruta, n):
+    cap = cv2.VideoCapture(ruta)
+    leidos = 0
+    while leidos < n:
+        success, img = cap.read()
+        if not success:
+            # Se vuelve al inicio para completar los frames pedidos
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, img = cap.read()
+            if not success:
+                break
+        leidos += 1
+        yield img
+    cap.release()
+
+def modelo_sintetico(seed=0):
+    """Entrena un Random Forest sobre la postura sintética con ruido, con el pipeline de features por defecto."""
+    from sklearn.ensemble import RandomForestClassifier
+    from feature_pipeline import FeaturePipeline
+
+    rng = np.random.default_rng(seed)
+    base = np.concatenate([_POSE_SINTETICA, np.zeros((len(_POSE_SINTETICA), 1), dtype=np.float32)], axis=1).reshape(-1)
+    X = np.concatenate([base + rng.normal(0.0, 0.01, size=(600, 99)), base + rng.normal(0.02, 0.01, size=(600, 99))])
+    y = np.array(['PERFECTO'] * 600 + ['MALO'] * 600)
+    pipeline = FeaturePipeline()
+    modelo = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced').fit(pipeline.transformar(X), y)
+    return pipeline.asociar(modelo)
+
+class _Display:
+    """Reproduce el render del detector (FrameRenderer sobre un QLabel) con Qt sin ventana."""
+    def __init__(self, size):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt6.QtWidgets import QApplication, QLabel
+        from frame_renderer import FrameRenderer
+
+        self._app = QApplication.instance() or QApplication([])
+        self._label = QLabel()
+        self._label.resize(*size)
+        self._renderer = FrameRenderer(self._label)
+
+    def __call__(self, img_rgb):
+        self._renderer.mostrar(img_rgb)
+
+def percentiles(muestras_ns):
+    """Resumen de una lista de duraciones en nanosegundos, en milisegundos."""
+    if not muestras_ns:
+        return None
+    ms = np.asarray(muestras_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'n': int(ms.size), 'media_ms': float(ms.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+def ejecutar(frames, modelo_rf, config_pose, warmup=10, con_display=True):
+    """
+    Recorre los frames por el camino del detector midiendo cada etapa. Devuelve {etapa: [ns]}.
+    La pose se estima con un PoseEstimator de `config_pose` (resolución de inferencia y ROI), como en el detector.
+    """
+    from fast_forest import FlatForest
+    from feature_pipeline import FeaturePipeline
+    from posture_logic import PoseEstimator, dibujar_landmarks_rgb, FeatureExtractor, nuevo_filtro_prediccion
+
+    pose = PoseEstimator.desde_config(config_pose)
+    clasificador = FlatForest.desde_sklearn(modelo_rf)
+    extractor = FeatureExtractor()
+    feature_stream = FeaturePipeline.del_modelo(clasificador).flujo()
+    prediction_filter = nuevo_filtro_prediccion(clasificador.classes_)
+    display = _Display(DISPLAY_SIZE) if con_display else None
+    rng = np.random.default_rng(1)
+
+    tiempos = {etapa: [] for etapa in STAGES + ['total']}
+    detecciones_reales = 0
+    reloj = time.perf_counter_ns
+
+    for i, img in enumerate(frames):
+        medir = i >= warmup
+        parciales = {}
+
+        t0 = reloj(); img = cv2.flip(img, 1); parciales['flip'] = reloj() - t0
+        t0 = reloj(); img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB); parciales['cvtColor'] = reloj() - t0
+        t0 = reloj(); results = pose.process(img_rgb); parciales['pose_process'] = reloj() - t0
+
+        pose_landmarks = results.pose_landmarks
+        if pose_landmarks:
+            detecciones_reales += medir
+        else:
+            pose_landmarks = landmarks_sinteticos(rng)
+
+        timestamp = i / 30.0
+        t0 = reloj()
+        features = feature_stream.transformar_uno(extractor.extraer(pose_landmarks.landmark), timestamp)
+        parciales['extraer_features'] = reloj() - t0
+        # Mismo camino que el detector: probabilidades al filtro, con ventana temporal e histéresis
+        t0 = reloj()
+        probabilidades = clasificador.predecir_proba_uno(features)
+        prediction = clasificador.classes_[probabilidades.argmax()]
+        parciales['rf_predict'] = reloj() - t0
+        t0 = reloj()
+        prediction_filter.add_prediction(prediction, probabilidades, timestamp)
+        prediction_filter.get_dominant_prediction()
+        parciales['prediction_filter'] = reloj() - t0
+        t0 = reloj(); dibujar_landmarks_rgb(img_rgb, pose_landmarks); parciales['draw_landmarks'] = reloj() - t0
+        if display:
+            t0 = reloj(); display(img_rgb); parciales['display_image'] = reloj() - t0
+
+        if medir:
+            for etapa, ns in parciales.items():
+                tiempos[etapa].append(ns)
+            tiempos['total'].append(sum(parciales.values()))
+
+    pose.close()
+    return tiempos, detecciones_reales
+
+def resumir(tiempos, detecciones_reales, fuente):
+    etapas = {etapa: percentiles(muestras) for etapa, muestras in tiempos.items()}
+    total = etapas['total']
+    return {
+        'fuente': fuente,
+        'etapas': etapas,
+        'fps': 1000.0 / total['media_ms'] if total else 0.0,
+        'frames_con_persona_real': detecciones_reales,
+    }
+
+def metadatos():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+def imprimir(resultado):
+    print(f"\n=== {resultado['fuente']} ===  ({resultado['fps']:.1f} FPS)")
+    print(f"{'etapa':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for etapa, stats in resultado['etapas'].items():
+        if stats:
+            print(f"{etapa:<20}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+def comparar(actual, base, tolerancia):
+    """Compara p50/p95 por etapa con un resultado anterior. Devuelve la lista de regresiones."""
+    regresiones = []
+    for fuente, resultado in actual['resultados'].items():
+        anterior = base.get('resultados', {}).get(fuente)
+        if not anterior:
+            continue
+        for etapa, stats in resultado['etapas'].items():
+            stats_base = anterior['etapas'].get(etapa)
+            if not stats or not stats_base:
+                continue
+            for clave in ('p50_ms', 'p95_ms'):
+                if stats_base[clave] > 0 and stats[clave] > stats_base[clave] * (1 + tolerancia):
+                    regresiones.append(f"{fuente}/{etapa} {clave}: {stats_base[clave]:.3f} -> {stats[clave]:.3f} ms")
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del bucle de detección (sin cámara).")
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help="Frames medidos por fuente.")
+    parser.add_argument('--video', help="Vídeo a usar; por defecto se genera un clip sintético corto.")
+    parser.add_argument('--perfil', help="Usar el modelo de este perfil en lugar de uno sintético.")
+    parser.add_argument('--sin-display', action='store_true', help="No medir la conversión/escalado de Qt.")
+    parser.add_argument('--salida', default='bench_output.json', help="Archivo JSON de resultados.")
+    parser.add_argument('--comparar', help="JSON de un benchmark anterior con el que comparar.")
+    parser.add_argument('--tolerancia', type=float, default=DEFAULT_TOLERANCE, help="Empeoramiento relativo permitido al comparar.")
+    args = parser.parse_args(argv)
+    configurar_logging()
+
+    from posture_logic import DEFAULT_PROFILE_CONFIG, PoseWarmup, cargar_config_perfil
+
+    if args.perfil:
+        from model_training import entrenar_modelo_rf
+        modelo_rf = entrenar_modelo_rf(args.perfil)
+        if modelo_rf is None:
+            log.error(f"El perfil '{args.perfil}' no tiene datos suficientes.")
+            return 1
+        # Misma configuración de pose (resolución, ROI, complejidad) que el detector para este perfil
+        config_pose = cargar_config_perfil(args.perfil)
+    else:
+        modelo_rf = modelo_sintetico()
+        config_pose = DEFAULT_PROFILE_CONFIG
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_video = args.video or generar_video_sintetico(os.path.join(tmp, 'clip_sintetico.avi'))
+        fuentes = {
+            'sintetico': frames_sinteticos(args.frames + 10),
+            'video': frames_video(ruta_video, args.frames + 10),
+        }
+        resultados = {}
+        for nombre, frames in fuentes.items():
+            tiempos, detecciones = ejecutar(frames, modelo_rf, config_pose, con_display=not args.sin_display)
+            resultados[nombre] = resumir(tiempos, detecciones, nombre)
+            imprimir(resultados[nombre])
+
+    salida = {'metadatos': dict(metadatos(), pose={clave: config_pose[clave] for clave in PoseWarmup.POSE_KEYS}),
+              'resultados': resultados}
+    with open(args.salida, 'w') as f:
+        json.dump(salida, f, indent=2)
+    log.info(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r') as f:
+            base = json.load(f)
+        regresiones = comparar(salida, base, args.tolerancia)
+        if regresiones:
+            log.warning("Regresiones de rendimiento:\n" + "\n".join("  " + r for r in regresiones))
+            return 1
+        log.info("Sin regresiones respecto a " + args.comparar)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import argparse
+import logging
+import os
+import sys
+
+from app_logging import configurar_logging
+from posture_logic import PERFILES_DIR
+from session_storage import convertir_perfil_a_npz
+
+log = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convierte las sesiones de entrenamiento JSON de los perfiles al formato binario .npz.")
+    parser.add_argument('perfiles', nargs='*', help="Perfiles a convertir (por defecto, todos).")
+    parser.add_argument('--borrar-json', action='store_true', help="Borra los JSON originales en lugar de renombrarlos a .json.bak.")
+    args = parser.parse_args(argv)
+    configurar_logging()
+
+    if not os.path.isdir(PERFILES_DIR):
+        log.error(f"No existe la carpeta {PERFILES_DIR}.")
+        return 1
+
+    perfiles = args.perfiles or sorted(d for d in os.listdir(PERFILES_DIR) if os.path.isdir(os.path.join(PERFILES_DIR, d)))
+    for nombre_perfil in perfiles:
+        ruta_perfil = os.path.join(PERFILES_DIR, nombre_perfil)
+        if not os.path.isdir(ruta_perfil):
+            log.error(f"El perfil '{nombre_perfil}' no existe.")
+            continue
+        convertidas = convertir_perfil_a_npz(ruta_perfil, conservar_json=not args.borrar_json)
+        log.info(f"Perfil '{nombre_perfil}': {convertidas} sesiones convertidas a .npz")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# --- MOTOR DE INFERENCIA RÁPIDA PARA RANDOM FOREST ---
+#
+# sklearn tiene un coste fijo alto por llamada (validación, hilos, un árbol cada vez) que con
+# una sola muestra por frame domina sobre el recorrido de los árboles. Aquí el bosque se
+# aplana en arrays NumPy contiguos y se recorren TODOS los árboles a la vez, un nivel por
+# iteración, así el coste es ~profundidad del árbol en operaciones vectorizadas. Cada operación
+# abarca todos los árboles: ~15 µs por frame con 25 árboles de profundidad 8, pero ~150 µs con
+# 100 árboles sin límite de profundidad (~30 niveles).
+#
+# El bosque aplanado se puede exportar (FlatForest.guardar) a una carpeta de arrays .npy más un
+# JSON con la versión del formato, las clases, la configuración del pipeline de features y
+# metadatos libres. FlatForest.cargar la abre con np.load(mmap_mode='r'), sin pickle ni sklearn:
+#
+#   <ruta>/modelo.json     versión, max_depth, n_features_in_, feature_pipeline_, metadatos
+#   <ruta>/<array>.npy     feature, threshold, children, value, roots, classes
+
+FOREST_EXPORT_VERSION = 1
+EXPORT_META_FILE = 'modelo.json'
+
+class FlatForest:
+    """
+    Bosque aplanado: cada nodo de cada árbol ocupa una posición de los arrays globales.
+    Las hojas apuntan a sí mismas, de modo que seguir iterando tras llegar a una hoja no cambia nada.
+    """
+    def __init__(self, feature, threshold, children, value, roots, classes, max_depth):
+        self.feature = feature        # (n_nodos,) int: feature a comparar (0 en hojas)
+        self.threshold = threshold    # (n_nodos,) float64 (float16 si se exportó así): umbral de la comparación
+        self.children = children      # (n_nodos, 2) int: [izquierdo (<=), derecho (>)]
+        self.value = value            # (n_nodos, n_clases) float64: probabilidades de la hoja
+        self.is_leaf = children[:, 0] == np.arange(len(children))
+        self.roots = roots            # (n_arboles,) índice de la raíz de cada árbol
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_features_in_ = int(feature.max()) + 1 if len(feature) else 0
+        self.feature_pipeline_ = None  # Configuración de FeaturePipeline con la que se entrenó
+        self.metadatos_ = {}           # Datos libres guardados con la exportación (p.ej. la huella del entrenamiento)
+
+    @classmethod
+    def desde_sklearn(cls, modelo):
+        """Construye el bosque aplanado a partir de un RandomForestClassifier ya entrenado."""
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimador in modelo.estimators_:
+            tree = estimador.tree_
+            n = tree.node_count
+            nodos = np.arange(n)
+            hoja = tree.children_left == -1
+
+            izquierdo = np.where(hoja, nodos, tree.children_left) + offset
+            derecho = np.where(hoja, nodos, tree.children_right) + offset
+
+            # Igual que DecisionTreeClassifier.predict_proba: se normaliza el valor de cada nodo
+            valor = tree.value[:, 0, :].astype(np.float64)
+            normalizador = valor.sum(axis=1, keepdims=True)
+            normalizador[normalizador == 0.0] = 1.0
+
+            features.append(np.where(hoja, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(np.stack([izquierdo, derecho], axis=1))
+            values.append(valor / normalizador)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        flat = cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(modelo.classes_),
+            max_depth=max_depth,
+        )
+        flat.n_features_in_ = modelo.n_features_in_
+        flat.feature_pipeline_ = getattr(modelo, 'feature_pipeline_', None)
+        return flat
+
+    def guardar(self, ruta, umbrales_float16=False, metadatos=None):
+        """
+        Exporta el bosque a la carpeta `ruta` (se reemplaza entera si ya existía). Con
+        `umbrales_float16` los umbrales ocupan 2 bytes en lugar de 8; las predicciones pueden
+        cambiar en muestras que caen justo en el umbral.
+        """
+        threshold = self.threshold
+        if umbrales_float16:
+            limite = np.finfo(np.float16).max
+            threshold = np.clip(threshold, -limite, limite).astype(np.float16)
+        # Índices en int32: la mitad de disco que intp y se convierten al cargar
+        arrays = {
+            'feature': self.feature.astype(np.int32),
+            'threshold': threshold,
+            'children': self.children.astype(np.int32),
+            'value': self.value,
+            'roots': self.roots.astype(np.int32),
+            'classes': self.classes_.astype(str),
+        }
+        meta = {'version': FOREST_EXPORT_VERSION, 'max_depth': int(self.max_depth),
+                'n_features_in_': int(self.n_features_in_), 'feature_pipeline_': self.feature_pipeline_,
+                'metadatos': dict(metadatos or {})}
+
+        # Se escribe en una carpeta temporal y se cambia por la anterior al final: un cierre a
+        # mitad de escritura no deja una exportación a medias
+        temporal, anterior = ruta + '.tmp', ruta + '.old'
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for nombre, array in arrays.items():
+            np.save(os.path.join(temporal, nombre + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(temporal, EXPORT_META_FILE), 'w') as f:
+            json.dump(meta, f, indent=4)
+        shutil.rmtree(anterior, ignore_errors=True)
+        if os.path.exists(ruta):
+            os.replace(ruta, anterior)
+        os.replace(temporal, ruta)
+        shutil.rmtree(anterior, ignore_errors=True)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Abre un bosque exportado con guardar(). Umbrales y probabilidades quedan mapeados desde disco."""
+        with open(os.path.join(ruta, EXPORT_META_FILE), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != FOREST_EXPORT_VERSION:
+            raise ValueError(f"versión de modelo exportado no soportada: {meta.get('version')}")
+
+        def leer(nombre):
+            return np.load(os.path.join(ruta, nombre + '.npy'), mmap_mode='r')
+
+        flat = cls(
+            feature=leer('feature').astype(np.intp),
+            threshold=leer('threshold'),
+            children=leer('children').astype(np.intp),
+            value=leer('value'),
+            roots=leer('roots').astype(np.intp),
+            classes=np.array(leer('classes')),
+            max_depth=meta['max_depth'],
+        )
+        flat.n_features_in_ = meta['n_features_in_']
+        flat.feature_pipeline_ = meta['feature_pipeline_']
+        flat.metadatos_ = meta['metadatos']
+        return flat
+
+    def _hojas(self, x):
+        """Devuelve el índice de la hoja alcanzada en cada árbol para una muestra 1D float32."""
+        nodos = self.roots
+        for nivel in range(self.max_depth):
+            nodos = self.children[nodos, (x[self.feature[nodos]] > self.threshold[nodos]).view(np.int8)]
+            # Comprobar si todos terminaron cuesta casi lo mismo que un nivel: solo cada 4
+            if nivel & 3 == 3 and self.is_leaf[nodos].all():
+                break
+        return nodos
+
+    def predecir_proba_uno(self, x):
+        """Probabilidades por clase para una sola muestra (vector de features)."""
+        # sklearn compara los features en float32 contra umbrales float64
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        hojas = self._hojas(x)
+        # Suma en el mismo orden que sklearn (árbol a árbol) para obtener exactamente el mismo resultado
+        return np.add.reduce(self.value[hojas], axis=0) / len(self.roots)
+
+    def predecir_uno(self, x):
+        """Clase predicha para una sola muestra."""
+        return self.classes_[np.argmax(self.predecir_proba_uno(x))]
+
+    def predict_proba(self, X):
+        """Equivalente a RandomForestClassifier.predict_proba para un lote pequeño (n_muestras, n_features)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        filas = np.arange(len(X))[:, None]
+        nodos = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for nivel in range(self.max_depth):
+            nodos = self.children[nodos, (X[filas, self.feature[nodos]] > self.threshold[nodos]).view(np.int8)]
+            if nivel & 3 == 3 and self.is_leaf[nodos].all():
+                break
+
+        # (n_arboles, n_muestras, n_clases) -> suma árbol a árbol
+        return np.add.reduce(self.value[nodos.T], axis=0) / len(self.roots)
+
+    def predict(self, X):
+        """Equivalente a RandomForestClassifier.predict."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
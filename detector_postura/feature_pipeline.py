@@ -0,0 +1,218 @@
+import numpy as np
+
+from temporal_features import DEFAULT_TEMPORAL_CONFIG, TEMPORAL_FEATURES, TemporalWindow
+
+# --- PIPELINE DE FEATURES RELATIVAS AL CUERPO ---
+#
+# Las sesiones guardan los landmarks crudos de MediaPipe (33 x X, Y, Z en coordenadas de imagen),
+# y el modelo no los ve tal cual: este pipeline los transforma, todo vectorizado sobre (N, 99):
+#   1. Normalización: se restan el punto medio de los hombros y se divide por el ancho de hombros,
+#      así las features no dependen de dónde se siente el usuario ni de su distancia a la cámara.
+#   2. Subconjunto: solo los landmarks de `landmarks` (por defecto, tren superior; piernas y pies
+#      suelen estar ocultos bajo la mesa y solo aportan ruido).
+#   3. Features geométricas compactas: ángulos de cuello y torso, adelantamiento de la cabeza, etc.
+#   4. Opcional (`temporal`): estadísticas de una ventana de frames recientes (ver temporal_features.py).
+#      Dependen del orden de los frames, así que se calculan con un FeatureStream por flujo de vídeo
+#      (flujo()) o con transformar_secuencia() sobre una secuencia completa, no con transformar().
+#
+# La configuración usada se guarda con el modelo (atributo `feature_pipeline_`), de modo que el
+# detector aplica exactamente la misma transformación con la que se entrenó.
+
+FEATURE_PIPELINE_VERSION = 1
+NUM_LANDMARKS = 33
+
+# Índices de MediaPipe Pose
+NARIZ = 0
+OREJA_IZQ, OREJA_DER = 7, 8
+HOMBRO_IZQ, HOMBRO_DER = 11, 12
+CADERA_IZQ, CADERA_DER = 23, 24
+
+# Nariz, ojos, orejas, boca, hombros y codos
+UPPER_BODY_LANDMARKS = [0, 2, 5, 7, 8, 9, 10, 11, 12, 13, 14]
+
+DEFAULT_FEATURE_CONFIG = {
+    'normalizar': True,                     # Relativas al centro y ancho de los hombros
+    'landmarks': UPPER_BODY_LANDMARKS,      # Landmarks que entran como coordenadas (None = los 33)
+    'incluir_z': True,                      # Incluir la profundidad estimada de cada landmark
+    'geometricas': True,                    # Añadir GEOMETRIC_FEATURES
+    'temporal': None,                       # Ventana temporal: None, true (valores por defecto) o DEFAULT_TEMPORAL_CONFIG parcial
+}
+
+GEOMETRIC_FEATURES = (
+    'inclinacion_torso',     # Ángulo (rad) de caderas->hombros respecto a la vertical
+    'inclinacion_cuello',    # Ángulo (rad) de hombros->orejas respecto a la vertical
+    'cabeza_adelantada_x',   # Desplazamiento horizontal orejas-hombros, en anchos de hombro
+    'cabeza_adelantada_z',   # Desplazamiento en profundidad orejas-hombros, en anchos de hombro
+    'altura_cabeza',         # Altura de la nariz sobre los hombros, en anchos de hombro
+    'inclinacion_hombros',   # Diferencia de altura entre hombros, en anchos de hombro
+    'longitud_torso',        # Distancia hombros-caderas, en anchos de hombro (se acorta al encorvarse)
+    'ancho_hombros',         # Ancho de hombros en coordenadas de imagen (crece al acercarse a la pantalla)
+)
+
+class FeaturePipeline:
+    """Transforma landmarks crudos (N, 33 * componentes) en el vector de features del modelo."""
+    def __init__(self, config=None):
+        config = dict(DEFAULT_FEATURE_CONFIG, **(config or {}))
+        version = config.pop('version', FEATURE_PIPELINE_VERSION)
+        if version != FEATURE_PIPELINE_VERSION:
+            raise ValueError(f"versión del pipeline de features no soportada: {version}")
+
+        landmarks = config['landmarks']
+        self.landmarks = np.arange(NUM_LANDMARKS) if landmarks is None else np.asarray(landmarks, dtype=np.intp)
+        if self.landmarks.size and (self.landmarks.min() < 0 or self.landmarks.max() >= NUM_LANDMARKS):
+            raise ValueError(f"índices de landmark fuera de rango: {landmarks}")
+        self.normalizar = bool(config['normalizar'])
+        self.incluir_z = bool(config['incluir_z'])
+        self.geometricas = bool(config['geometricas'])
+        temporal = config['temporal']
+        self.temporal = dict(DEFAULT_TEMPORAL_CONFIG, **(temporal if isinstance(temporal, dict) else {})) if temporal else None
+        # Features de un frame; con ventana temporal, el modelo recibe además su media y varianza y TEMPORAL_FEATURES
+        self.n_features_frame = len(self.landmarks) * (3 if self.incluir_z else 2) + (len(GEOMETRIC_FEATURES) if self.geometricas else 0)
+        self.n_features = self.n_features_frame * 3 + len(TEMPORAL_FEATURES) if self.temporal else self.n_features_frame
+
+    @property
+    def config(self):
+        """Configuración serializable (JSON) que se guarda con el modelo."""
+        return {'version': FEATURE_PIPELINE_VERSION, 'normalizar': self.normalizar,
+                'landmarks': self.landmarks.tolist(), 'incluir_z': self.incluir_z, 'geometricas': self.geometricas,
+                'temporal': self.temporal}
+
+    @classmethod
+    def del_modelo(cls, modelo):
+        """Pipeline con el que se entrenó un modelo (RandomForestClassifier o FlatForest)."""
+        return cls(modelo.feature_pipeline_)
+
+    def asociar(self, modelo):
+        """Guarda la configuración en el modelo entrenado, para reconstruir el pipeline al detectar."""
+        modelo.feature_pipeline_ = self.config
+        return modelo
+
+    def nombres(self):
+        """Nombre de cada feature de salida, en orden."""
+        ejes = ('x', 'y', 'z') if self.incluir_z else ('x', 'y')
+        nombres = [f"lm{i}_{eje}" for i in self.landmarks for eje in ejes]
+        if self.geometricas:
+            nombres.extend(GEOMETRIC_FEATURES)
+        if self.temporal:
+            nombres = nombres + [f"{n}_media" for n in nombres] + [f"{n}_var" for n in nombres] + list(TEMPORAL_FEATURES)
+        return nombres
+
+    def transformar(self, X):
+        """
+        Features de cada frame por separado (sin la ventana temporal):
+        (N, 33 * c) o (33 * c,) float -> (N, n_features_frame) o (n_features_frame,) float32. c = 3 ó 4 (con visibilidad).
+        """
+        salida, _ = self._transformar_frames(X)
+        return salida
+
+    def _transformar_frames(self, X):
+        """Features por frame y, si hay ventana temporal, sus señales (N, N_SENALES)."""
+        X = np.asarray(X, dtype=np.float32)
+        uno = X.ndim == 1
+        puntos = X.reshape(1 if uno else len(X), NUM_LANDMARKS, -1)[:, :, :3]
+
+        centro = (puntos[:, HOMBRO_IZQ] + puntos[:, HOMBRO_DER]) * 0.5
+        ancho = np.linalg.norm(puntos[:, HOMBRO_IZQ, :2] - puntos[:, HOMBRO_DER, :2], axis=1)
+        ancho = np.maximum(ancho, 1e-6)
+
+        coordenadas = puntos[:, self.landmarks]
+        if self.normalizar:
+            coordenadas = (coordenadas - centro[:, None, :]) / ancho[:, None, None]
+        if not self.incluir_z:
+            coordenadas = coordenadas[:, :, :2]
+        partes = [coordenadas.reshape(len(puntos), -1)]
+        if self.geometricas:
+            partes.append(features_geometricas(puntos, centro, ancho))
+
+        salida = np.concatenate(partes, axis=1).astype(np.float32, copy=False)
+        senales = senales_temporales(puntos, centro, ancho, self.temporal['umbral_encorvado']) if self.temporal else None
+        if uno:
+            return salida[0], None if senales is None else senales[0]
+        return salida, senales
+
+    def transformar_uno(self, vector):
+        """Atajo para un solo frame (p.ej. la salida de FeatureExtractor.extraer), sin ventana temporal."""
+        return self.transformar(vector)
+
+    def flujo(self):
+        """FeatureStream para transformar los frames de una cámara, vídeo o grabación en orden."""
+        return FeatureStream(self)
+
+    def transformar_secuencia(self, X, timestamps=None):
+        """
+        Features del modelo para una secuencia ordenada de frames de un mismo flujo (N, 33 * c).
+        Sin `timestamps` (sesiones guardadas) se asume el ritmo 'fps_sesiones' de la config temporal.
+        """
+        if not self.temporal:
+            return self.transformar(X)
+        if timestamps is None:
+            timestamps = np.arange(len(X)) / self.temporal['fps_sesiones']
+        return self.flujo().transformar_lote(X, timestamps)
+
+
+class FeatureStream:
+    """
+    Aplica un FeaturePipeline a los frames de un flujo, en orden. Sin ventana temporal equivale a
+    transformar(); con ella mantiene la TemporalWindow del flujo (una por cámara, vídeo o grabación).
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.ventana = None
+        if pipeline.temporal:
+            self.ventana = TemporalWindow(pipeline.n_features_frame, pipeline.temporal['ventana'], pipeline.temporal['hueco_max'])
+            self._salida = np.zeros(pipeline.n_features, dtype=np.float32)
+
+    def transformar_uno(self, vector, timestamp):
+        """Features del modelo para el siguiente frame. Con ventana temporal, el vector se reutiliza en la siguiente llamada."""
+        base, senales = self.pipeline._transformar_frames(vector)
+        if self.ventana is None:
+            return base
+        salida = self._salida
+        salida[:len(base)] = base
+        salida[len(base):] = self.ventana.actualizar(base, senales, timestamp)
+        return salida
+
+    def transformar_lote(self, X, timestamps):
+        """Como transformar_uno() sobre los frames (N, 33 * c) de un lote, vectorizado: (N, n_features)."""
+        if len(X) == 0:
+            return np.empty((0, self.pipeline.n_features), dtype=np.float32)
+        base, senales = self.pipeline._transformar_frames(np.asarray(X).reshape(len(X), -1))
+        if self.ventana is None:
+            return base
+        return np.concatenate([base, self.ventana.actualizar_lote(base, senales, timestamps)], axis=1)
+
+    def reset(self):
+        if self.ventana is not None:
+            self.ventana.reset()
+
+
+def senales_temporales(puntos, centro, ancho, umbral_encorvado):
+    """Señales (N, N_SENALES) que usa TemporalWindow: posición de cabeza y hombros, ancho y si está encorvado."""
+    orejas = (puntos[:, OREJA_IZQ] + puntos[:, OREJA_DER]) * 0.5
+    altura_cabeza = (centro[:, 1] - puntos[:, NARIZ, 1]) / ancho
+    return np.stack([orejas[:, 0], orejas[:, 1], centro[:, 0], centro[:, 1], ancho,
+                     altura_cabeza < umbral_encorvado], axis=1).astype(np.float64)
+
+def features_geometricas(puntos, centro=None, ancho=None):
+    """GEOMETRIC_FEATURES para puntos (N, 33, 3). `centro` y `ancho` de hombros si ya se calcularon."""
+    hombro_izq, hombro_der = puntos[:, HOMBRO_IZQ], puntos[:, HOMBRO_DER]
+    if centro is None:
+        centro = (hombro_izq + hombro_der) * 0.5
+    if ancho is None:
+        ancho = np.maximum(np.linalg.norm(hombro_izq[:, :2] - hombro_der[:, :2], axis=1), 1e-6)
+    orejas = (puntos[:, OREJA_IZQ] + puntos[:, OREJA_DER]) * 0.5
+    caderas = (puntos[:, CADERA_IZQ] + puntos[:, CADERA_DER]) * 0.5
+
+    # En la imagen la y crece hacia abajo: "hacia arriba" es -y
+    torso = centro - caderas
+    cuello = orejas - centro
+    return np.stack([
+        np.arctan2(torso[:, 0], -torso[:, 1]),
+        np.arctan2(cuello[:, 0], -cuello[:, 1]),
+        cuello[:, 0] / ancho,
+        cuello[:, 2] / ancho,
+        (centro[:, 1] - puntos[:, NARIZ, 1]) / ancho,
+        (hombro_izq[:, 1] - hombro_der[:, 1]) / ancho,
+        np.linalg.norm(torso[:, :2], axis=1) / ancho,
+        ancho,
+    ], axis=1)
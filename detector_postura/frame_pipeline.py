@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+# --- PIPELINE DE CAPTURA / INFERENCIA / RENDER ---
+#
+# La cámara, la inferencia (MediaPipe + modelo) y el dibujado en la GUI corren desacoplados:
+#
+#   CaptureThread --[LatestQueue]--> InferenceWorker --[LatestQueue]--> render (QTimer de la GUI)
+#
+# Las colas son acotadas y "gana el último frame": si una etapa va más lenta que la
+# anterior, los frames viejos se descartan (y se cuentan) en lugar de acumular retraso.
+
+class LatestQueue:
+    """Cola acotada en la que, si está llena, el elemento más antiguo se descarta al insertar."""
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.descartados = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.descartados += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Devuelve el elemento más antiguo pendiente, esperando hasta `timeout`. None si no hay."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+
+class FrameItem:
+    """Frame capturado con su número de secuencia y el instante de captura."""
+    __slots__ = ('seq', 'timestamp', 'img')
+
+    def __init__(self, seq, timestamp, img):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.img = img
+
+
+class CaptureThread(threading.Thread):
+    """Lee la cámara lo más rápido posible y publica cada frame (ya espejado) en la cola."""
+    def __init__(self, cap, salida, flip=True, metricas=None):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.salida = salida
+        self.flip = flip
+        self.metricas = metricas
+        self.capturados = 0
+        self.fallos_lectura = 0
+        self._stop_event = threading.Event()
+        self._pendientes = deque()  # Cambios en la cámara pedidos desde otros hilos
+
+    def en_hilo_captura(self, funcion):
+        """
+        Ejecuta `funcion(cap)` en este hilo antes de la siguiente lectura: cv2.VideoCapture no es
+        seguro entre hilos, así que la cámara solo se toca desde aquí mientras el hilo corre.
+        """
+        self._pendientes.append(funcion)
+
+    def _aplicar_pendientes(self):
+        while self._pendientes:
+            funcion = self._pendientes.popleft()
+            try:
+                funcion(self.cap)
+            except Exception as e:
+                log.error(f"No se pudo reconfigurar la cámara: {e}")
+
+    def run(self):
+        seq = 0
+        histograma = self.metricas.etapa('captura') if self.metricas else None
+        while not self._stop_event.is_set():
+            if self._pendientes:
+                self._aplicar_pendientes()
+            t0 = time.perf_counter_ns()
+            success, img = self.cap.read()
+            if not success:
+                self.fallos_lectura += 1
+                time.sleep(0.01)
+                continue
+
+            if self.flip:
+                img = cv2.flip(img, 1)
+            if histograma is not None:
+                histograma.add(time.perf_counter_ns() - t0)
+            seq += 1
+            self.capturados += 1
+            self.salida.put(FrameItem(seq, time.time(), img))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class InferenceWorker(threading.Thread):
+    """Consume frames y ejecuta `procesar(frame_item)`; publica su resultado para el render."""
+    def __init__(self, entrada, salida, procesar, metricas=None):
+        super().__init__(daemon=True)
+        self.entrada = entrada
+        self.salida = salida
+        self.procesar = procesar
+        self.metricas = metricas
+        self.procesados = 0
+        self.errores = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        histograma = self.metricas.etapa('inferencia') if self.metricas else None
+        while not self._stop_event.is_set():
+            item = self.entrada.get(timeout=0.1)
+            if item is None:
+                continue
+            t0 = time.perf_counter_ns()
+            try:
+                resultado = self.procesar(item)
+            except Exception as e:
+                self.errores += 1
+                log.error(f"Fallo procesando el frame {item.seq}: {e}")
+                continue
+
+            self.procesados += 1
+            if histograma is not None:
+                histograma.add(time.perf_counter_ns() - t0)
+            if resultado is not None:
+                self.salida.put(resultado)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class FramePipeline:
+    """
+    Orquesta la captura y la inferencia en hilos propios. La GUI solo llama a
+    `obtener_resultado()` desde su QTimer para pintar el último resultado disponible.
+    Si se pasa un DetectorMetrics, se registran las etapas 'captura' e 'inferencia'.
+    """
+    def __init__(self, cap, procesar, flip=True, metricas=None):
+        self.cap = cap
+        self.frames = LatestQueue(maxsize=1)
+        self.resultados = LatestQueue(maxsize=1)
+        self.capture_thread = CaptureThread(cap, self.frames, flip=flip, metricas=metricas)
+        self.inference_worker = InferenceWorker(self.frames, self.resultados, procesar, metricas=metricas)
+        self.renderizados = 0
+        if metricas is not None:
+            metricas.fuente_descartes = self.estadisticas
+
+    def start(self):
+        self.capture_thread.start()
+        self.inference_worker.start()
+
+    def stop(self):
+        """Detiene los hilos y libera la cámara."""
+        self.capture_thread.stop()
+        self.inference_worker.stop()
+        for hilo in (self.capture_thread, self.inference_worker):
+            if hilo.is_alive():
+                hilo.join(timeout=1.0)
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.release()
+
+    def reconfigurar_camara(self, funcion):
+        """Aplica `funcion(cap)` a la cámara desde el hilo de captura (ver CaptureThread.en_hilo_captura)."""
+        self.capture_thread.en_hilo_captura(funcion)
+
+    def obtener_resultado(self):
+        """Devuelve el último resultado de inferencia aún no pintado, o None."""
+        resultado = self.resultados.get_nowait()
+        if resultado is not None:
+            self.renderizados += 1
+        return resultado
+
+    def estadisticas(self):
+        """Contadores de frames por etapa, incluidos los descartados en cada cola."""
+        return {
+            'capturados': self.capture_thread.capturados,
+            'fallos_lectura': self.capture_thread.fallos_lectura,
+            'descartados_captura': self.frames.descartados,
+            'procesados': self.inference_worker.procesados,
+            'errores_inferencia': self.inference_worker.errores,
+            'descartados_inferencia': self.resultados.descartados,
+            'renderizados': self.renderizados,
+        }
+
+
+# --- PLANIFICADOR ADAPTATIVO DE INFERENCIA ---
+
+class AdaptiveScheduler:
+    """
+    Decide en qué frames ejecutar la inferencia de pose completa:
+
+    - Postura estable: solo uno de cada `intervalo_estable` frames, salvo que haya movimiento.
+    - Movimiento: una diferencia barata (miniatura en grises) respecto al último frame inferido
+      que supere `umbral_movimiento` fuerza la inferencia inmediatamente.
+    - Nadie delante de la cámara durante `segundos_sin_persona`: modo de bajo consumo, una
+      inferencia cada `intervalo_reposo` segundos (o antes si hay movimiento).
+    En cualquier otro caso se infiere en todos los frames.
+    """
+    THUMB_SIZE = (32, 24)
+
+    def __init__(self, intervalo_estable=5, umbral_movimiento=6.0, segundos_sin_persona=10.0, intervalo_reposo=1.0):
+        self.intervalo_estable = intervalo_estable
+        self.umbral_movimiento = umbral_movimiento
+        self.segundos_sin_persona = segundos_sin_persona
+        self.intervalo_reposo = intervalo_reposo
+
+        self._miniatura_ref = None
+        self._frames_desde_inferencia = 0
+        self._ultima_inferencia = None
+        self._ultima_persona = None
+        self._primer_frame = None  # Referencia de reposo hasta que se detecte a alguien por primera vez
+        self.estable = False
+        self.inferidos = 0
+        self.omitidos = 0
+
+    def _miniatura(self, img):
+        mini = cv2.resize(img, self.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(mini, cv2.COLOR_BGR2GRAY)
+
+    def en_reposo(self, timestamp):
+        """True si no se ha detectado a nadie en los últimos `segundos_sin_persona` segundos."""
+        referencia = self._ultima_persona if self._ultima_persona is not None else self._primer_frame
+        return referencia is not None and timestamp - referencia >= self.segundos_sin_persona
+
+    def debe_inferir(self, img, timestamp, forzar=False):
+        """Devuelve True si este frame debe pasar por la inferencia completa."""
+        miniatura = self._miniatura(img)
+        self._frames_desde_inferencia += 1
+        if self._primer_frame is None:
+            self._primer_frame = timestamp
+
+        if forzar or self._miniatura_ref is None:
+            inferir = True
+        elif cv2.absdiff(miniatura, self._miniatura_ref).mean() > self.umbral_movimiento:
+            inferir = True
+        elif self.en_reposo(timestamp):
+            inferir = timestamp - self._ultima_inferencia >= self.intervalo_reposo
+        elif self.estable:
+            inferir = self._frames_desde_inferencia >= self.intervalo_estable
+        else:
+            inferir = True
+
+        if inferir:
+            self._miniatura_ref = miniatura
+            self._frames_desde_inferencia = 0
+            self._ultima_inferencia = timestamp
+            self.inferidos += 1
+        else:
+            self.omitidos += 1
+        return inferir
+
+    def registrar_resultado(self, persona_detectada, estable, timestamp):
+        """Informa del resultado de la última inferencia (¿había persona?, ¿estado estable?)."""
+        if persona_detectada:
+            self._ultima_persona = timestamp
+        self.estable = persona_detectada and estable
@@ -0,0 +1,91 @@
+import time
+
+import cv2
+import numpy as np
+from PyQt6.QtCore import QObject, QEvent
+from PyQt6.QtGui import QImage, QPixmap
+
+# --- RENDER DE FRAMES EN LA GUI ---
+#
+# El frame llega ya en RGB desde la etapa de inferencia (una sola conversión de color por frame).
+# Aquí solo se escala con OpenCV al tamaño de la etiqueta, que se calcula una vez por cada
+# redimensionado, y se escribe en un buffer reutilizado. Solo se repinta si llegó un frame nuevo,
+# y como máximo `fps_max` veces por segundo, independientemente del ritmo de inferencia.
+
+class FrameRenderer(QObject):
+    """Pinta frames RGB en un QLabel manteniendo la relación de aspecto."""
+    def __init__(self, label, modo_rapido=False, fps_max=None):
+        super().__init__(label)
+        self.label = label
+        self.modo_rapido = modo_rapido
+        self.fps_max = fps_max
+
+        self._tamano_label = None      # (ancho, alto) disponible, se actualiza en cada resize
+        self._tamano_cache = {}        # (ancho_frame, alto_frame) -> (ancho, alto) destino
+        self._buffer = None
+        self._pendiente = None
+        self._ultimo_render = 0.0
+        self.pintados = 0
+        self.omitidos = 0
+
+        label.installEventFilter(self)
+        self._actualizar_tamano_label()
+
+    def configurar(self, modo_rapido=None, fps_max=None):
+        if modo_rapido is not None:
+            self.modo_rapido = modo_rapido
+        self.fps_max = fps_max
+
+    def eventFilter(self, obj, event):
+        if obj is self.label and event.type() == QEvent.Type.Resize:
+            self._actualizar_tamano_label()
+        return False
+
+    def _actualizar_tamano_label(self):
+        rect = self.label.contentsRect()
+        self._tamano_label = (max(1, rect.width()), max(1, rect.height()))
+        self._tamano_cache.clear()
+
+    def _tamano_destino(self, ancho, alto):
+        destino = self._tamano_cache.get((ancho, alto))
+        if destino is None:
+            ancho_label, alto_label = self._tamano_label
+            escala = min(ancho_label / ancho, alto_label / alto)
+            destino = (max(1, int(ancho * escala)), max(1, int(alto * escala)))
+            self._tamano_cache[(ancho, alto)] = destino
+        return destino
+
+    def mostrar(self, img_rgb):
+        """Encola un frame nuevo y lo pinta si el límite de FPS lo permite."""
+        if self._pendiente is not None:
+            self.omitidos += 1
+        self._pendiente = img_rgb
+        self.tick()
+
+    def tick(self):
+        """Pinta el frame pendiente si lo hay y ya toca según fps_max. Devuelve True si pintó."""
+        if self._pendiente is None:
+            return False
+        ahora = time.perf_counter()
+        if self.fps_max and ahora - self._ultimo_render < 1.0 / self.fps_max:
+            return False
+
+        img_rgb, self._pendiente = self._pendiente, None
+        self._ultimo_render = ahora
+        self._pintar(img_rgb)
+        return True
+
+    def _pintar(self, img_rgb):
+        alto, ancho = img_rgb.shape[:2]
+        destino = self._tamano_destino(ancho, alto)
+
+        if self._buffer is None or self._buffer.shape[:2] != (destino[1], destino[0]):
+            self._buffer = np.empty((destino[1], destino[0], 3), dtype=np.uint8)
+
+        interpolacion = cv2.INTER_NEAREST if self.modo_rapido else cv2.INTER_AREA
+        cv2.resize(img_rgb, destino, dst=self._buffer, interpolation=interpolacion)
+
+        # QPixmap.fromImage copia los datos, así que el buffer se puede reutilizar en el siguiente frame
+        q_img = QImage(self._buffer.data, destino[0], destino[1], destino[0] * 3, QImage.Format.Format_RGB888)
+        self.label.setPixmap(QPixmap.fromImage(q_img))
+        self.pintados += 1
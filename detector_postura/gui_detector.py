@@ -1,22 +1,43 @@
+import time
+_T_INICIO = time.perf_counter() # Referencia para medir el tiempo hasta la ventana y hasta la primera predicción
+
 import cv2
+import logging
+import os
 import sys
 import warnings
 import numpy as np
-import time
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score
 from collections import deque
 
 # Importaciones de PyQt (QTextCursor corregido a QtGui)
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QTextEdit
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QObject
-from PyQt6.QtGui import QImage, QPixmap, QFont, QColor, QTextCursor # <-- CORRECCIÓN FINAL
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QCheckBox
+from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt6.QtGui import QFont, QColor
 
 # Importaciones de la Lógica del Motor
-from posture_logic import mp_pose, mp_drawing, pose, obtener_nombres_de_perfiles, extraer_features, clasificar_postura, cargar_datos_brutos_para_recalculo, PredictionFilter, disparar_alarma_interruptible, detener_alarma
+from app_logging import configurar_logging
+from feature_pipeline import FeaturePipeline
+from frame_pipeline import FramePipeline, AdaptiveScheduler
+from instrumentation import DetectorMetrics, StartupTimeline, formatear_resumen
+from landmark_log import nueva_grabacion
+from frame_renderer import FrameRenderer
+from log_view import LogView
+from posture_logic import dibujar_landmarks_rgb, PoseWarmup, DEFAULT_PROFILE_CONFIG, obtener_nombres_de_perfiles, obtener_ruta_perfil, cargar_config_perfil, cargar_clasificador_perfil, abrir_camara, FeatureExtractor, clasificar_postura, nuevo_filtro_prediccion, ContadorTiempos, disparar_alarma_interruptible, detener_alarma
 
 warnings.filterwarnings("ignore")
 
+log = logging.getLogger(__name__)
+
+# --- CONFIGURACIÓN DEL LOG ---
+LOG_FILE = None # Ruta de un log rotativo en disco (p.ej. 'detector_postura.log'); None = solo consola y ventana
+
+# --- CONFIGURACIÓN DE MÉTRICAS DE RENDIMIENTO ---
+METRICS_FILE = 'metricas_rendimiento.jsonl'
+METRICS_EXPORT_INTERVAL = 60 # Segundos por ventana exportada
+
+# --- CONFIGURACIÓN DEL FILTRO DE PREDICCIÓN (ver nuevo_filtro_prediccion en posture_logic.py) ---
+STABLE_CONFIDENCE = 0.8 # Con esta confianza en el estado actual se infiere solo 1 de cada N frames
+
 # --- FUNCIONES DE UTILIDAD DE TIEMPO ---
 
 def format_time(seconds):
@@ -28,85 +49,55 @@ def format_time(seconds):
     s = int(seconds % 60)
     return f"{h:01d}:{m:02d}:{s:02d}"
 
-# --- CLASE DE REDIRECCIÓN DE CONSOLA ---
-class ConsoleRedirect(QObject):
-    text_written = pyqtSignal(str)
-
-    def write(self, text):
-        self.text_written.emit(text)
-
-    def flush(self):
-        pass
-
 # --- CLASE DE ENTRENAMIENTO ASÍNCRONO ---
 class TrainerThread(QThread):
-    """Hilo para entrenar el modelo ML sin congelar la GUI."""
-    training_finished = pyqtSignal(object)
+    """
+    Hilo que prepara todo lo necesario para detectar sin congelar la GUI: carga (o entrena) el
+    modelo ML, recoge el PoseEstimator ya calentado y abre la cámara.
+    """
+    training_finished = pyqtSignal(object, object, object)
     training_error = pyqtSignal(str)
     
-    def __init__(self, nombre_perfil, gui_logger):
+    def __init__(self, nombre_perfil, pose_warmup, arranque):
         super().__init__()
         self.nombre_perfil = nombre_perfil
-        self._gui_logger = gui_logger
+        self.pose_warmup = pose_warmup
+        self.arranque = arranque
         
 
     def run(self):
-        # Redirigir temporalmente la salida para capturar logs de ML
-        sys.stdout = self._gui_logger
-        
+        # Los mensajes del entrenamiento llegan a la ventana por el log (ver app_logging)
         try:
-            modelo_rf = self._entrenar_modelo_rf(self.nombre_perfil)
-            
-            # Restaurar la salida original
-            sys.stdout = sys.__stdout__ 
+            # Bosque aplanado: el exportado si está al día (sin sklearn); si no, se entrena aquí,
+            # con la ventana ya visible
+            clasificador = cargar_clasificador_perfil(self.nombre_perfil)
             
-            if modelo_rf:
-                self.training_finished.emit(modelo_rf)
+            if clasificador is not None:
+                clasificador.predecir_proba_uno(np.zeros(clasificador.n_features_in_, dtype=np.float32))
+                self.arranque.marcar('modelo_listo')
+
+                # El PoseEstimator se calentó en paralelo desde que apareció la ventana
+                config = cargar_config_perfil(self.nombre_perfil)
+                pose_estimator = self.pose_warmup.obtener(config)
+                self.arranque.marcar('pose_lista')
+                cap = abrir_camara(config)
+                self.arranque.marcar('camara_abierta')
+
+                self.training_finished.emit(clasificador, pose_estimator, cap)
             else:
                 self.training_error.emit("No hay suficientes datos para entrenar.")
         except Exception as e:
-            # Restaurar la salida original incluso en caso de error
-            sys.stdout = sys.__stdout__ 
+            log.error(f"Error durante el entrenamiento: {e}")
             self.training_error.emit(f"Error durante el entrenamiento: {e}")
 
-    def _entrenar_modelo_rf(self, nombre_perfil):
-        """Carga todos los datos brutos, prepara el dataset y entrena el Random Forest."""
-        print("\n--- INICIANDO ENTRENAMIENTO ML ---")
-        datos_brutos = cargar_datos_brutos_para_recalculo(nombre_perfil)
-        
-        if not datos_brutos['PERFECTO'] or not datos_brutos['MALO']:
-            return None
-            
-        X_perfecto = np.array(datos_brutos['PERFECTO'])
-        X_malo = np.array(datos_brutos['MALO'])
-        
-        if len(X_perfecto) == 0 or len(X_malo) == 0:
-            return None
-
-        y_perfecto = np.array(['PERFECTO'] * len(X_perfecto))
-        y_malo = np.array(['MALO'] * len(X_malo))
-        
-        X = np.concatenate([X_perfecto, X_malo])
-        y = np.concatenate([y_perfecto, y_malo])
-        
-        model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
-        model.fit(X, y)
-        
-        y_pred = model.predict(X)
-        accuracy = accuracy_score(y, y_pred)
-        print(f"[ML] Entrenamiento completado. Precisión en el dataset de entrenamiento: {accuracy:.2f}")
-        
-        return model
-
 # --- CLASE DE LA VENTANA PRINCIPAL ---
 
 class PostureDetectorApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        # Redirigir la salida de la consola
-        self.console_redirect = ConsoleRedirect()
-        self.console_redirect.text_written.connect(self.update_log)
-        
+        # Log de la aplicación (consola, ventana y, si LOG_FILE, archivo rotativo)
+        self.log_buffer = configurar_logging(ruta_archivo=LOG_FILE)
+
         self.setWindowTitle("DETECTOR DE POSTURA DE USO DIARIO")
         self.setGeometry(100, 100, 1000, 650)
         self.setStyleSheet("background-color: #1E1E1E; color: #FFFFFF;")
@@ -114,14 +105,30 @@ class PostureDetectorApp(QMainWindow):
         # Estado del detector
         self.modelo_rf = None
         self.cap = None
-        self.prediction_filter = PredictionFilter(window_size=15)
+        self.pipeline = None
+        self.pose_estimator = None
+        self.metricas = None
+        self.grabacion = None # LandmarkRecorder si el perfil tiene 'grabar_landmarks'
+        self.prediction_filter = None # Se crea con las clases del modelo al cargarlo (nuevo_filtro_prediccion)
+        self.feature_extractor = FeatureExtractor()
+        self.feature_stream = None
+        self.inferir_todos = False
         self.trainer_thread = None
         self.selected_profile = None
 
+        # MediaPipe se carga y calienta en segundo plano una vez visible la ventana (ver on_window_shown)
+        self.arranque = StartupTimeline(_T_INICIO)
+        self.pose_warmup = PoseWarmup(DEFAULT_PROFILE_CONFIG)
+
         # --- VARIABLES DE CONTEO DE TIEMPO ---
-        self.tiempo_bueno_total = 0.0
-        self.tiempo_malo_total = 0.0
-        self.last_frame_time = time.time()
+        self.tiempos = ContadorTiempos()
+        self.last_frame_time = None
+
+        # Planificador de inferencia y último resultado (para los frames sin inferencia)
+        self.scheduler = AdaptiveScheduler()
+        self.last_smoothed_prediction = None
+        self.last_pose_landmarks = None
+        self.last_posture_text, self.last_color_rgb = "Buscando...", (255, 255, 255)
         
         self.setup_ui()
         self.load_profiles_menu()
@@ -169,10 +176,20 @@ class PostureDetectorApp(QMainWindow):
         self.feedback_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.feedback_label.setStyleSheet("color: #FFFFFF; padding: 20px; border-radius: 5px; background-color: #333333;")
         left_panel.addWidget(self.feedback_label)
+
+        # Panel de rendimiento (opcional): FPS, latencias por etapa y frames descartados
+        self.stats_checkbox = QCheckBox("Mostrar rendimiento")
+        self.stats_checkbox.toggled.connect(self.toggle_stats_panel)
+        left_panel.addWidget(self.stats_checkbox)
+
+        self.stats_label = QLabel("")
+        self.stats_label.setFont(QFont("Courier New", 8))
+        self.stats_label.setStyleSheet("color: #AAAAAA; padding: 5px; border: 1px solid #555;")
+        self.stats_label.setVisible(False)
+        left_panel.addWidget(self.stats_label)
         
         # 4. Área de Log / Consola
-        self.log_widget = QTextEdit()
-        self.log_widget.setReadOnly(True)
+        self.log_widget = LogView(self.log_buffer)
         self.log_widget.setMinimumHeight(150)
         self.log_widget.setStyleSheet("background-color: #000000; color: #FFFFFF; border: 1px solid #555;")
         left_panel.addWidget(QLabel("Log del Sistema:"))
@@ -189,16 +206,17 @@ class PostureDetectorApp(QMainWindow):
         self.camera_label.setStyleSheet("background-color: black; border: 2px solid #555555;")
         self.camera_label.setMinimumSize(700, 500)
         main_layout.addWidget(self.camera_label)
+        self.renderer = FrameRenderer(self.camera_label)
         
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
 
-    def update_log(self, text):
-        """Añade texto al widget de log."""
-        cursor = self.log_widget.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertText(text)
-        self.log_widget.setTextCursor(cursor)
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats)
+
+    def on_window_shown(self):
+        self.arranque.marcar('ventana')
+        self.pose_warmup.start()
 
     def load_profiles_menu(self):
         self.profile_combo.clear()
@@ -218,27 +236,42 @@ class PostureDetectorApp(QMainWindow):
         self.feedback_label.setText("Cargando datos...")
 
         # Reiniciar contadores de tiempo
-        self.tiempo_bueno_total = 0.0
-        self.tiempo_malo_total = 0.0
-        self.last_frame_time = time.time()
+        self.tiempos = ContadorTiempos()
+        self.last_frame_time = None
 
         # Iniciar entrenamiento en hilo separado
-        self.trainer_thread = TrainerThread(self.selected_profile, self.console_redirect)
+        self.trainer_thread = TrainerThread(self.selected_profile, self.pose_warmup, self.arranque)
         self.trainer_thread.training_finished.connect(self.on_training_finished)
         self.trainer_thread.training_error.connect(self.on_training_error)
         self.trainer_thread.start()
 
-    def on_training_finished(self, model):
+    def on_training_finished(self, model, pose_estimator, cap):
         self.modelo_rf = model
+        self.feature_stream = FeaturePipeline.del_modelo(model).flujo()
+        # La ventana temporal se entrenó con frames consecutivos: saltarse frames con postura
+        # estable la estiraría en el tiempo, así que con ella se infieren todos (salvo en reposo)
+        self.inferir_todos = bool(self.feature_stream.pipeline.temporal)
+        self.prediction_filter = nuevo_filtro_prediccion(model.classes_)
         
-        # Iniciar cámara y timer
-        self.cap = cv2.VideoCapture(0)
+        # Cámara y modelo de pose ya preparados en segundo plano con la configuración del perfil
+        config = cargar_config_perfil(self.selected_profile)
+        self.pose_estimator = pose_estimator
+        self.renderer.configurar(modo_rapido=config['display_rapido'], fps_max=config['fps_display_max'])
+        self.cap = cap
         if not self.cap.isOpened():
             self.camera_label.setText("ERROR: Cámara no disponible.")
             self.start_button.setEnabled(True)
             return
 
-        self.timer.start(30) # ~33 FPS
+        # Métricas siempre activas; se exportan periódicamente a la carpeta del perfil
+        ruta_metricas = os.path.join(obtener_ruta_perfil(self.selected_profile), METRICS_FILE)
+        self.metricas = DetectorMetrics(ruta_exportacion=ruta_metricas, intervalo_exportacion=METRICS_EXPORT_INTERVAL)
+        self.grabacion = nueva_grabacion(obtener_ruta_perfil(self.selected_profile), config, 'detector')
+
+        self.pipeline = FramePipeline(self.cap, self.process_frame, metricas=self.metricas)
+        self.pipeline.start()
+        self.timer.start(30) # Render a ~33 FPS; la inferencia va a su propio ritmo
+        self.stats_timer.start(1000)
         self.start_button.setText("DETECCIÓN ACTIVA")
         self.start_button.setEnabled(False)
         self.feedback_label.setText("POSTURA OK")
@@ -250,93 +283,148 @@ class PostureDetectorApp(QMainWindow):
         self.feedback_label.setText("ERROR ML")
         detener_alarma()
 
-    def update_frame(self):
-        current_time = time.time()
-        delta_time = current_time - self.last_frame_time
-        self.last_frame_time = current_time
-        
-        success, img = self.cap.read()
-        if not success:
-            return
-
-        img = cv2.flip(img, 1) 
+    def process_frame(self, frame):
+        """Etapa de inferencia (hilo del pipeline): pose, predicción, filtro, tiempos y dibujo."""
+        # El tiempo se acumula con el instante de captura, así los frames descartados no se pierden
+        delta_time = 0.0 if self.last_frame_time is None else frame.timestamp - self.last_frame_time
+        self.last_frame_time = frame.timestamp
+
+        metricas = self.metricas
+        img = frame.img
+
+        if not self.scheduler.debe_inferir(img, frame.timestamp):
+            # Frame sin inferencia: se mantiene el último estado filtrado y se sigue contando su tiempo
+            self.account_time(self.last_smoothed_prediction, delta_time)
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            if self.last_pose_landmarks is not None:
+                dibujar_landmarks_rgb(img_rgb, self.last_pose_landmarks)
+            return img_rgb, self.last_posture_text, self.last_color_rgb
+
+        # Única conversión de color del frame: la usan MediaPipe, el dibujo y el render
+        t0 = time.perf_counter_ns()
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = pose.process(img_rgb)
+        results = self.pose_estimator.process(img_rgb)
+        t1 = time.perf_counter_ns()
+        metricas.registrar('pose', t1 - t0)
+        if self.grabacion:
+            # Antes de dibujar: la miniatura grabada es el frame tal como lo vio MediaPipe
+            self.grabacion.registrar(frame.timestamp, results.pose_landmarks, img_rgb)
         
         posture_text, color_rgb = "Buscando...", (255, 255, 255)
+        smoothed_prediction = None
+        pose_landmarks = None
 
         if results.pose_landmarks and self.modelo_rf:
             
-            # 1. Extracción de Features
-            features = extraer_features(results.pose_landmarks.landmark)
+            # 1. Extracción de Features (landmarks crudos -> features del modelo)
+            features = self.feature_extractor.extraer(results.pose_landmarks.landmark)
             
-            if features and len(features) == 99 and features[0] != 0.0:
+            if features is not None:
+                features = self.feature_stream.transformar_uno(features, frame.timestamp)
                 # Predicción y Filtro
-                X_input = np.array(features).reshape(1, -1)
-                prediction = self.modelo_rf.predict(X_input)[0]
+                probabilidades = self.modelo_rf.predecir_proba_uno(features)
+                prediction = self.modelo_rf.classes_[probabilidades.argmax()]
                 
-                self.prediction_filter.add_prediction(prediction)
+                self.prediction_filter.add_prediction(prediction, probabilidades, frame.timestamp)
                 smoothed_prediction = self.prediction_filter.get_dominant_prediction()
                 
                 posture_text, color_rgb = clasificar_postura(smoothed_prediction)
+                t2 = time.perf_counter_ns()
+                metricas.registrar('clasificador', t2 - t1)
+                if 'primera_prediccion' not in self.arranque.hitos:
+                    self.arranque.marcar('primera_prediccion')
+                    self.arranque.exportar(metricas.ruta_exportacion)
                 
                 # 2. Lógica de Conteo de Tiempo y Alarma
-                is_currently_bad = (smoothed_prediction == 'MALO')
-                
-                if is_currently_bad:
-                    # Alarma ON y Conteo MALO
-                    disparar_alarma_interruptible()
-                    self.tiempo_malo_total += delta_time 
-                else:
-                    # Alarma OFF y Conteo BUENO/ACEPTABLE
-                    detener_alarma()
-                    if smoothed_prediction == 'PERFECTO':
-                        self.tiempo_bueno_total += delta_time
-                    elif smoothed_prediction == 'ACEPTABLE':
-                        self.tiempo_bueno_total += delta_time 
+                self.account_time(smoothed_prediction, delta_time)
                 
                 # Dibujar landmarks de OpenCV
-                mp_drawing.draw_landmarks(img, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+                pose_landmarks = results.pose_landmarks
+                dibujar_landmarks_rgb(img_rgb, pose_landmarks)
+                metricas.registrar('dibujo', time.perf_counter_ns() - t2)
+
+        # El planificador infiere menos a menudo si la postura es estable o no hay nadie
+        estable = (smoothed_prediction is not None and not self.inferir_todos
+                   and self.prediction_filter.confianza() >= STABLE_CONFIDENCE)
+        self.scheduler.registrar_resultado(smoothed_prediction is not None, estable, frame.timestamp)
+        self.last_smoothed_prediction = smoothed_prediction
+        self.last_pose_landmarks = pose_landmarks
+        self.last_posture_text, self.last_color_rgb = posture_text, color_rgb
             
-        # 3. Actualizar la GUI
+        return img_rgb, posture_text, color_rgb
+
+    def account_time(self, smoothed_prediction, delta_time):
+        """Acumula el tiempo del frame en el estado filtrado y enciende/apaga la alarma."""
+        if smoothed_prediction is None:
+            return
+
+        if smoothed_prediction == 'MALO':
+            disparar_alarma_interruptible()
+        else:
+            detener_alarma()
+        self.tiempos.registrar(smoothed_prediction, delta_time)
+
+    def update_frame(self):
+        """Etapa de render (hilo de la GUI): pinta el último resultado del pipeline."""
+        resultado = self.pipeline.obtener_resultado()
+        if resultado is None:
+            # Sin frame nuevo: solo se pinta el pendiente si el límite de FPS lo retuvo
+            self.renderer.tick()
+            return
+
+        t0 = time.perf_counter_ns()
+        self.arranque.marcar('primer_frame')
+        img_rgb, posture_text, color_rgb = resultado
         self.update_metrics_and_feedback(posture_text, color_rgb)
-        self.display_image(img)
+        self.renderer.mostrar(img_rgb)
+        self.metricas.registrar('render', time.perf_counter_ns() - t0)
+
+    def toggle_stats_panel(self, visible):
+        self.stats_label.setVisible(visible)
+        if visible:
+            self.update_stats()
+
+    def update_stats(self):
+        """Cada segundo: exporta la ventana de métricas si toca y refresca el panel si está visible."""
+        if self.metricas is None:
+            return
+        self.metricas.tick()
+        if self.stats_checkbox.isChecked():
+            self.stats_label.setText(formatear_resumen(self.metricas.resumen()))
 
     def update_metrics_and_feedback(self, text, rgb_color):
         # RGB a Color de PyQt
         q_color = QColor(rgb_color[0], rgb_color[1], rgb_color[2])
         
         # Actualizar Tiempos
-        self.time_good_label.setText(f"Tiempo con una BUENA POSTURA:\n{format_time(self.tiempo_bueno_total)}")
-        self.time_bad_label.setText(f"Tiempo con una MALA POSTURA:\n{format_time(self.tiempo_malo_total)}")
+        self.time_good_label.setText(f"Tiempo con una BUENA POSTURA:\n{format_time(self.tiempos.bueno)}")
+        self.time_bad_label.setText(f"Tiempo con una MALA POSTURA:\n{format_time(self.tiempos.malo)}")
 
-        # Actualizar Feedback
+        # Actualizar Feedback (setStyleSheet es caro: solo cuando cambia el estado)
+        if text == self.feedback_label.text():
+            return
         self.feedback_label.setText(text)
         self.feedback_label.setStyleSheet(f"color: white; padding: 20px; border-radius: 5px; background-color: {q_color.darker(150).name()}; border: 2px solid {q_color.name()};")
         
-    def display_image(self, img):
-        # Convertir OpenCV frame (BGR) a QImage (RGB)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = img_rgb.shape
-        bytes_per_line = ch * w
-        
-        q_img = QImage(img_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        
-        # Escalar imagen para ajustarse a la etiqueta
-        pixmap = QPixmap.fromImage(q_img)
-        self.camera_label.setPixmap(pixmap.scaled(self.camera_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-
     def closeEvent(self, event):
         # Detener la cámara y el timer al cerrar
         detener_alarma()
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
         self.timer.stop()
+        self.stats_timer.stop()
+        if self.metricas:
+            self.metricas.cerrar_ventana()
+        if self.pipeline:
+            self.pipeline.stop()
+        elif self.cap and self.cap.isOpened():
+            self.cap.release()
+        if self.grabacion:
+            self.grabacion.cerrar()
         event.accept()
 
 if __name__ == '__main__':
-    # Redirigir la salida de la consola al inicio de la aplicación
     app = QApplication(sys.argv)
     window = PostureDetectorApp()
     window.show()
+    # Se ejecuta en cuanto el bucle de eventos arranca, con la ventana ya pintada
+    QTimer.singleShot(0, window.on_window_shown)
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,43 +1,71 @@
 import cv2
+import logging
 import sys
+import threading
 import warnings
 import numpy as np
 import time
 from collections import deque
 
 # Importaciones de PyQt (CORREGIDO)
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QLineEdit, QInputDialog, QMessageBox, QTextEdit
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QObject
-from PyQt6.QtGui import QImage, QPixmap, QFont, QColor, QTextCursor # <-- CORRECCIÓN APLICADA AQUÍ
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QLineEdit, QInputDialog, QMessageBox
+from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt6.QtGui import QFont, QColor
 
 # Importaciones de la Lógica del Motor
-from posture_logic import mp_pose, mp_drawing, pose, obtener_nombres_de_perfiles, extraer_features, guardar_entrenamiento_bruto, obtener_ruta_perfil
+from app_logging import configurar_logging
+from frame_pipeline import FramePipeline, AdaptiveScheduler
+from frame_renderer import FrameRenderer
+from log_view import LogView
+from posture_logic import dibujar_landmarks_rgb, PoseWarmup, DEFAULT_PROFILE_CONFIG, obtener_nombres_de_perfiles, cargar_config_perfil, aplicar_resolucion_camara, FeatureExtractor, guardar_entrenamiento_bruto, obtener_ruta_perfil
+from landmark_log import nueva_grabacion
+from session_capture import SessionCapture, buscar_captura_interrumpida, descartar_captura
+from session_storage import REQUIRED_CLASSES
 
 # Ocultar warnings de librerías
 warnings.filterwarnings("ignore")
 
-# --- CLASE DE REDIRECCIÓN DE CONSOLA ---
-class ConsoleRedirect(QObject):
-    text_written = pyqtSignal(str)
-
-    def write(self, text):
-        self.text_written.emit(text)
-
-    def flush(self):
-        pass
+log = logging.getLogger(__name__)
 
 # --- CONFIGURACIÓN GLOBAL DE CAPTURA ---
 DURACION_CAPTURA = 10 # Segundos por postura
 
+# --- CONFIGURACIÓN DEL LOG ---
+LOG_FILE = None # Ruta de un log rotativo en disco (p.ej. 'entrenador_postura.log'); None = solo consola y ventana
+
+# --- HILO DE GUARDADO ---
+class SaveThread(QThread):
+    """Convierte la captura volcada en disco en una sesión .npz sin congelar la GUI."""
+    save_finished = pyqtSignal(bool)
+
+    def __init__(self, nombre_perfil, captura):
+        super().__init__()
+        self.nombre_perfil = nombre_perfil
+        self.captura = captura
+
+    def run(self):
+        try:
+            self.captura.cerrar()
+            datos = self.captura.cargar()
+            completa = all(len(datos.get(clase, ())) for clase in REQUIRED_CLASSES)
+            if completa:
+                guardar_entrenamiento_bruto(self.nombre_perfil, datos)
+            # Los mapas de memoria se sueltan antes de borrar los archivos de la captura
+            del datos
+            self.captura.eliminar()
+            self.save_finished.emit(completa)
+        except Exception as e:
+            log.error(f"No se pudo guardar la sesión: {e}")
+            self.save_finished.emit(False)
+
 # --- CLASE DE LA VENTANA DE ENTRENAMIENTO ---
 
 class PostureTrainerApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        # Redirigir la salida de la consola
-        self.console_redirect = ConsoleRedirect()
-        self.console_redirect.text_written.connect(self.update_log)
-        
+        # Log de la aplicación (consola, ventana y, si LOG_FILE, archivo rotativo)
+        self.log_buffer = configurar_logging(ruta_archivo=LOG_FILE)
+
         self.setWindowTitle("Detector de Postura - MODO ENTRENAMIENTO (ML)")
         self.setGeometry(100, 100, 1000, 650) 
         self.setStyleSheet("background-color: #1E1E1E; color: #FFFFFF;")
@@ -45,12 +73,26 @@ class PostureTrainerApp(QMainWindow):
         # Estado del entrenamiento
         self.nombre_perfil = None
         self.cap = None
+        self.pipeline = None
+        self.scheduler = AdaptiveScheduler()
+        # MediaPipe se carga y calienta en segundo plano; mientras tanto se muestra la cámara sin landmarks
+        self.pose_warmup = PoseWarmup(DEFAULT_PROFILE_CONFIG)
+        self.pose_warmup.start()
+        self.pose_estimator = None
+        self.config_pose = DEFAULT_PROFILE_CONFIG
+        # Config de pose del perfil elegido: la GUI la deja aquí y el hilo del pipeline cambia de estimador
+        self.config_pose_pendiente = None
+        self._pose_lock = threading.Lock()
+        self.last_pose_landmarks = None
+        self.grabacion = None # LandmarkRecorder si el perfil tiene 'grabar_landmarks'
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.current_state = "SELECT_PROFILE"
         
-        # Datos de captura de la sesión actual
-        self.data_features = {'PERFECTO': [], 'MALO': []}
+        # Captura de la sesión actual (se vuelca a disco en segundo plano)
+        self.captura = None
+        self.save_thread = None
+        self.feature_extractor = FeatureExtractor()
         self.capture_start_time = 0
         self.CAPTURE_DURATION = DURACION_CAPTURA
 
@@ -104,8 +146,7 @@ class PostureTrainerApp(QMainWindow):
         left_panel.addWidget(self.countdown_label)
         
         # 5. Área de Log / Consola
-        self.log_widget = QTextEdit()
-        self.log_widget.setReadOnly(True)
+        self.log_widget = LogView(self.log_buffer)
         self.log_widget.setMinimumHeight(150)
         self.log_widget.setStyleSheet("background-color: #000000; color: #FFFFFF; border: 1px solid #555;")
         left_panel.addWidget(QLabel("Log del Sistema:"))
@@ -122,20 +163,16 @@ class PostureTrainerApp(QMainWindow):
         self.camera_label.setStyleSheet("background-color: black; border: 2px solid #555555;")
         self.camera_label.setMinimumSize(600, 400)
         main_layout.addWidget(self.camera_label)
+        self.renderer = FrameRenderer(self.camera_label, fps_max=DEFAULT_PROFILE_CONFIG['fps_display_max'])
         
     def init_camera(self):
         self.cap = cv2.VideoCapture(0)
         if not self.cap.isOpened():
             self.camera_label.setText("ERROR: Cámara no disponible.")
         else:
-            self.timer.start(30) # ~33 FPS
-
-    def update_log(self, text):
-        """Añade texto al widget de log."""
-        cursor = self.log_widget.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertText(text)
-        self.log_widget.setTextCursor(cursor)
+            self.pipeline = FramePipeline(self.cap, self.process_frame)
+            self.pipeline.start()
+            self.timer.start(30) # Render a ~33 FPS; la inferencia va a su propio ritmo
 
     def show_profile_dialog(self):
         perfiles = obtener_nombres_de_perfiles()
@@ -152,18 +189,62 @@ class PostureTrainerApp(QMainWindow):
                 self.nombre_perfil = item
             
             if self.nombre_perfil:
-                self.set_state("READY_PERFECT")
+                # Se captura con la misma cámara y modelo de pose que usará el detector con este perfil
+                config = cargar_config_perfil(self.nombre_perfil)
+                if self.pipeline:
+                    self.pipeline.reconfigurar_camara(lambda cap: aplicar_resolucion_camara(cap, config))
+                with self._pose_lock:
+                    self.config_pose_pendiente = config
+                self.renderer.configurar(modo_rapido=config['display_rapido'], fps_max=config['fps_display_max'])
+                self.grabacion = nueva_grabacion(obtener_ruta_perfil(self.nombre_perfil), config, 'entrenador')
+                if not self.offer_resume_capture():
+                    self.set_state("READY_PERFECT")
+
+    def offer_resume_capture(self):
+        """Si el perfil tiene una captura interrumpida, ofrece reanudarla. Devuelve True si se reanudó."""
+        ruta_perfil = obtener_ruta_perfil(self.nombre_perfil)
+        interrumpida = buscar_captura_interrumpida(ruta_perfil)
+        if interrumpida is None:
+            return False
+
+        resumen = ", ".join(f"{clase}: {filas} frames" for clase, filas in interrumpida['filas'].items())
+        respuesta = QMessageBox.question(self, "Captura Interrumpida",
+                                         f"Se encontró una captura sin guardar ({resumen}).\n¿Reanudarla?")
+        if respuesta != QMessageBox.StandardButton.Yes:
+            descartar_captura(ruta_perfil)
+            log.info("Captura interrumpida descartada.")
+            return False
+
+        try:
+            self.captura = SessionCapture(ruta_perfil, self.feature_extractor.n_features, reanudar=True)
+        except ValueError as e:
+            log.error(f"No se puede reanudar la captura: {e}")
+            return False
+
+        log.info(f"Captura reanudada ({resumen}).")
+        # Se continúa por la primera etapa que no llegó a completarse
+        if "MALO" in self.captura.clases_completadas:
+            self.set_state("FINISHED")
+            self.save_data()
+        elif "PERFECTO" in self.captura.clases_completadas:
+            self.set_state("READY_MALO")
+        else:
+            self.set_state("READY_PERFECT")
+        return True
     
     def handle_capture_click(self):
+        if self.captura is None:
+            self.captura = SessionCapture(obtener_ruta_perfil(self.nombre_perfil), self.feature_extractor.n_features)
+
         if self.current_state == "READY_PERFECT":
             self.capture_start_time = time.time()
             self.set_state("CAPTURING_PERFECTO")
-            print(f"-> Iniciando captura de PERFECTO...")
+            log.info("Iniciando captura de PERFECTO...")
 
         elif self.current_state == "READY_MALO":
             self.capture_start_time = time.time()
             self.set_state("CAPTURING_MALO")
-            print(f"-> Iniciando captura de MALO...")
+            log.info("Iniciando captura de MALO...")
 
 
     def set_state(self, new_state):
@@ -217,42 +298,88 @@ class PostureTrainerApp(QMainWindow):
             self.countdown_label.setText("")
 
 
-    def update_frame(self):
-        success, img = self.cap.read()
-        if not success:
-            return
+    def process_frame(self, frame):
+        """Etapa de inferencia (hilo del pipeline): pose, dibujo y acumulación de features."""
+        img = frame.img
+        current_state = self.current_state
+        capturing = current_state in ["CAPTURING_PERFECTO", "CAPTURING_MALO"]
+
+        pose_estimator = self.actualizar_pose_estimator()
+        if pose_estimator is None:
+            # Hasta que termine el calentamiento de MediaPipe solo se muestra la cámara
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-        img = cv2.flip(img, 1) 
+        # Fuera de la captura los landmarks solo se dibujan: no hace falta pose en cada frame
+        if not self.scheduler.debe_inferir(img, frame.timestamp, forzar=capturing):
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            if self.last_pose_landmarks is not None:
+                dibujar_landmarks_rgb(img_rgb, self.last_pose_landmarks)
+            return img_rgb
+
+        # Única conversión de color del frame: la usan MediaPipe, el dibujo y el render
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = pose.process(img_rgb)
+        results = pose_estimator.process(img_rgb)
+        grabacion = self.grabacion
+        if grabacion:
+            grabacion.registrar(frame.timestamp, results.pose_landmarks, img_rgb)
+        self.last_pose_landmarks = results.pose_landmarks
+        self.scheduler.registrar_resultado(results.pose_landmarks is not None, True, frame.timestamp)
         
         # Dibuja landmarks de OpenCV
         if results.pose_landmarks:
-            mp_drawing.draw_landmarks(img, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+            dibujar_landmarks_rgb(img_rgb, results.pose_landmarks)
             
-            # Lógica de Captura
-            if self.current_state in ["CAPTURING_PERFECTO", "CAPTURING_MALO"]:
-                h, w, c = img.shape
-                features = extraer_features(results.pose_landmarks.landmark)
-
-                if features and len(features) == 99:
-                    current_status_key = self.current_state.split('_')[1] 
-
-                    self.data_features[current_status_key].append(features)
-                    
-                    time_elapsed = time.time() - self.capture_start_time
-                    time_remaining = self.CAPTURE_DURATION - int(time_elapsed)
-                    self.countdown_label.setText(f"Capturando... {time_remaining}s")
-
-                    if time_elapsed >= self.CAPTURE_DURATION:
-                        # Pasa a la siguiente etapa o finaliza
-                        self.handle_stage_completion(current_status_key)
-                        return 
+            # Lógica de Captura (solo frames capturados dentro de la ventana de la etapa)
+            if capturing and frame.timestamp - self.capture_start_time < self.CAPTURE_DURATION:
+                features = self.feature_extractor.extraer(results.pose_landmarks.landmark)
+
+                if features is not None:
+                    current_status_key = current_state.split('_')[1] 
+                    # Se copia al buffer de la captura; el volcado a disco va en otro hilo
+                    self.captura.anadir(current_status_key, features)
                 
-        self.display_image(img)
+        return img_rgb
+
+    def actualizar_pose_estimator(self):
+        """
+        Hilo del pipeline: único sitio donde se cambia de PoseEstimator. Si se eligió un perfil con
+        otra configuración de pose, crea el suyo (sin bloquear la GUI) y cierra el anterior.
+        """
+        with self._pose_lock:
+            config, self.config_pose_pendiente = self.config_pose_pendiente, None
+
+        if config is not None:
+            if self.pose_estimator is None or not PoseWarmup.es_compatible(self.config_pose, config):
+                anterior, self.pose_estimator = self.pose_estimator, self.pose_warmup.obtener(config)
+                if anterior is not None:
+                    anterior.close()
+            self.config_pose = config
+        elif self.pose_estimator is None:
+            self.pose_estimator = self.pose_warmup.tomar()
+        return self.pose_estimator
+
+    def update_frame(self):
+        """Etapa de render (hilo de la GUI): cuenta atrás, cambio de etapa y dibujo del frame."""
+        if self.current_state in ["CAPTURING_PERFECTO", "CAPTURING_MALO"]:
+            time_elapsed = time.time() - self.capture_start_time
+            time_remaining = self.CAPTURE_DURATION - int(time_elapsed)
+            frames = self.captura.filas(self.current_state.split('_')[1])
+            self.countdown_label.setText(f"Capturando... {time_remaining}s ({frames} frames)")
+
+            if time_elapsed >= self.CAPTURE_DURATION:
+                # Pasa a la siguiente etapa o finaliza
+                self.handle_stage_completion(self.current_state.split('_')[1])
+                return
+
+        img_rgb = self.pipeline.obtener_resultado()
+        if img_rgb is not None:
+            self.renderer.mostrar(img_rgb)
+        else:
+            self.renderer.tick()
 
     def handle_stage_completion(self, status):
         # Termina la etapa actual y pasa a la siguiente
+        self.captura.completar_clase(status)
         if status == "PERFECTO":
             self.set_state("READY_MALO")
         elif status == "MALO":
@@ -260,56 +387,50 @@ class PostureTrainerApp(QMainWindow):
             self.save_data()
 
     def save_data(self):
-        # Redirigir la salida de la consola para que los mensajes de guardado aparezcan en la GUI
-        sys.stdout = self.console_redirect
-        
         self.stage_label.setText("GUARDANDO DATOS...")
         self.stage_label.setStyleSheet("color: #00FF00; border: 1px solid #00FF00;")
-        
-        if self.data_features['PERFECTO'] and self.data_features['MALO']:
-            
-            data_to_save = {
-                'PERFECTO': self.data_features['PERFECTO'],
-                'MALO': self.data_features['MALO']
-            }
-            
-            guardar_entrenamiento_bruto(self.nombre_perfil, data_to_save)
-            
+
+        # Los frames ya están en disco: el hilo solo los empaqueta como sesión .npz
+        self.save_thread = SaveThread(self.nombre_perfil, self.captura)
+        self.save_thread.save_finished.connect(self.on_save_finished)
+        self.save_thread.start()
+
+    def on_save_finished(self, guardado):
+        self.captura = None
+
+        if guardado:
             QMessageBox.information(self, "Entrenamiento Exitoso", 
                                     f"Perfil '{self.nombre_perfil}' entrenado con éxito.")
-            
-            sys.stdout = sys.__stdout__ # Restaurar la salida original
-            self.restart_app()
-
         else:
-            sys.stdout = sys.__stdout__ # Restaurar la salida original
             QMessageBox.critical(self, "Error de Datos", "No se capturaron suficientes datos. Intente de nuevo.")
-            self.restart_app()
+        self.restart_app()
             
     def restart_app(self):
         # Reiniciar la aplicación para un nuevo entrenamiento
-        self.data_features = {'PERFECTO': [], 'MALO': []}
         self.nombre_perfil = None
+        self._cerrar_grabacion()
         self.set_state("SELECT_PROFILE")
         self.stage_label.setText("Etapa Actual: Esperando Perfil...")
         self.camera_label.setText("Selecciona un perfil y haz clic en Iniciar.")
 
 
-    def display_image(self, img):
-        # Convertir OpenCV frame (BGR) a QImage (RGB)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = img_rgb.shape
-        bytes_per_line = ch * w
-        
-        q_img = QImage(img_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        
-        pixmap = QPixmap.fromImage(q_img)
-        self.camera_label.setPixmap(pixmap.scaled(self.camera_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+    def _cerrar_grabacion(self):
+        grabacion, self.grabacion = self.grabacion, None
+        if grabacion:
+            grabacion.cerrar()
 
     def closeEvent(self, event):
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
         self.timer.stop()
+        if self.pipeline:
+            self.pipeline.stop()
+        elif self.cap and self.cap.isOpened():
+            self.cap.release()
+        self._cerrar_grabacion()
+        if self.save_thread and self.save_thread.isRunning():
+            self.save_thread.wait()
+        elif self.captura:
+            # Lo capturado queda en disco y se ofrecerá reanudarlo al volver a abrir el perfil
+            self.captura.cerrar()
         event.accept()
 
 
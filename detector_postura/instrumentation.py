@@ -0,0 +1,185 @@
+import json
+import logging
+import math
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# --- INSTRUMENTACIÓN DEL BUCLE DE DETECCIÓN ---
+#
+# Pensada para estar siempre activa: registrar una duración cuesta un log10 y un incremento
+# de entero en un histograma de cubetas fijas (sin listas que crezcan ni ordenaciones).
+# Las estadísticas se calculan por ventanas: cada exportación escribe la ventana actual y la reinicia.
+
+class StageHistogram:
+    """Histograma de duraciones con cubetas logarítmicas fijas (20 cubetas por década, de 10 µs a ~100 s)."""
+    MIN_NS = 10_000
+    BINS_PER_DECADE = 20
+    N_BINS = 140
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (self.N_BINS + 1)
+        self.total = 0
+        self.suma_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns):
+        if ns <= self.MIN_NS:
+            idx = 0
+        else:
+            idx = min(int(math.log10(ns / self.MIN_NS) * self.BINS_PER_DECADE) + 1, self.N_BINS)
+        self.counts[idx] += 1
+        self.total += 1
+        self.suma_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def _limite_superior_ns(self, idx):
+        return self.MIN_NS * 10 ** (idx / self.BINS_PER_DECADE)
+
+    def percentil(self, p):
+        """Percentil aproximado (límite superior de la cubeta) en milisegundos."""
+        if not self.total:
+            return 0.0
+        objetivo = p / 100.0 * self.total
+        acumulado = 0
+        for idx, n in enumerate(self.counts):
+            acumulado += n
+            if acumulado >= objetivo:
+                return min(self._limite_superior_ns(idx), self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def resumen(self):
+        return {
+            'n': self.total,
+            'media_ms': self.suma_ns / self.total / 1e6 if self.total else 0.0,
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'p99_ms': self.percentil(99),
+            'max_ms': self.max_ns / 1e6,
+        }
+
+
+class StageTimer:
+    """Context manager que mide un bloque y lo registra en una etapa: `with metricas.medir('pose'): ...`"""
+    __slots__ = ('_histograma', '_inicio')
+
+    def __init__(self, histograma):
+        self._histograma = histograma
+
+    def __enter__(self):
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._histograma.add(time.perf_counter_ns() - self._inicio)
+        return False
+
+
+class DetectorMetrics:
+    """
+    Histogramas por etapa y tasas (FPS de captura, inferencia y render) de la ventana actual.
+    Cada etapa la escribe un único hilo, así que registrar no necesita locks.
+    """
+    # Etapas cuyo número de muestras da la tasa correspondiente
+    RATE_STAGES = {'fps_captura': 'captura', 'fps_inferencia': 'inferencia', 'fps_render': 'render'}
+
+    def __init__(self, ruta_exportacion=None, intervalo_exportacion=10.0):
+        self.ruta_exportacion = ruta_exportacion
+        self.intervalo_exportacion = intervalo_exportacion
+        self.etapas = {}
+        self.fuente_descartes = None  # Callable que devuelve los contadores del pipeline
+        self._lock = threading.Lock()  # Solo para crear etapas y cerrar ventanas
+        self._inicio_ventana = time.time()
+        self.ultimo_resumen = None
+
+    def etapa(self, nombre):
+        histograma = self.etapas.get(nombre)
+        if histograma is None:
+            with self._lock:
+                histograma = self.etapas.setdefault(nombre, StageHistogram())
+        return histograma
+
+    def registrar(self, nombre, ns):
+        self.etapa(nombre).add(ns)
+
+    def medir(self, nombre):
+        return StageTimer(self.etapa(nombre))
+
+    def resumen(self):
+        """Estadísticas de la ventana actual (sin reiniciarla)."""
+        duracion = max(time.time() - self._inicio_ventana, 1e-6)
+        resumen = {
+            'timestamp': time.time(),
+            'ventana_s': duracion,
+            'etapas': {nombre: h.resumen() for nombre, h in list(self.etapas.items())},
+        }
+        for clave, etapa in self.RATE_STAGES.items():
+            h = self.etapas.get(etapa)
+            resumen[clave] = h.total / duracion if h else 0.0
+        if self.fuente_descartes:
+            resumen['pipeline'] = self.fuente_descartes()
+        return resumen
+
+    def cerrar_ventana(self):
+        """Calcula el resumen de la ventana, lo exporta (si hay ruta) y empieza una ventana nueva."""
+        with self._lock:
+            resumen = self.resumen()
+            for h in self.etapas.values():
+                h.reset()
+            self._inicio_ventana = time.time()
+        self.ultimo_resumen = resumen
+
+        if self.ruta_exportacion:
+            try:
+                with open(self.ruta_exportacion, 'a') as f:
+                    f.write(json.dumps(resumen) + '\n')
+            except OSError as e:
+                log.error(f"No se pudieron exportar las métricas: {e}")
+        return resumen
+
+    def tick(self):
+        """Llamar periódicamente (p.ej. desde un QTimer): cierra la ventana cuando toca exportar."""
+        if time.time() - self._inicio_ventana >= self.intervalo_exportacion:
+            return self.cerrar_ventana()
+        return None
+
+
+def formatear_resumen(resumen):
+    """Texto corto para el panel/overlay de rendimiento."""
+    lineas = [f"FPS cámara {resumen['fps_captura']:.1f} | inferencia {resumen['fps_inferencia']:.1f} | render {resumen['fps_render']:.1f}"]
+    for nombre, stats in resumen['etapas'].items():
+        if stats['n']:
+            lineas.append(f"{nombre:<13} p50 {stats['p50_ms']:6.1f} ms  p95 {stats['p95_ms']:6.1f} ms")
+    pipeline = resumen.get('pipeline')
+    if pipeline:
+        lineas.append(f"Descartados: captura {pipeline['descartados_captura']} | render {pipeline['descartados_inferencia']}")
+    return "\n".join(lineas)
+
+
+class StartupTimeline:
+    """
+    Hitos del arranque en segundos desde `inicio` (p.ej. 'ventana', 'pose_lista', 'modelo_listo',
+    'primer_frame', 'primera_prediccion'). Cada hito se registra solo la primera vez.
+    """
+    def __init__(self, inicio=None):
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self.hitos = {}
+
+    def marcar(self, nombre):
+        if nombre not in self.hitos:
+            self.hitos[nombre] = time.perf_counter() - self.inicio
+            log.info(f"Arranque: {nombre} a los {self.hitos[nombre]:.2f} s")
+        return self.hitos[nombre]
+
+    def exportar(self, ruta):
+        """Añade los hitos como una línea {'arranque': {...}} al JSONL de métricas."""
+        try:
+            with open(ruta, 'a') as f:
+                f.write(json.dumps({'timestamp': time.time(), 'arranque': self.hitos}) + '\n')
+        except OSError as e:
+            log.error(f"No se pudieron exportar los tiempos de arranque: {e}")
@@ -0,0 +1,290 @@
+import argparse
+import csv
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from app_logging import configurar_logging
+from feature_pipeline import NUM_LANDMARKS
+from posture_logic import FeatureExtractor
+
+log = logging.getLogger(__name__)
+
+# --- GRABACIÓN Y REPRODUCCIÓN DE LANDMARKS ---
+#
+# Durante la detección o el entrenamiento, LandmarkRecorder guarda por cada frame procesado por
+# MediaPipe su timestamp, si hubo detección y los 33 landmarks (x, y, z, visibilidad), y
+# opcionalmente una miniatura RGB del frame, en un archivo binario compacto:
+#
+#   cabecera de HEADER_SIZE bytes   magic, versión, nº de landmarks, alto y ancho de la miniatura
+#   registros de tamaño fijo        dtype estructurado de dtype_registro(), uno por frame
+#
+# reproducir() pasa una grabación por el mismo camino que el detector después de la pose
+# (FeaturePipeline, clasificador, PredictionFilter y conteo de tiempos) con los timestamps
+# grabados, así que el resultado es determinista y no necesita cámara ni MediaPipe. Por defecto va
+# lo más rápido posible (miles de frames por segundo); con tiempo_real respeta los timestamps.
+#
+#   python landmark_log.py PERFILES/Escritorio/grabaciones/detector_20250101_120000.lmk --perfil Escritorio
+#   python landmark_log.py grabacion.lmk --perfil Escritorio --tiempo-real --salida estados.csv
+
+LANDMARK_LOG_MAGIC = b'LMKLOG\x00\x00'
+LANDMARK_LOG_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct('<8sIIII') # magic, versión, nº de landmarks, alto y ancho de la miniatura (0 = sin frames)
+
+RECORDINGS_DIR = 'grabaciones'
+RECORDING_EXTENSION = '.lmk'
+RECORDER_BUFFER_BYTES = 1 << 20 # Buffer de escritura: el hilo de inferencia casi nunca toca el disco
+REPLAY_CHUNK = 4096 # Frames por lote de features + predict_proba al reproducir
+
+def dtype_registro(alto=0, ancho=0):
+    """Registro de un frame; con alto y ancho incluye la miniatura RGB (uint8)."""
+    campos = [('timestamp', '<f8'), ('detectado', 'u1'), ('landmarks', '<f4', (NUM_LANDMARKS, 4))]
+    if alto and ancho:
+        campos.append(('frame', 'u1', (alto, ancho, 3)))
+    return np.dtype(campos)
+
+
+class LandmarkRecorder:
+    """
+    Graba landmarks (y opcionalmente miniaturas de `ancho_frame` px de ancho) en `ruta`.
+    La cabecera se escribe con el primer frame, cuando ya se conoce el tamaño de la miniatura.
+    """
+    def __init__(self, ruta, ancho_frame=None):
+        self.ruta = ruta
+        self.ancho_frame = ancho_frame
+        self.frames = 0
+        self._archivo = open(ruta, 'wb', buffering=RECORDER_BUFFER_BYTES)
+        self._extractor = FeatureExtractor(incluir_visibilidad=True)
+        self._registro = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self, img_rgb):
+        alto = ancho = 0
+        if self.ancho_frame and img_rgb is not None:
+            h, w = img_rgb.shape[:2]
+            ancho = min(int(self.ancho_frame), w)
+            alto = max(1, round(h * ancho / w))
+        # Registro preasignado y vistas sobre sus campos: grabar un frame no crea arrays
+        self._registro = np.zeros(1, dtype=dtype_registro(alto, ancho))
+        self._timestamp = self._registro['timestamp']
+        self._detectado = self._registro['detectado']
+        self._landmarks = self._registro['landmarks'][0].reshape(-1)
+        self._frame = self._registro['frame'][0] if alto else None
+        cabecera = _HEADER.pack(LANDMARK_LOG_MAGIC, LANDMARK_LOG_VERSION, NUM_LANDMARKS, alto, ancho)
+        self._archivo.write(cabecera.ljust(HEADER_SIZE, b'\x00'))
+
+    def registrar(self, timestamp, pose_landmarks, img_rgb=None):
+        """Añade un frame. `pose_landmarks` es el resultado de MediaPipe (o None si no hubo detección)."""
+        with self._lock:
+            if self._archivo is None:
+                return
+            if self._registro is None:
+                self._iniciar(img_rgb)
+
+            self._timestamp[0] = timestamp
+            vector = self._extractor.extraer(pose_landmarks.landmark if pose_landmarks is not None else None)
+            if vector is not None:
+                self._detectado[0] = 1
+                self._landmarks[:] = vector
+            else:
+                self._detectado[0] = 0
+                self._landmarks[:] = 0.0
+            if self._frame is not None:
+                if img_rgb is not None:
+                    # INTER_LINEAR: ~10 veces más barato que INTER_AREA y suficiente para una miniatura
+                    cv2.resize(img_rgb, (self._frame.shape[1], self._frame.shape[0]), dst=self._frame, interpolation=cv2.INTER_LINEAR)
+                else:
+                    self._frame[:] = 0
+            self._archivo.write(self._registro.data)
+            self.frames += 1
+
+    def cerrar(self):
+        """Vacía el buffer y cierra el archivo. Las llamadas posteriores a registrar() no hacen nada."""
+        with self._lock:
+            if self._archivo is None:
+                return
+            self._archivo.close()
+            self._archivo = None
+        log.info(f"Grabación de landmarks guardada: {self.ruta} ({self.frames} frames).")
+
+
+def nueva_grabacion(ruta_perfil, config, prefijo):
+    """
+    LandmarkRecorder en <perfil>/grabaciones/<prefijo>_<fecha>.lmk si la config del perfil tiene
+    'grabar_landmarks'; si no, None.
+    """
+    if not config.get('grabar_landmarks'):
+        return None
+    carpeta = os.path.join(ruta_perfil, RECORDINGS_DIR)
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"{prefijo}_{datetime.now():%Y%m%d_%H%M%S}{RECORDING_EXTENSION}"
+    return LandmarkRecorder(os.path.join(carpeta, nombre), ancho_frame=config.get('grabar_frames_ancho'))
+
+
+class LandmarkLog:
+    """Grabación abierta en solo lectura como memmap. Un último registro incompleto se ignora."""
+    def __init__(self, ruta, registros, alto, ancho):
+        self.ruta = ruta
+        self.registros = registros
+        self.alto = alto
+        self.ancho = ancho
+
+    @classmethod
+    def abrir(cls, ruta):
+        with open(ruta, 'rb') as f:
+            cabecera = f.read(HEADER_SIZE)
+        if len(cabecera) < HEADER_SIZE:
+            # Grabación sin ningún frame
+            return cls(ruta, np.zeros(0, dtype=dtype_registro()), 0, 0)
+
+        magic, version, n_landmarks, alto, ancho = _HEADER.unpack_from(cabecera)
+        if magic != LANDMARK_LOG_MAGIC:
+            raise ValueError(f"{ruta} no es una grabación de landmarks")
+        if version != LANDMARK_LOG_VERSION or n_landmarks != NUM_LANDMARKS:
+            raise ValueError(f"versión de grabación no soportada: {version} ({n_landmarks} landmarks)")
+
+        dtype = dtype_registro(alto, ancho)
+        n = (os.path.getsize(ruta) - HEADER_SIZE) // dtype.itemsize
+        if n == 0:
+            return cls(ruta, np.zeros(0, dtype=dtype), alto, ancho)
+        return cls(ruta, np.memmap(ruta, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(n,)), alto, ancho)
+
+    def __len__(self):
+        return len(self.registros)
+
+    @property
+    def timestamps(self):
+        return self.registros['timestamp']
+
+    @property
+    def detectado(self):
+        return self.registros['detectado'].astype(bool)
+
+    @property
+    def landmarks(self):
+        """(N, 33, 4) float32: x, y, z y visibilidad (ceros en los frames sin detección)."""
+        return self.registros['landmarks']
+
+    @property
+    def frames(self):
+        """(N, alto, ancho, 3) uint8 RGB, o None si se grabó sin miniaturas."""
+        return self.registros['frame'] if 'frame' in self.registros.dtype.names else None
+
+
+def reproducir(grabacion, clasificador, tiempo_real=False, estados=None):
+    """
+    Pasa una grabación (ruta o LandmarkLog) por features, clasificador, PredictionFilter y conteo
+    de tiempos, como el detector. Si `estados` es una lista, se le añade por frame
+    (timestamp, predicción, estado filtrado); en frames sin detección, (timestamp, None, None).
+    Devuelve un resumen con frames, tiempos de buena y mala postura, duración y FPS de reproducción.
+    """
+    from feature_pipeline import FeaturePipeline
+    from posture_logic import nuevo_filtro_prediccion, ContadorTiempos
+
+    if not isinstance(grabacion, LandmarkLog):
+        grabacion = LandmarkLog.abrir(grabacion)
+    # Un único flujo para toda la grabación: la ventana temporal, si la hay, continúa entre lotes
+    feature_stream = FeaturePipeline.del_modelo(clasificador).flujo()
+    clases = clasificador.classes_
+    prediction_filter = nuevo_filtro_prediccion(clases)
+    tiempos = ContadorTiempos()
+
+    n = len(grabacion)
+    detecciones = 0
+    ultimo_ts = None
+    t_inicio = time.perf_counter()
+    ts_inicio = None
+
+    for inicio in range(0, n, REPLAY_CHUNK):
+        lote = grabacion.registros[inicio:inicio + REPLAY_CHUNK]
+        timestamps = lote['timestamp'].tolist()
+        detectado = lote['detectado'].astype(bool)
+        # Features y probabilidades de todo el lote de una vez; el filtro sí va frame a frame
+        indices = np.flatnonzero(detectado)
+        probabilidades = np.empty((len(lote), len(clases)))
+        if len(indices):
+            X = feature_stream.transformar_lote(lote['landmarks'][indices], lote['timestamp'][indices])
+            probabilidades[indices] = clasificador.predict_proba(X)
+        predicciones = probabilidades.argmax(axis=1)
+
+        for i, timestamp in enumerate(timestamps):
+            if tiempo_real:
+                if ts_inicio is None:
+                    ts_inicio = timestamp
+                espera = (timestamp - ts_inicio) - (time.perf_counter() - t_inicio)
+                if espera > 0:
+                    time.sleep(espera)
+
+            # Mismo conteo que el detector: sin detección no se acumula, pero el frame sí avanza el reloj
+            delta = 0.0 if ultimo_ts is None else timestamp - ultimo_ts
+            ultimo_ts = timestamp
+            if not detectado[i]:
+                if estados is not None:
+                    estados.append((timestamp, None, None))
+                continue
+
+            prediction = clases[predicciones[i]]
+            prediction_filter.add_prediction(prediction, probabilidades[i], timestamp)
+            estado = prediction_filter.get_dominant_prediction()
+            tiempos.registrar(estado, delta)
+            detecciones += 1
+            if estados is not None:
+                estados.append((timestamp, prediction, estado))
+
+    segundos = time.perf_counter() - t_inicio
+    return {
+        'frames': n,
+        'detecciones': detecciones,
+        'tiempo_bueno': tiempos.bueno,
+        'tiempo_malo': tiempos.malo,
+        'duracion_grabacion': float(grabacion.timestamps[-1] - grabacion.timestamps[0]) if n else 0.0,
+        'segundos': segundos,
+        'fps': n / segundos if segundos > 0 else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduce una grabación de landmarks con el modelo de un perfil (sin cámara ni MediaPipe).")
+    parser.add_argument('grabacion', help="Archivo .lmk grabado por el detector o el entrenador.")
+    parser.add_argument('--perfil', required=True, help="Perfil cuyo modelo se usará.")
+    parser.add_argument('--tiempo-real', action='store_true', help="Respetar los timestamps grabados en lugar de ir lo más rápido posible.")
+    parser.add_argument('--salida', help="Guardar el estado filtrado de cada frame en CSV.")
+    args = parser.parse_args(argv)
+    configurar_logging()
+
+    from posture_logic import cargar_clasificador_perfil
+
+    try:
+        grabacion = LandmarkLog.abrir(args.grabacion)
+    except (OSError, ValueError) as e:
+        log.error(e)
+        return 1
+
+    clasificador = cargar_clasificador_perfil(args.perfil)
+    if clasificador is None:
+        log.error(f"El perfil '{args.perfil}' no tiene datos suficientes para entrenar.")
+        return 1
+
+    estados = [] if args.salida else None
+    resumen = reproducir(grabacion, clasificador, tiempo_real=args.tiempo_real, estados=estados)
+
+    if args.salida:
+        with open(args.salida, 'w', newline='') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(['timestamp', 'prediccion', 'estado'])
+            for timestamp, prediction, estado in estados:
+                escritor.writerow([f"{timestamp:.6f}", prediction or '', estado or ''])
+
+    print(f"{resumen['frames']} frames ({resumen['detecciones']} con detección, {resumen['duracion_grabacion']:.1f} s grabados) "
+          f"en {resumen['segundos']:.3f} s: {resumen['fps']:.0f} FPS")
+    print(f"Tiempo con buena postura: {resumen['tiempo_bueno']:.1f} s  |  con mala postura: {resumen['tiempo_malo']:.1f} s")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
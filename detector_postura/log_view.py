@@ -0,0 +1,35 @@
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QPlainTextEdit
+
+# --- VISTA DEL LOG EN LA GUI ---
+#
+# El widget no recibe una señal por cada línea: un QTimer lee del RingBufferHandler las líneas
+# nuevas `intervalo_ms` veces por segundo como mucho y las añade de una vez, así que un hilo que
+# registra mucho no inunda el bucle de eventos. El documento se limita a `max_lineas` líneas
+# (QPlainTextEdit descarta las más antiguas), de modo que sesiones largas no hacen crecer la memoria.
+
+LOG_MAX_LINES = 1000 # Líneas visibles como máximo en el widget
+LOG_FLUSH_MS = 200 # Intervalo entre volcados del buffer al widget
+
+class LogView(QPlainTextEdit):
+    """Log de solo lectura alimentado por un app_logging.RingBufferHandler."""
+    def __init__(self, buffer, max_lineas=LOG_MAX_LINES, intervalo_ms=LOG_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lineas)
+        self._buffer = buffer
+        self._seq = 0 # Se muestran también las líneas registradas antes de crear la ventana
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.volcar)
+        self._timer.start(intervalo_ms)
+
+    def volcar(self):
+        """Añade al widget, en un único bloque, las líneas registradas desde el último volcado."""
+        self._seq, lineas, perdidas = self._buffer.leer_desde(self._seq)
+        if not lineas:
+            return
+        if perdidas:
+            lineas.insert(0, f"[... {perdidas} líneas omitidas]")
+        # appendPlainText mantiene el scroll al final si ya lo estaba
+        self.appendPlainText("\n".join(lineas))
@@ -0,0 +1,167 @@
+import logging
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import GroupKFold
+
+from fast_forest import FlatForest
+from feature_pipeline import FeaturePipeline
+from posture_logic import obtener_ruta_perfil, cargar_config_perfil, cargar_datos_brutos_para_recalculo, config_modelo_perfil, calcular_huella_entrenamiento, cargar_modelo_cache, guardar_modelo_cache, cargar_modelo_exportado, exportar_modelo
+from session_storage import sesiones_dataset_consolidado, frames_dataset_consolidado, archivos_por_numero, cargar_sesion
+
+log = logging.getLogger(__name__)
+ML = {'etiqueta': 'ML'} # Los mensajes del entrenamiento se marcan como [ML] en el log
+
+# --- ENTRENAMIENTO DEL MODELO ML ---
+# Sin dependencias de PyQt: lo usan tanto el detector (en su TrainerThread) como las herramientas de consola.
+
+# --- SELECCIÓN DE MODELO POR VALIDACIÓN CRUZADA ---
+#
+# Con 'validacion_cruzada' en la config del perfil, cada combinación de la rejilla se evalúa con
+# k-fold agrupado por sesión (los frames de una sesión son casi idénticos entre sí: si cayeran a
+# ambos lados de un pliegue, la precisión saldría inflada). Todos los (candidato, pliegue) se
+# entrenan en paralelo, un proceso por núcleo. Después, por orden de precisión, se entrena cada
+# candidato con todos los datos y se mide su latencia por frame como FlatForest (lo que usa el
+# detector); se queda el primero que cabe en 'presupuesto_latencia_ms'.
+# FlatForest recorre un nivel por iteración, así que su latencia crece con la profundidad máxima
+# por el número de árboles: la rejilla solo tiene bosques de profundidad acotada, que se quedan
+# en decenas de µs por frame (sin límite, los árboles llegan a ~30 niveles y 100 tardan ~150 µs).
+
+CV_FOLDS = 5
+CV_GRID = {'n_estimators': (25, 50, 100), 'max_depth': (8, 12)}
+LATENCY_SAMPLES = 200 # Predicciones de una muestra para medir la latencia de cada candidato
+
+def _nuevo_bosque(n_estimators=100, max_depth=None, n_jobs=None):
+    return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42,
+                                  class_weight='balanced', n_jobs=n_jobs)
+
+def _evaluar_pliegue(X, y, entrenamiento, prueba, n_estimators, max_depth):
+    """Precisión en el pliegue de prueba de un bosque entrenado con el resto (un solo hilo)."""
+    modelo = _nuevo_bosque(n_estimators, max_depth, n_jobs=1).fit(X[entrenamiento], y[entrenamiento])
+    return accuracy_score(y[prueba], modelo.predict(X[prueba]))
+
+def medir_latencia_ms(modelo, X, n=LATENCY_SAMPLES):
+    """p95 (ms) de predecir una sola muestra con el bosque aplanado, sobre filas de X."""
+    clasificador = FlatForest.desde_sklearn(modelo)
+    filas = X[np.linspace(0, len(X) - 1, n).astype(np.intp)]
+    clasificador.predecir_proba_uno(filas[0])
+    tiempos = np.empty(n)
+    for i, x in enumerate(filas):
+        t0 = time.perf_counter_ns()
+        clasificador.predecir_proba_uno(x)
+        tiempos[i] = time.perf_counter_ns() - t0
+    return float(np.percentile(tiempos, 95)) / 1e6
+
+def seleccionar_modelo_cv(X, y, grupos, presupuesto_ms, pliegues=CV_FOLDS, rejilla=CV_GRID):
+    """
+    Devuelve el bosque más preciso (validación cruzada agrupada por `grupos`) cuya latencia cabe
+    en `presupuesto_ms`, entrenado con todos los datos. Si ninguno cabe, el más rápido.
+    """
+    pliegues = min(pliegues, len(np.unique(grupos)))
+    particiones = list(GroupKFold(n_splits=pliegues).split(X, y, grupos))
+    candidatos = [(n, d) for n in rejilla['n_estimators'] for d in rejilla['max_depth']]
+
+    log.info(f"Validación cruzada: {len(candidatos)} candidatos x {pliegues} pliegues agrupados por sesión.", extra=ML)
+    precisiones = Parallel(n_jobs=-1)(delayed(_evaluar_pliegue)(X, y, entrenamiento, prueba, n, d)
+                                      for n, d in candidatos for entrenamiento, prueba in particiones)
+    precisiones = np.asarray(precisiones).reshape(len(candidatos), pliegues)
+
+    # Por precisión media descendente; a igualdad, antes el bosque más pequeño
+    orden = sorted(range(len(candidatos)), key=lambda i: (-precisiones[i].mean(), candidatos[i][0]))
+    mas_rapido = None
+    for i in orden:
+        n, d = candidatos[i]
+        modelo = _nuevo_bosque(n, d, n_jobs=-1).fit(X, y)
+        modelo.n_jobs = None  # En el detector se predice de una en una: sin pool de hilos
+        latencia = medir_latencia_ms(modelo, X)
+        log.info(f"n_estimators={n} max_depth={d}: precisión {precisiones[i].mean():.3f} ± {precisiones[i].std():.3f}, "
+                 f"latencia p95 {latencia:.3f} ms", extra=ML)
+        if latencia <= presupuesto_ms:
+            log.info(f"Elegido n_estimators={n} max_depth={d} (presupuesto {presupuesto_ms} ms por frame).", extra=ML)
+            return modelo
+        if mas_rapido is None or latencia < mas_rapido[0]:
+            mas_rapido = (latencia, modelo, n, d)
+
+    latencia, modelo, n, d = mas_rapido
+    log.warning(f"Ningún candidato cabe en {presupuesto_ms} ms; se usa el más rápido (n_estimators={n} max_depth={d}, {latencia:.3f} ms).")
+    return modelo
+
+def features_temporales_dataset(pipeline, ruta_perfil, datos_brutos):
+    """
+    Features del modelo (con ventana temporal) de cada fila del dataset consolidado. La ventana
+    necesita los frames anteriores de la misma sesión, que la compactación pudo descartar: se
+    recalcula sobre cada sesión completa y se toman las filas conservadas.
+    """
+    sesiones = sesiones_dataset_consolidado(ruta_perfil)
+    frames = frames_dataset_consolidado(ruta_perfil)
+    archivos = archivos_por_numero(ruta_perfil)
+    salida = {clase: np.empty((len(datos_brutos[clase]), pipeline.n_features), dtype=np.float32) for clase in datos_brutos}
+
+    for numero in np.unique(np.concatenate([sesiones[clase] for clase in salida])):
+        data_sesion = cargar_sesion(archivos[numero])
+        for clase, X in salida.items():
+            filas = np.flatnonzero(sesiones[clase] == numero)
+            if len(filas):
+                X[filas] = pipeline.transformar_secuencia(data_sesion[clase])[frames[clase][filas]]
+    return salida
+
+def entrenar_modelo_rf(nombre_perfil):
+    """
+    Carga el modelo en caché si los datos no han cambiado; si no, entrena el Random Forest
+    con todos los datos del perfil. En ambos casos deja al día el modelo exportado que usa el
+    detector. Devuelve None si no hay datos suficientes.
+    """
+    config = cargar_config_perfil(nombre_perfil)
+    pipeline = FeaturePipeline(config['features'])
+    huella = calcular_huella_entrenamiento(nombre_perfil, config_modelo_perfil(config))
+    modelo_cache = cargar_modelo_cache(nombre_perfil, huella)
+    if modelo_cache is not None:
+        log.info("Modelo cargado desde caché (sin cambios en los datos de entrenamiento).", extra=ML)
+        if cargar_modelo_exportado(nombre_perfil, huella, config['umbrales_float16']) is None:
+            exportar_modelo(nombre_perfil, modelo_cache, huella, config['umbrales_float16'])
+        return modelo_cache
+
+    log.info("--- INICIANDO ENTRENAMIENTO ML ---", extra=ML)
+    datos_brutos = cargar_datos_brutos_para_recalculo(nombre_perfil)
+
+    X_perfecto = datos_brutos['PERFECTO']
+    X_malo = datos_brutos['MALO']
+
+    if len(X_perfecto) == 0 or len(X_malo) == 0:
+        return None
+
+    y_perfecto = np.array(['PERFECTO'] * len(X_perfecto))
+    y_malo = np.array(['MALO'] * len(X_malo))
+
+    # Las sesiones guardan landmarks crudos: el modelo se entrena con las features del pipeline
+    if pipeline.temporal:
+        features = features_temporales_dataset(pipeline, obtener_ruta_perfil(nombre_perfil), {'PERFECTO': X_perfecto, 'MALO': X_malo})
+        X = np.concatenate([features['PERFECTO'], features['MALO']])
+    else:
+        X = pipeline.transformar(np.concatenate([X_perfecto, X_malo]))
+    y = np.concatenate([y_perfecto, y_malo])
+
+    grupos = None
+    if config['validacion_cruzada']:
+        sesiones = sesiones_dataset_consolidado(obtener_ruta_perfil(nombre_perfil))
+        grupos = np.concatenate([sesiones['PERFECTO'], sesiones['MALO']])
+        if len(np.unique(grupos)) < 2:
+            log.info("La validación cruzada necesita al menos 2 sesiones; se entrena el modelo por defecto.", extra=ML)
+            grupos = None
+
+    if grupos is not None:
+        model = seleccionar_modelo_cv(X, y, grupos, config['presupuesto_latencia_ms'])
+    else:
+        model = _nuevo_bosque()
+        model.fit(X, y)
+        y_pred = model.predict(X)
+        accuracy = accuracy_score(y, y_pred)
+        log.info(f"Entrenamiento completado ({pipeline.n_features} features por frame). Precisión en el dataset de entrenamiento: {accuracy:.2f}", extra=ML)
+    pipeline.asociar(model)
+
+    guardar_modelo_cache(nombre_perfil, model, huella)
+    exportar_modelo(nombre_perfil, model, huella, config['umbrales_float16'])
+    return model
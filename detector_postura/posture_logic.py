@@ -1,91 +1,279 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-import json
 import os
+import json
+import logging
 import math
-import glob
 from collections import deque
-import sys
 import threading
 import time
-from PyQt6.QtCore import QObject, pyqtSignal
+import hashlib
+import pickle
+
+from fast_forest import FlatForest
+from feature_pipeline import NUM_LANDMARKS, DEFAULT_FEATURE_CONFIG, FeaturePipeline
+from session_storage import FEATURE_DTYPE, DATASET_MAX_ROWS_PER_CLASS, DEDUP_THRESHOLD, RECENCY_HALF_LIFE, listar_archivos_entrenamiento, siguiente_numero_sesion, guardar_sesion_npz, cargar_dataset_consolidado
 
-# Importamos winsound solo si estamos en Windows
-if sys.platform.startswith('win'):
-    import winsound
+log = logging.getLogger(__name__)
 
 # --- CONFIGURACIÓN DE ARCHIVOS Y CARPETAS ---
 PERFILES_DIR = 'PERFILES'
-TRAINING_FILE_PATTERN = 'entrenamiento_*.json'
+MODEL_CACHE_FILE = 'modelo_rf.pkl'
+MODEL_EXPORT_DIR = 'modelo_exportado' # Bosque aplanado que carga el detector sin sklearn (ver fast_forest.py)
+# Se incrementa cuando cambia la forma de entrenar, para invalidar los modelos en caché
+MODEL_CACHE_VERSION = 2
+PROFILE_CONFIG_FILE = 'config.json'
 
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Configuración por defecto de cada perfil (se guarda en PERFILES/<perfil>/config.json)
+DEFAULT_PROFILE_CONFIG = {
+    'resolucion_camara': None,      # [ancho, alto] pedido a la cámara, o None para la suya por defecto
+    'resolucion_inferencia': None,  # Lado mayor (px) de la imagen que recibe MediaPipe, o None para no reducir
+    'model_complexity': 1,          # 0 = rápido, 1 = equilibrado, 2 = preciso
+    'seguimiento_roi': False,       # Recortar alrededor de cabeza y torso usando los landmarks anteriores
+    'margen_roi': 0.3,              # Margen del recorte, como fracción del tamaño del torso
+    'fps_display_max': 30,          # Límite de repintado del vídeo en la ventana (None = sin límite)
+    'display_rapido': False,        # Escalado por vecino más cercano (más barato, menos suave)
+    'features': DEFAULT_FEATURE_CONFIG, # Pipeline de features del modelo (ver feature_pipeline.py)
+    'validacion_cruzada': False,    # Elegir el tamaño del bosque por validación cruzada agrupada por sesión
+    'presupuesto_latencia_ms': 1.0, # Latencia máxima (p95) del clasificador por frame al elegir el modelo
+    'max_frames_por_clase': DATASET_MAX_ROWS_PER_CLASS, # Tope de frames por clase del dataset (None = sin tope)
+    'umbral_duplicados': DEDUP_THRESHOLD,  # Frames más parecidos que esto al anterior se descartan (0 = ninguno)
+    'vida_media_sesiones': RECENCY_HALF_LIFE, # Una sesión pesa el doble que otra tantas sesiones más antigua
+    'grabar_landmarks': False,      # Grabar los landmarks de cada frame en grabaciones/ (ver landmark_log.py)
+    'grabar_frames_ancho': None,    # Ancho (px) de la miniatura grabada con cada frame, o None para no grabar imagen
+    'umbrales_float16': False,      # Exportar los umbrales del bosque en float16 (modelo más pequeño, ligeramente aproximado)
+}
 
-# Definición de la instancia pose 
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+# Claves de la configuración que determinan el contenido del dataset de entrenamiento
+DATASET_CONFIG_KEYS = ('max_frames_por_clase', 'umbral_duplicados', 'vida_media_sesiones')
 
-# --- CONTROL ASÍNCRONO DE ALARMA ---
+# --- CARGA DIFERIDA DE MEDIAPIPE ---
+#
+# Importar mediapipe tarda varios segundos y crear el grafo de Pose otros tantos, así que no se hace
+# al importar este módulo sino la primera vez que se necesita (normalmente en un hilo de
+# calentamiento, con la ventana ya visible). `mp_pose`, `mp_drawing`, los estilos de dibujo y la
+# instancia global `pose` siguen disponibles como atributos del módulo: se cargan al primer acceso.
 
-# Globales para el control del hilo de la alarma
-current_alarm_thread = None 
-alarm_stop_event = threading.Event()
+_MEDIAPIPE_NAMES = ('mp_pose', 'mp_drawing', 'LANDMARK_SPEC_RGB', 'CONNECTION_SPEC_RGB')
+_mediapipe_lock = threading.Lock()
 
-def run_alarm_task(duration_ms):
-    """Tarea que se ejecuta en un hilo, reproduce el beep, y se detiene si se dispara el evento."""
-    global current_alarm_thread
-    
-    alarm_stop_event.clear()
+def cargar_mediapipe():
+    """Importa mediapipe la primera vez que se llama (es seguro desde varios hilos). Devuelve mp_pose."""
+    if 'mp_pose' not in globals():
+        with _mediapipe_lock:
+            if 'mp_pose' not in globals():
+                import mediapipe as mp
+                drawing = mp.solutions.drawing_utils
+                # Estilos de dibujo por defecto de MediaPipe, con los colores en orden RGB: los landmarks se
+                # dibujan sobre el frame RGB que ya se generó para la inferencia (sin volver a convertir de BGR)
+                globals().update(mp_drawing=drawing,
+                                 LANDMARK_SPEC_RGB=drawing.DrawingSpec(color=(255, 0, 0)),
+                                 CONNECTION_SPEC_RGB=drawing.DrawingSpec(color=(255, 255, 255)),
+                                 mp_pose=mp.solutions.pose)
+    return globals()['mp_pose']
 
-    start_time = time.time()
-    end_time = start_time + (duration_ms / 1000.0)
-    
-    # Bucle para mantener el sonido activo (o simularlo) y verificar si debe parar
-    while time.time() < end_time and not alarm_stop_event.is_set():
-        if sys.platform.startswith('win'):
-            # Beep corto de 100ms para simular un tono continuo de 5s
-            winsound.Beep(400, 100) 
-        else:
-            print("[ALERTA AUDITIVA] BEEP! (simulando...)")
-        
-        time.sleep(0.1) 
-    
-    current_alarm_thread = None # La alarma ha terminado su ciclo o fue detenida
+def cargar_dibujo_mediapipe():
+    """Como cargar_mediapipe(), pero devuelve (mp_drawing, estilo de landmarks, estilo de conexiones)."""
+    cargar_mediapipe()
+    modulo = globals()
+    return modulo['mp_drawing'], modulo['LANDMARK_SPEC_RGB'], modulo['CONNECTION_SPEC_RGB']
+
+def __getattr__(nombre):
+    if nombre in _MEDIAPIPE_NAMES:
+        cargar_mediapipe()
+        return globals()[nombre]
+    if nombre == 'pose':
+        # Definición de la instancia pose (se crea al primer uso)
+        mp_pose = cargar_mediapipe()
+        with _mediapipe_lock:
+            if 'pose' not in globals():
+                globals()['pose'] = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        return globals()['pose']
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+# --- CONTROL ASÍNCRONO DE ALARMA ---
+
+# Un único hilo planificador (alarm_scheduler.py) atiende todas las alarmas; se crea al primer uso.
+# Estas funciones se pueden llamar en cada frame: si el estado no cambia, no cuestan nada.
+_alarm_scheduler = None
+_alarm_lock = threading.Lock()
+
+def obtener_alarma():
+    """Devuelve el planificador de alarmas del proceso, creándolo y arrancándolo la primera vez."""
+    global _alarm_scheduler
+    if _alarm_scheduler is None:
+        with _alarm_lock:
+            if _alarm_scheduler is None:
+                from alarm_scheduler import AlarmScheduler
+                scheduler = AlarmScheduler()
+                scheduler.start()
+                _alarm_scheduler = scheduler
+    return _alarm_scheduler
 
 def disparar_alarma_interruptible():
-    """Llama a la alarma en un hilo y guarda la referencia, SOLO si no está sonando."""
-    global current_alarm_thread
-    
-    # Solo dispara si NO hay un hilo de alarma activo
-    if current_alarm_thread is None or not current_alarm_thread.is_alive():
-        current_alarm_thread = threading.Thread(target=run_alarm_task, args=(5000,)) # 5 segundos
-        current_alarm_thread.start()
+    """Pide la alarma: suena hasta 5 s salvo que se llame a detener_alarma() antes."""
+    obtener_alarma().activar()
 
 def detener_alarma():
-    """Dispara el evento para que el hilo de la alarma detenga su ciclo."""
-    global current_alarm_thread
-    if current_alarm_thread and current_alarm_thread.is_alive():
-        alarm_stop_event.set()
-        print("[ALERTA] Alarma interrumpida.")
+    """Interrumpe la alarma en curso (si no hay planificador todavía, no hay nada que parar)."""
+    if _alarm_scheduler is not None:
+        _alarm_scheduler.desactivar()
 
 # --- CLASE: FILTRO DE PREDICCIÓN (Usado en run_detector.py) ---
 
+# Filtro del detector; el motor multicámara y la reproducción de grabaciones usan el mismo
+FILTER_WINDOW_SECONDS = 0.5 # Ventana temporal (equivale a ~15 frames a 30 FPS)
+FILTER_ENTER_THRESHOLD = 0.6 # Probabilidad media necesaria para cambiar de estado
+FILTER_EXIT_THRESHOLD = 0.4 # Por debajo de esto se abandona el estado actual
+
 class PredictionFilter:
-    """Clase para determinar la predicción dominante en una ventana de frames."""
-    def __init__(self, window_size=15):
-        self.window = deque(maxlen=window_size)
-    
-    def add_prediction(self, prediction):
-        self.window.append(prediction)
-    
+    """
+    Filtro temporal de predicciones. Mantiene los conteos por clase y la suma de probabilidades
+    de la ventana de forma incremental (O(1) por frame al añadir y al expulsar), puede suavizar
+    probabilidades (media de la ventana o EMA) y aplica histéresis antes de cambiar de estado.
+
+    - window_size: ventana en número de frames (si no se indica window_seconds).
+    - window_seconds: ventana en segundos; el comportamiento no depende de los FPS.
+    - suavizado: 'media' (media de la ventana) o 'ema' (media móvil exponencial).
+    - umbral_entrada / umbral_salida: para cambiar a otra clase su puntuación debe llegar a
+      umbral_entrada, o la del estado actual caer por debajo de umbral_salida.
+      Con 0.5 / 0.5 equivale a quedarse con la clase mayoritaria.
+    """
+    def __init__(self, window_size=15, window_seconds=None, clases=None, suavizado='media',
+                 umbral_entrada=0.5, umbral_salida=0.5):
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.suavizado = suavizado
+        self.umbral_entrada = umbral_entrada
+        self.umbral_salida = umbral_salida
+
+        self.window = deque()  # (timestamp, predicción, vector de probabilidades)
+        self.counts = {}
+        self.clases = []
+        self._indices = {}
+        self._suma = []
+        self._ema = []
+        self._ultimo_timestamp = None
+        self.estado = None
+        for clase in (clases if clases is not None else []):
+            self._indice_clase(clase)
+
+    def _indice_clase(self, clase):
+        idx = self._indices.get(clase)
+        if idx is None:
+            idx = len(self.clases)
+            self._indices[clase] = idx
+            self.clases.append(clase)
+            self.counts[clase] = 0
+            self._suma.append(0.0)
+            self._ema.append(0.0)
+        return idx
+
+    def add_prediction(self, prediction, probabilidades=None, timestamp=None):
+        """
+        Añade una predicción. `probabilidades` (opcional) va en el orden de `clases`, que entonces
+        hay que pasar al crear el filtro; sin ellas la predicción cuenta como probabilidad 1 para su clase.
+        """
+        if probabilidades is None:
+            idx = self._indice_clase(prediction)
+            vector = [0.0] * len(self.clases)
+            vector[idx] = 1.0
+        else:
+            vector = [float(p) for p in probabilidades]
+            if prediction not in self._indices or len(vector) != len(self.clases):
+                raise ValueError(f"probabilidades de {len(vector)} clases para un filtro que conoce {self.clases}; "
+                                 "pasa `clases` (en el orden de las probabilidades) al crear el PredictionFilter")
+        if timestamp is None:
+            timestamp = time.time()
+
+        self.window.append((timestamp, prediction, vector))
+        self.counts[prediction] += 1
+        suma = self._suma
+        for i, p in enumerate(vector):
+            suma[i] += p
+
+        self._actualizar_ema(vector, timestamp)
+        self._expulsar(timestamp)
+        self._actualizar_estado()
+
+    def _expulsar(self, ahora):
+        """Saca de la ventana lo que ya no entra, restando sus conteos y probabilidades."""
+        window, suma = self.window, self._suma
+        while window and (len(window) > self.window_size if self.window_seconds is None
+                          else ahora - window[0][0] > self.window_seconds):
+            _, prediction, vector = window.popleft()
+            self.counts[prediction] -= 1
+            for i, p in enumerate(vector):
+                suma[i] -= p
+
+    def _actualizar_ema(self, vector, timestamp):
+        if self.suavizado != 'ema':
+            return
+        if self._ultimo_timestamp is None:
+            alpha = 1.0
+        elif self.window_seconds is not None:
+            # Constante de tiempo en segundos: el suavizado es el mismo a cualquier frame rate
+            alpha = 1.0 - math.exp(-max(timestamp - self._ultimo_timestamp, 0.0) / self.window_seconds)
+        else:
+            alpha = 2.0 / (self.window_size + 1)
+        self._ultimo_timestamp = timestamp
+
+        ema = self._ema
+        for i, p in enumerate(vector):
+            ema[i] += alpha * (p - ema[i])
+
+    def get_scores(self):
+        """Puntuación suavizada de cada clase (probabilidad media de la ventana o EMA)."""
+        if not self.window:
+            return {}
+        if self.suavizado == 'ema':
+            return dict(zip(self.clases, self._ema))
+        n = len(self.window)
+        return {clase: self._suma[i] / n for i, clase in enumerate(self.clases)}
+
+    def _actualizar_estado(self):
+        scores = self.get_scores()
+        mejor = max(scores, key=scores.get)
+        if self.estado is None:
+            self.estado = mejor
+        elif mejor != self.estado:
+            if scores[mejor] >= self.umbral_entrada or scores.get(self.estado, 0.0) < self.umbral_salida:
+                self.estado = mejor
+
+    def confianza(self):
+        """Puntuación suavizada del estado actual (0 si la ventana está vacía)."""
+        return self.get_scores().get(self.estado, 0.0)
+
     def get_dominant_prediction(self):
-        """Devuelve la clase ('PERFECTO', 'MALO', etc.) más común en la ventana."""
+        """Devuelve el estado filtrado ('PERFECTO', 'MALO', etc.), con histéresis."""
         if not self.window: return 'Buscando'
-        counts = {}
-        for p in self.window:
-            counts[p] = counts.get(p, 0) + 1
-        
-        return max(counts, key=counts.get)
+        return self.estado
+
+    def reset(self):
+        self.__init__(self.window_size, self.window_seconds, self.clases, self.suavizado,
+                      self.umbral_entrada, self.umbral_salida)
+
+def nuevo_filtro_prediccion(clases):
+    """PredictionFilter con la configuración del detector para las clases de un modelo."""
+    return PredictionFilter(window_seconds=FILTER_WINDOW_SECONDS, clases=list(clases),
+                            umbral_entrada=FILTER_ENTER_THRESHOLD, umbral_salida=FILTER_EXIT_THRESHOLD)
+
+# --- CONTEO DE TIEMPO POR ESTADO ---
+
+class ContadorTiempos:
+    """
+    Acumula el tiempo de cada frame en el estado filtrado: PERFECTO y ACEPTABLE cuentan como
+    buena postura y MALO como mala. Lo comparten el detector, el motor multicámara y la reproducción.
+    """
+    def __init__(self):
+        self.bueno = 0.0
+        self.malo = 0.0
+
+    def registrar(self, estado, delta):
+        if estado == 'MALO':
+            self.malo += delta
+        elif estado in ('PERFECTO', 'ACEPTABLE'):
+            self.bueno += delta
 
 # --- FUNCIONES DE PERSISTENCIA Y RUTAS ---
 
@@ -103,61 +291,399 @@ def obtener_nombres_de_perfiles():
     return [d for d in os.listdir(PERFILES_DIR) if os.path.isdir(os.path.join(PERFILES_DIR, d))]
 
 def guardar_entrenamiento_bruto(nombre_perfil, data_angulos_sesion):
-    """Guarda la sesión de entrenamiento actual en un archivo JSON numerado."""
+    """Guarda la sesión de entrenamiento actual en un archivo binario (.npz) numerado."""
     ruta_perfil = obtener_ruta_perfil(nombre_perfil)
     
-    archivos_existentes = glob.glob(os.path.join(ruta_perfil, TRAINING_FILE_PATTERN.replace('*', '[0-9]*')))
-    
-    nueva_version = len(archivos_existentes) + 1
-    nombre_archivo = f"entrenamiento_{nueva_version:03d}.json"
+    nueva_version = siguiente_numero_sesion(ruta_perfil)
+    nombre_archivo = f"entrenamiento_{nueva_version:03d}.npz"
     
     ruta_completa = os.path.join(ruta_perfil, nombre_archivo)
-    
-    with open(ruta_completa, 'w') as f:
-        json.dump(data_angulos_sesion, f, indent=4)
+    guardar_sesion_npz(ruta_completa, data_angulos_sesion)
         
-    print(f"[INFO] Sesión de entrenamiento guardada como: {nombre_archivo}")
+    log.info(f"Sesión de entrenamiento guardada como: {nombre_archivo}")
+    # La sesión se incorpora ya al dataset compactado: el tope por clase se aplica al guardar
+    cargar_datos_brutos_para_recalculo(nombre_perfil)
+
+def _cargar_dataset_perfil(nombre_perfil):
+    config = cargar_config_perfil(nombre_perfil)
+    return cargar_dataset_consolidado(obtener_ruta_perfil(nombre_perfil), max_filas=config['max_frames_por_clase'],
+                                      umbral_duplicados=config['umbral_duplicados'], vida_media=config['vida_media_sesiones'])
 
 def cargar_datos_brutos_para_recalculo(nombre_perfil):
-    """Carga y consolida TODOS los datos brutos de entrenamiento de una carpeta de perfil."""
-    ruta_perfil = obtener_ruta_perfil(nombre_perfil)
-    
-    datos_consolidados = {
-        'PERFECTO': [], 
-        'MALO': []
-    }
-    
-    archivos_entrenamiento = glob.glob(os.path.join(ruta_perfil, TRAINING_FILE_PATTERN))
-    
-    for archivo in archivos_entrenamiento:
+    """
+    Carga y consolida los datos brutos de entrenamiento de una carpeta de perfil (sesiones
+    .npz y .json antiguas). Devuelve {clase: array float32 (N, n_features)}. Usa el dataset
+    consolidado del perfil, así que solo se leen las sesiones nuevas, y cada clase queda
+    compactada (sin frames duplicados y con como mucho 'max_frames_por_clase' frames).
+    """
+    datos_consolidados = _cargar_dataset_perfil(nombre_perfil)
+
+    for clase in ('PERFECTO', 'MALO'):
+        datos_consolidados.setdefault(clase, np.empty((0, 0), dtype=FEATURE_DTYPE))
+    return datos_consolidados
+
+# --- CONFIGURACIÓN POR PERFIL ---
+
+def cargar_config_perfil(nombre_perfil):
+    """
+    Devuelve la configuración de cámara e inferencia del perfil (valores por defecto para lo que
+    no esté definido). Si el perfil aún no tiene config.json, lo crea con los valores por defecto.
+    """
+    ruta_config = os.path.join(obtener_ruta_perfil(nombre_perfil), PROFILE_CONFIG_FILE)
+    config = dict(DEFAULT_PROFILE_CONFIG)
+
+    if os.path.exists(ruta_config):
         try:
-            with open(archivo, 'r') as f:
-                data_sesion = json.load(f)
-                
-                if 'PERFECTO' in data_sesion and 'MALO' in data_sesion:
-                    datos_consolidados['PERFECTO'].extend(data_sesion['PERFECTO'])
-                    datos_consolidados['MALO'].extend(data_sesion['MALO'])
-                    
+            with open(ruta_config, 'r') as f:
+                config.update(json.load(f))
         except Exception as e:
-            print(f"[ERROR] Error al leer archivo {archivo}: {e}")
-            
-    return datos_consolidados
+            log.error(f"Configuración del perfil ilegible, se usan los valores por defecto: {e}")
+    else:
+        guardar_config_perfil(nombre_perfil, config)
+    return config
+
+def guardar_config_perfil(nombre_perfil, config):
+    """Guarda la configuración de cámara e inferencia del perfil."""
+    ruta_config = os.path.join(obtener_ruta_perfil(nombre_perfil), PROFILE_CONFIG_FILE)
+    with open(ruta_config, 'w') as f:
+        json.dump(config, f, indent=4)
+
+def aplicar_resolucion_camara(cap, config):
+    """Pide a la cámara la resolución configurada (si la hay)."""
+    if config.get('resolucion_camara'):
+        ancho, alto = config['resolucion_camara']
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+
+def abrir_camara(config=None, indice=0):
+    """Abre la cámara con la resolución configurada."""
+    cap = cv2.VideoCapture(indice)
+    if config and cap.isOpened():
+        aplicar_resolucion_camara(cap, config)
+    return cap
+
+# --- ESTIMACIÓN DE POSE CON RECORTE (ROI) ---
+
+class PoseEstimator:
+    """
+    Envoltorio de MediaPipe Pose con resolución de inferencia configurable y modo de seguimiento:
+    con `seguimiento_roi`, la imagen que recibe MediaPipe es un recorte con margen alrededor de la
+    cabeza y el torso detectados en frames anteriores. Los landmarks devueltos se expresan siempre
+    en coordenadas del frame completo. Si en el recorte no se detecta a nadie, se vuelve al frame completo.
+    """
+    # Cara (0-10), hombros (11, 12), codos (13, 14) y caderas (23, 24)
+    ROI_LANDMARKS = list(range(0, 15)) + [23, 24]
+
+    def __init__(self, model_complexity=1, resolucion_inferencia=None, seguimiento_roi=False, margen_roi=0.3,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        self.pose = cargar_mediapipe().Pose(model_complexity=model_complexity, min_detection_confidence=min_detection_confidence,
+                                            min_tracking_confidence=min_tracking_confidence)
+        self.resolucion_inferencia = resolucion_inferencia
+        self.seguimiento_roi = seguimiento_roi
+        self.margen_roi = margen_roi
+        self.roi = None  # (x0, y0, x1, y1) en píxeles del frame completo
+
+    @classmethod
+    def desde_config(cls, config):
+        return cls(model_complexity=config['model_complexity'], resolucion_inferencia=config['resolucion_inferencia'],
+                   seguimiento_roi=config['seguimiento_roi'], margen_roi=config['margen_roi'])
+
+    def process(self, img_rgb):
+        """Igual que Pose.process, con los landmarks en coordenadas normalizadas del frame completo."""
+        h, w = img_rgb.shape[:2]
+
+        if self.seguimiento_roi and self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            results = self._procesar_region(img_rgb[y0:y1, x0:x1], x0, y0, w, h)
+            if results.pose_landmarks:
+                self._actualizar_roi(results.pose_landmarks, w, h)
+                return results
+            # Seguimiento perdido: se vuelve a buscar en el frame completo
+            self.roi = None
+
+        results = self._procesar_region(img_rgb, 0, 0, w, h)
+        if results.pose_landmarks and self.seguimiento_roi:
+            self._actualizar_roi(results.pose_landmarks, w, h)
+        return results
+
+    def _procesar_region(self, region, x0, y0, w, h):
+        rh, rw = region.shape[:2]
+        entrada = region
+        if self.resolucion_inferencia and max(rw, rh) > self.resolucion_inferencia:
+            escala = self.resolucion_inferencia / max(rw, rh)
+            entrada = cv2.resize(region, (max(1, int(rw * escala)), max(1, int(rh * escala))), interpolation=cv2.INTER_AREA)
+
+        results = self.pose.process(np.ascontiguousarray(entrada))
+
+        # Las coordenadas son relativas a la región: se pasan al frame completo (el escalado no las afecta)
+        if results.pose_landmarks and (rw, rh) != (w, h):
+            for lm in results.pose_landmarks.landmark:
+                lm.x = (lm.x * rw + x0) / w
+                lm.y = (lm.y * rh + y0) / h
+                lm.z = lm.z * rw / w
+        return results
+
+    def _actualizar_roi(self, pose_landmarks, w, h):
+        """Recalcula el recorte solo si la cabeza/torso se acercan a su borde, para que sea estable."""
+        landmarks = pose_landmarks.landmark
+        xs = [landmarks[i].x * w for i in self.ROI_LANDMARKS]
+        ys = [landmarks[i].y * h for i in self.ROI_LANDMARKS]
+        bx0, bx1, by0, by1 = min(xs), max(xs), min(ys), max(ys)
+        margen = self.margen_roi * max(bx1 - bx0, by1 - by0)
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            interior = margen / 2
+            if bx0 - interior >= x0 and by0 - interior >= y0 and bx1 + interior <= x1 and by1 + interior <= y1:
+                return
+
+        x0, y0 = max(0, int(bx0 - margen)), max(0, int(by0 - margen))
+        x1, y1 = min(w, int(bx1 + margen)), min(h, int(by1 + margen))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 16 and y1 - y0 > 16 else None
+
+    def calentar(self, shape=(480, 640, 3)):
+        """
+        Ejecuta una inferencia sobre un frame gris para que el primer frame real no pague la
+        inicialización del grafo de MediaPipe. Devuelve los segundos que tardó.
+        """
+        t0 = time.perf_counter()
+        self.process(np.full(shape, 128, dtype=np.uint8))
+        self.reset()
+        return time.perf_counter() - t0
+
+    def reset(self):
+        """Olvida el seguimiento (recorte y estado interno de MediaPipe), p.ej. al saltar en un vídeo."""
+        self.roi = None
+        if hasattr(self.pose, 'reset'):
+            self.pose.reset()
+
+    def close(self):
+        self.pose.close()
+
+
+class PoseWarmup(threading.Thread):
+    """
+    Crea y calienta un PoseEstimator en segundo plano (importando mediapipe si hace falta), para
+    que la ventana aparezca sin esperar a MediaPipe. `obtener(config)` espera a que termine y lo
+    entrega si se creó con la misma configuración de pose; si no, crea y calienta otro.
+    El estimador calentado se entrega una sola vez, bajo un lock, aunque lo pidan varios hilos.
+    """
+    POSE_KEYS = ('model_complexity', 'resolucion_inferencia', 'seguimiento_roi', 'margen_roi')
+
+    def __init__(self, config, shape=(480, 640, 3)):
+        super().__init__(daemon=True)
+        self.config = dict(config)
+        self.shape = shape
+        self.estimator = None
+        self.segundos = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            estimator = PoseEstimator.desde_config(self.config)
+            estimator.calentar(self.shape)
+        except Exception as e:
+            log.error(f"No se pudo inicializar MediaPipe Pose: {e}")
+            return
+        self.segundos = time.perf_counter() - t0
+        with self._lock:
+            self.estimator = estimator
+
+    def listo(self):
+        return self.ident is not None and not self.is_alive()
+
+    def tomar(self):
+        """Devuelve el PoseEstimator si ya está listo (sin esperar ni crear otro), o None."""
+        if not self.listo():
+            return None
+        return self._entregar()
+
+    def _entregar(self):
+        with self._lock:
+            estimator, self.estimator = self.estimator, None
+        return estimator
+
+    @classmethod
+    def es_compatible(cls, config_a, config_b):
+        """True si las dos configuraciones crean el mismo modelo de pose."""
+        return all(config_a.get(k) == config_b.get(k) for k in cls.POSE_KEYS)
+
+    def obtener(self, config):
+        """Devuelve un PoseEstimator caliente para `config` (el del hilo solo se entrega una vez)."""
+        if self.ident is not None:
+            self.join()
+        estimator = self._entregar()
+        if estimator is not None and self.es_compatible(self.config, config):
+            return estimator
+        if estimator is not None:
+            estimator.close()
+
+        estimator = PoseEstimator.desde_config(config)
+        estimator.calentar(self.shape)
+        return estimator
+
+# --- CACHÉ DE MODELOS ENTRENADOS ---
+
+def config_modelo_perfil(config):
+    """Parte de la configuración del perfil que determina el modelo entrenado (entra en su huella)."""
+    return {'features': FeaturePipeline(config['features']).config, 'validacion_cruzada': config['validacion_cruzada'],
+            'presupuesto_latencia_ms': config['presupuesto_latencia_ms'],
+            **{clave: config[clave] for clave in DATASET_CONFIG_KEYS}}
+
+def calcular_huella_entrenamiento(nombre_perfil, config_modelo=None):
+    """
+    Calcula una huella (hash) de los archivos de entrenamiento del perfil a partir de
+    su nombre, tamaño y fecha de modificación. Cambia si se añade, borra o modifica una sesión,
+    o si cambia la configuración del modelo (pipeline de features, modo de entrenamiento...).
+    """
+    ruta_perfil = obtener_ruta_perfil(nombre_perfil)
+    archivos_entrenamiento = listar_archivos_entrenamiento(ruta_perfil)
+
+    h = hashlib.sha1(f"v{MODEL_CACHE_VERSION}".encode())
+    h.update(json.dumps(config_modelo, sort_keys=True).encode())
+    for archivo in archivos_entrenamiento:
+        st = os.stat(archivo)
+        h.update(f"{os.path.basename(archivo)}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+def cargar_modelo_cache(nombre_perfil, huella):
+    """Devuelve el modelo guardado del perfil si su huella coincide, o None si hay que reentrenar."""
+    ruta_modelo = os.path.join(obtener_ruta_perfil(nombre_perfil), MODEL_CACHE_FILE)
+    if not os.path.exists(ruta_modelo):
+        return None
+
+    try:
+        with open(ruta_modelo, 'rb') as f:
+            data_cache = pickle.load(f)
+    except Exception as e:
+        log.error(f"No se pudo leer el modelo en caché: {e}")
+        return None
+
+    if data_cache.get('huella') != huella:
+        return None
+    return data_cache.get('modelo')
+
+def guardar_modelo_cache(nombre_perfil, modelo, huella):
+    """Guarda el modelo entrenado junto a la huella de los datos con los que se entrenó."""
+    ruta_modelo = os.path.join(obtener_ruta_perfil(nombre_perfil), MODEL_CACHE_FILE)
+    ruta_temporal = ruta_modelo + '.tmp'
+
+    # Escritura atómica: un cierre a mitad de escritura no deja un modelo corrupto
+    with open(ruta_temporal, 'wb') as f:
+        pickle.dump({'huella': huella, 'modelo': modelo}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(ruta_temporal, ruta_modelo)
+
+# --- MODELO EXPORTADO (SIN SKLEARN) ---
+#
+# Tras entrenar, model_training exporta el bosque aplanado a PERFILES/<perfil>/modelo_exportado/
+# con la huella del entrenamiento. Si la huella sigue siendo la de los datos actuales, el detector
+# lo carga directamente (mapeado en memoria) sin importar sklearn ni deserializar el pickle.
+
+def cargar_modelo_exportado(nombre_perfil, huella, umbrales_float16=False):
+    """FlatForest exportado del perfil si corresponde a `huella` y al tipo de umbrales pedido; si no, None."""
+    ruta_exportacion = os.path.join(obtener_ruta_perfil(nombre_perfil), MODEL_EXPORT_DIR)
+    if not os.path.exists(ruta_exportacion):
+        return None
+
+    try:
+        modelo = FlatForest.cargar(ruta_exportacion)
+    except Exception as e:
+        log.error(f"No se pudo leer el modelo exportado: {e}")
+        return None
+
+    if modelo.metadatos_.get('huella') != huella or (modelo.threshold.dtype == np.float16) != bool(umbrales_float16):
+        return None
+    return modelo
+
+def exportar_modelo(nombre_perfil, modelo, huella, umbrales_float16=False):
+    """Exporta un RandomForestClassifier (o FlatForest) entrenado junto a la huella de sus datos."""
+    if not isinstance(modelo, FlatForest):
+        modelo = FlatForest.desde_sklearn(modelo)
+    ruta_exportacion = os.path.join(obtener_ruta_perfil(nombre_perfil), MODEL_EXPORT_DIR)
+    modelo.guardar(ruta_exportacion, umbrales_float16=umbrales_float16, metadatos={'huella': huella})
+
+def cargar_clasificador_perfil(nombre_perfil):
+    """
+    Clasificador (FlatForest) del perfil para detectar. Si el modelo exportado está al día se carga
+    sin importar sklearn; si no, se entrena (o se toma de la caché) con model_training, que lo
+    exporta para la próxima vez. Devuelve None si no hay datos suficientes.
+    """
+    config = cargar_config_perfil(nombre_perfil)
+    huella = calcular_huella_entrenamiento(nombre_perfil, config_modelo_perfil(config))
+    clasificador = cargar_modelo_exportado(nombre_perfil, huella, config['umbrales_float16'])
+    if clasificador is not None:
+        log.info("Modelo exportado cargado (sin sklearn).")
+        return clasificador
+
+    # sklearn solo se importa si hay que entrenar
+    from model_training import entrenar_modelo_rf
+    modelo_rf = entrenar_modelo_rf(nombre_perfil)
+    if modelo_rf is None:
+        return None
+    clasificador = cargar_modelo_exportado(nombre_perfil, huella, config['umbrales_float16'])
+    return clasificador if clasificador is not None else FlatForest.desde_sklearn(modelo_rf)
 
 # --- EXTRACCIÓN DE FEATURES ML ---
 
+# Vector crudo que se guarda en las sesiones; el modelo recibe su transformación por FeaturePipeline
+NUM_FEATURES = NUM_LANDMARKS * 3
+
+class FeatureExtractor:
+    """
+    Extrae las coordenadas X, Y, Z (y opcionalmente la visibilidad) de los 33 landmarks
+    directamente en un buffer float32 preasignado, sin crear listas ni arrays por frame.
+    """
+    def __init__(self, incluir_visibilidad=False):
+        self.incluir_visibilidad = incluir_visibilidad
+        self.componentes = 4 if incluir_visibilidad else 3
+        self.n_features = NUM_LANDMARKS * self.componentes
+        self._buffer = np.zeros(self.n_features, dtype=np.float32)
+        # Escribir escalares a través de un memoryview es mucho más barato que hacerlo con numpy
+        self._vista = memoryview(self._buffer)
+
+    def extraer(self, landmarks):
+        """
+        Rellena el buffer con los landmarks y devuelve una vista (n_features,) de él, o None si no
+        hay una detección completa. La vista se sobrescribe en la siguiente llamada: si hay que
+        conservar el vector, el llamador debe copiarlo.
+        """
+        if landmarks is None or len(landmarks) != NUM_LANDMARKS:
+            return None
+
+        vista = self._vista
+        i = 0
+        if self.incluir_visibilidad:
+            for res in landmarks:
+                vista[i] = res.x
+                vista[i + 1] = res.y
+                vista[i + 2] = res.z
+                vista[i + 3] = res.visibility
+                i += 4
+        else:
+            for res in landmarks:
+                vista[i] = res.x
+                vista[i + 1] = res.y
+                vista[i + 2] = res.z
+                i += 3
+        return self._buffer
+
 def extraer_features(landmarks):
     """
-    Extrae las 33 coordenadas X, Y, Z normalizadas de los landmarks y las concatena 
-    en un vector de 99 elementos (nuestro vector de características para ML).
+    Extrae las 33 coordenadas X, Y, Z normalizadas de los landmarks y las concatena
+    en un vector float32 de 99 elementos (la entrada de FeaturePipeline).
+    Devuelve un array nuevo, o None si no hay detección. En el bucle por frame es
+    preferible reutilizar un FeatureExtractor.
     """
-    
-    try:
-        # Crea un array numpy de 99 elementos (33 * 3)
-        features = np.array([[res.x, res.y, res.z] for res in landmarks]).flatten().tolist()
-        return features
-    except:
-        # Devuelve un vector de ceros si la detección falla
-        return [0.0] * 99
+    features = FeatureExtractor().extraer(landmarks)
+    return None if features is None else features.copy()
+
+def dibujar_landmarks_rgb(img_rgb, pose_landmarks):
+    """Dibuja el esqueleto sobre un frame RGB con los mismos colores que draw_landmarks sobre BGR."""
+    mp_pose = cargar_mediapipe()
+    mp_drawing, estilo_landmarks, estilo_conexiones = cargar_dibujo_mediapipe()
+    mp_drawing.draw_landmarks(img_rgb, pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                              landmark_drawing_spec=estilo_landmarks, connection_drawing_spec=estilo_conexiones)
 
 def clasificar_postura(prediccion_ml):
     """Clasifica la postura basada en el resultado del modelo ML."""
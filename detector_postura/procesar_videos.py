@@ -0,0 +1,192 @@
+import argparse
+import csv
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from app_logging import configurar_logging
+
+log = logging.getLogger(__name__)
+
+# --- MODO POR LOTES (SIN GUI) ---
+#
+# Puntúa vídeos grabados (o carpetas de imágenes) con el modelo de un perfil usando todos los
+# núcleos: cada proceso del pool tiene su propia instancia de MediaPipe Pose, y los vídeos largos
+# se reparten en segmentos de frames para que varios procesos trabajen sobre el mismo archivo.
+#
+#   python procesar_videos.py grabacion1.mp4 grabacion2.mp4 --perfil Escritorio --salida puntuaciones.csv
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+DEFAULT_SEGMENT_FRAMES = 900  # ~30 s a 30 FPS por tarea
+
+# Estado por proceso del pool (se crea una vez en el inicializador)
+_pose = None
+_extractor = None
+_flujo = None
+_clasificador = None
+
+def _inicializar_worker(clasificador, config_pose):
+    """Crea la instancia de Pose y el extractor de este proceso."""
+    global _pose, _extractor, _flujo, _clasificador
+    from feature_pipeline import FeaturePipeline
+    from posture_logic import PoseEstimator, FeatureExtractor
+
+    configurar_logging() # Con 'spawn' (Windows, macOS) el proceso arranca sin log configurado
+    _pose = PoseEstimator.desde_config(config_pose)
+    _extractor = FeatureExtractor()
+    _flujo = FeaturePipeline.del_modelo(clasificador).flujo()
+    _clasificador = clasificador
+
+def _clasificar(img, espejo, timestamp):
+    """Devuelve (detectado, predicción, probabilidades) para un frame BGR."""
+    if espejo:
+        img = cv2.flip(img, 1)
+    results = _pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    if not results.pose_landmarks:
+        return False, '', None
+
+    features = _extractor.extraer(results.pose_landmarks.landmark)
+    if features is None:
+        return False, '', None
+    proba = _clasificador.predecir_proba_uno(_flujo.transformar_uno(features, timestamp))
+    return True, str(_clasificador.classes_[proba.argmax()]), proba
+
+def _procesar_segmento(tarea):
+    """Procesa los frames [inicio, fin) de una fuente. Devuelve la lista de filas del resultado."""
+    fuente, inicio, fin, fps, espejo = tarea
+
+    # El seguimiento de Pose y la ventana temporal no deben arrastrar estado del segmento anterior
+    _pose.reset()
+    _flujo.reset()
+
+    filas = []
+    if os.path.isdir(fuente):
+        imagenes = _listar_imagenes(fuente)[inicio:fin]
+        for i, ruta in enumerate(imagenes, start=inicio):
+            img = cv2.imread(ruta)
+            if img is None:
+                continue
+            detectado, prediccion, proba = _clasificar(img, espejo, i / fps)
+            filas.append((fuente, i, i / fps, detectado, prediccion, proba))
+        return filas
+
+    cap = cv2.VideoCapture(fuente)
+    if inicio:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+    for i in range(inicio, fin):
+        success, img = cap.read()
+        if not success:
+            break
+        detectado, prediccion, proba = _clasificar(img, espejo, i / fps)
+        filas.append((fuente, i, i / fps, detectado, prediccion, proba))
+    cap.release()
+    return filas
+
+def _listar_imagenes(carpeta):
+    return sorted(os.path.join(carpeta, n) for n in os.listdir(carpeta) if n.lower().endswith(IMAGE_EXTENSIONS))
+
+def generar_tareas(fuentes, segment_frames, fps_imagenes, espejo):
+    """Divide cada fuente en segmentos de como máximo `segment_frames` frames."""
+    tareas = []
+    for fuente in fuentes:
+        if os.path.isdir(fuente):
+            total, fps = len(_listar_imagenes(fuente)), fps_imagenes
+        else:
+            cap = cv2.VideoCapture(fuente)
+            if not cap.isOpened():
+                log.error(f"No se pudo abrir {fuente}")
+                continue
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.release()
+
+        for inicio in range(0, total, segment_frames):
+            tareas.append((fuente, inicio, min(inicio + segment_frames, total), fps, espejo))
+    return tareas
+
+class _EscritorCSV:
+    def __init__(self, ruta, clases):
+        self._f = open(ruta, 'w', newline='')
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(['fuente', 'frame', 'timestamp_s', 'detectado', 'prediccion'] + [f"prob_{c}" for c in clases])
+        self._n_clases = len(clases)
+
+    def escribir(self, filas):
+        for fuente, frame, ts, detectado, prediccion, proba in filas:
+            probas = [f"{p:.6f}" for p in proba] if proba is not None else [''] * self._n_clases
+            self._writer.writerow([fuente, frame, f"{ts:.3f}", int(detectado), prediccion] + probas)
+
+    def cerrar(self):
+        self._f.close()
+
+class _EscritorParquet:
+    """Acumula las filas y escribe el Parquet al cerrar (requiere pandas + pyarrow)."""
+    def __init__(self, ruta, clases):
+        import pandas  # Dependencia opcional: solo necesaria para la salida Parquet
+        self._pd = pandas
+        self._ruta = ruta
+        self._clases = clases
+        self._filas = []
+
+    def escribir(self, filas):
+        for fuente, frame, ts, detectado, prediccion, proba in filas:
+            fila = {'fuente': fuente, 'frame': frame, 'timestamp_s': ts, 'detectado': detectado, 'prediccion': prediccion}
+            for c, p in zip(self._clases, proba if proba is not None else [float('nan')] * len(self._clases)):
+                fila[f"prob_{c}"] = float(p)
+            self._filas.append(fila)
+
+    def cerrar(self):
+        self._pd.DataFrame(self._filas).to_parquet(self._ruta, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Puntúa vídeos o carpetas de imágenes con el modelo de postura de un perfil.")
+    parser.add_argument('fuentes', nargs='+', help="Archivos de vídeo o carpetas con imágenes (ordenadas por nombre).")
+    parser.add_argument('--perfil', required=True, help="Perfil cuyo modelo se usará.")
+    parser.add_argument('--salida', default='puntuaciones.csv', help="Archivo de salida (.csv o .parquet).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Procesos en paralelo (por defecto, todos los núcleos).")
+    parser.add_argument('--segmento', type=int, default=DEFAULT_SEGMENT_FRAMES, help="Frames por tarea al repartir un vídeo.")
+    parser.add_argument('--fps-imagenes', type=float, default=30.0, help="FPS para calcular timestamps en carpetas de imágenes.")
+    parser.add_argument('--model-complexity', type=int, choices=(0, 1, 2), help="Complejidad de MediaPipe Pose (por defecto, la del perfil).")
+    parser.add_argument('--sin-espejo', action='store_true', help="No voltear los frames (el detector los espeja como la webcam).")
+    args = parser.parse_args(argv)
+    configurar_logging()
+
+    from posture_logic import cargar_config_perfil, cargar_clasificador_perfil
+
+    # Misma configuración de pose (resolución, ROI, complejidad) que el detector para este perfil
+    config_pose = cargar_config_perfil(args.perfil)
+    if args.model_complexity is not None:
+        config_pose['model_complexity'] = args.model_complexity
+
+    clasificador = cargar_clasificador_perfil(args.perfil)
+    if clasificador is None:
+        log.error(f"El perfil '{args.perfil}' no tiene datos suficientes para entrenar.")
+        return 1
+    clases = [str(c) for c in clasificador.classes_]
+
+    tareas = generar_tareas(args.fuentes, args.segmento, args.fps_imagenes, not args.sin_espejo)
+    if not tareas:
+        log.error("No hay frames que procesar.")
+        return 1
+
+    escritor = _EscritorParquet(args.salida, clases) if args.salida.endswith('.parquet') else _EscritorCSV(args.salida, clases)
+    frames = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_inicializar_worker,
+                                 initargs=(clasificador, config_pose)) as pool:
+            # map conserva el orden de las tareas, así la salida queda ordenada por fuente y frame
+            for filas in pool.map(_procesar_segmento, tareas):
+                escritor.escribir(filas)
+                frames += len(filas)
+                log.info(f"{frames} frames procesados...")
+    finally:
+        escritor.cerrar()
+
+    log.info(f"{frames} frames puntuados. Resultados en {args.salida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from session_storage import FEATURE_DTYPE
+
+log = logging.getLogger(__name__)
+
+# --- CAPTURA EN STREAMING DE UNA SESIÓN DE ENTRENAMIENTO ---
+#
+# Mientras se captura, los vectores de features se copian en un buffer float32 preasignado por
+# clase y un hilo en segundo plano los añade cada `intervalo_volcado` segundos a un archivo crudo
+# por clase dentro de PERFILES/<perfil>/captura_en_curso/. La memoria queda acotada a lo capturado
+# entre dos volcados, y si la aplicación se cierra o falla a mitad de la captura lo ya volcado
+# sigue en disco: la captura se puede reanudar o guardar al volver a abrir el perfil.
+#
+#   captura_en_curso/captura.json     versión, n_features y clases ya completadas
+#   captura_en_curso/<CLASE>.f32      filas float32 (n_features) añadidas en orden
+
+CAPTURE_DIR = 'captura_en_curso'
+CAPTURE_META_FILE = 'captura.json'
+CAPTURE_VERSION = 1
+
+class FeatureBuffer:
+    """Matriz float32 (N, n_features) preasignada que crece por bloques de `filas_bloque` filas."""
+    def __init__(self, n_features, filas_bloque=512):
+        self.n_features = n_features
+        self.filas_bloque = filas_bloque
+        self._datos = np.empty((filas_bloque, n_features), dtype=FEATURE_DTYPE)
+        self.filas = 0
+
+    def append(self, vector):
+        if self.filas == len(self._datos):
+            nuevo = np.empty((len(self._datos) + self.filas_bloque, self.n_features), dtype=FEATURE_DTYPE)
+            nuevo[:self.filas] = self._datos[:self.filas]
+            self._datos = nuevo
+        self._datos[self.filas] = vector
+        self.filas += 1
+
+    def datos(self):
+        """Vista (sin copia) de las filas ocupadas."""
+        return self._datos[:self.filas]
+
+    def vaciar(self):
+        self.filas = 0
+
+
+def _ruta_captura(ruta_perfil):
+    return os.path.join(ruta_perfil, CAPTURE_DIR)
+
+def _leer_meta(ruta_captura):
+    with open(os.path.join(ruta_captura, CAPTURE_META_FILE), 'r') as f:
+        meta = json.load(f)
+    if meta.get('version') != CAPTURE_VERSION:
+        raise ValueError(f"versión de captura no soportada: {meta.get('version')}")
+    return meta
+
+def _filas_en_disco(ruta_captura, n_features):
+    """{clase: filas completas} de los archivos de la captura (ignora una fila a medio escribir)."""
+    bytes_fila = n_features * np.dtype(FEATURE_DTYPE).itemsize
+    filas = {}
+    for nombre in os.listdir(ruta_captura):
+        if nombre.endswith('.f32'):
+            filas[nombre[:-4]] = os.path.getsize(os.path.join(ruta_captura, nombre)) // bytes_fila
+    return filas
+
+def buscar_captura_interrumpida(ruta_perfil):
+    """
+    Devuelve {'n_features', 'clases_completadas', 'filas': {clase: N}} si el perfil tiene una
+    captura que no llegó a guardarse como sesión, o None. Las capturas vacías o ilegibles se borran.
+    """
+    ruta_captura = _ruta_captura(ruta_perfil)
+    if not os.path.isdir(ruta_captura):
+        return None
+    try:
+        meta = _leer_meta(ruta_captura)
+        filas = _filas_en_disco(ruta_captura, meta['n_features'])
+    except Exception as e:
+        log.error(f"Captura interrumpida ilegible, se descarta: {e}")
+        shutil.rmtree(ruta_captura, ignore_errors=True)
+        return None
+
+    if not any(filas.values()):
+        shutil.rmtree(ruta_captura, ignore_errors=True)
+        return None
+    return {'n_features': meta['n_features'], 'clases_completadas': meta['clases_completadas'], 'filas': filas}
+
+def descartar_captura(ruta_perfil):
+    """Borra la captura interrumpida del perfil, si la hay."""
+    shutil.rmtree(_ruta_captura(ruta_perfil), ignore_errors=True)
+
+
+class SessionCapture:
+    """
+    Captura de una sesión con volcado incremental a disco. `anadir()` se puede llamar desde el
+    hilo de inferencia; el resto de métodos, desde la GUI. Con reanudar=True se continúa la
+    captura interrumpida del perfil en lugar de empezar una nueva.
+    """
+    def __init__(self, ruta_perfil, n_features, reanudar=False, intervalo_volcado=0.5):
+        self.ruta = _ruta_captura(ruta_perfil)
+        self.n_features = n_features
+        self.intervalo_volcado = intervalo_volcado
+
+        if reanudar:
+            meta = _leer_meta(self.ruta)
+            if meta['n_features'] != n_features:
+                raise ValueError(f"la captura interrumpida tiene {meta['n_features']} features por frame (se esperaban {n_features})")
+            self.clases_completadas = list(meta['clases_completadas'])
+            self._filas_escritas = _filas_en_disco(self.ruta, n_features)
+            self._truncar_filas_incompletas()
+        else:
+            shutil.rmtree(self.ruta, ignore_errors=True)
+            os.makedirs(self.ruta)
+            self.clases_completadas = []
+            self._filas_escritas = {}
+            self._escribir_meta()
+
+        self._lock = threading.Lock()
+        self._pendientes = {}   # clase -> FeatureBuffer que llena el hilo de inferencia
+        self._libres = {}       # clase -> FeatureBuffer ya volcado, listo para el intercambio
+        self._archivos = {}
+        self._stop_event = threading.Event()
+        self._writer = threading.Thread(target=self._bucle_volcado, daemon=True)
+        self._writer.start()
+
+    def _truncar_filas_incompletas(self):
+        bytes_fila = self.n_features * np.dtype(FEATURE_DTYPE).itemsize
+        for clase, filas in self._filas_escritas.items():
+            ruta_clase = os.path.join(self.ruta, f"{clase}.f32")
+            if os.path.getsize(ruta_clase) != filas * bytes_fila:
+                with open(ruta_clase, 'r+b') as f:
+                    f.truncate(filas * bytes_fila)
+
+    def _escribir_meta(self):
+        ruta_meta = os.path.join(self.ruta, CAPTURE_META_FILE)
+        with open(ruta_meta + '.tmp', 'w') as f:
+            json.dump({'version': CAPTURE_VERSION, 'n_features': self.n_features,
+                       'clases_completadas': self.clases_completadas}, f)
+        os.replace(ruta_meta + '.tmp', ruta_meta)
+
+    def anadir(self, clase, features):
+        """Copia un vector de features al buffer de la clase (no toca el disco)."""
+        with self._lock:
+            buffer = self._pendientes.get(clase)
+            if buffer is None:
+                buffer = self._pendientes[clase] = FeatureBuffer(self.n_features)
+            buffer.append(features)
+
+    def filas(self, clase):
+        """Frames capturados de una clase (volcados + pendientes)."""
+        with self._lock:
+            buffer = self._pendientes.get(clase)
+            return self._filas_escritas.get(clase, 0) + (buffer.filas if buffer else 0)
+
+    def _bucle_volcado(self):
+        while not self._stop_event.wait(self.intervalo_volcado):
+            self._volcar()
+
+    def _volcar(self):
+        # Se intercambian los buffers bajo el lock y se escribe fuera de él: la inferencia nunca espera al disco
+        with self._lock:
+            pendientes, self._pendientes, self._libres = self._pendientes, self._libres, {}
+
+        for clase, buffer in pendientes.items():
+            if buffer.filas:
+                f = self._archivos.get(clase)
+                if f is None:
+                    f = self._archivos[clase] = open(os.path.join(self.ruta, f"{clase}.f32"), 'ab')
+                f.write(buffer.datos().tobytes())
+                f.flush()
+                with self._lock:
+                    self._filas_escritas[clase] = self._filas_escritas.get(clase, 0) + buffer.filas
+            buffer.vaciar()
+
+        with self._lock:
+            # Los buffers vaciados se reutilizan en el siguiente intercambio
+            for clase, buffer in pendientes.items():
+                self._libres.setdefault(clase, buffer)
+
+    def completar_clase(self, clase):
+        """Marca la etapa de una clase como terminada (se recuerda al reanudar)."""
+        if clase not in self.clases_completadas:
+            self.clases_completadas.append(clase)
+            self._escribir_meta()
+
+    def cerrar(self):
+        """Detiene el hilo de volcado, escribe lo pendiente y cierra los archivos. Los datos quedan en disco."""
+        if self._writer.is_alive():
+            self._stop_event.set()
+            self._writer.join()
+        self._volcar()
+        for f in self._archivos.values():
+            f.close()
+        self._archivos = {}
+
+    def cargar(self):
+        """Devuelve {clase: array float32 (N, n_features)} mapeado en memoria. Llamar tras cerrar()."""
+        datos = {}
+        for clase, filas in self._filas_escritas.items():
+            if filas:
+                datos[clase] = np.memmap(os.path.join(self.ruta, f"{clase}.f32"), dtype=FEATURE_DTYPE,
+                                         mode='r', shape=(filas, self.n_features))
+        return datos
+
+    def eliminar(self):
+        """Cierra la captura y borra sus archivos (tras guardarla como sesión o al descartarla)."""
+        self.cerrar()
+        shutil.rmtree(self.ruta, ignore_errors=True)
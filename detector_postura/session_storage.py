@@ -0,0 +1,455 @@
+import json
+import logging
+import os
+import re
+import struct
+import zipfile
+import zlib
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# --- FORMATO BINARIO DE SESIONES DE ENTRENAMIENTO ---
+#
+# Cada sesión se guarda como un .npz SIN compresión con un array float32 (N, n_features)
+# por clase ('PERFECTO', 'MALO', ...). Al no estar comprimido, cada array del zip es un
+# .npy contiguo que se puede mapear en memoria directamente (np.memmap) sin parsear nada.
+
+SESSION_EXTENSIONS = ('.npz', '.json')  # Por orden de preferencia si existen ambos
+FEATURE_DTYPE = np.float32
+
+_SESSION_REGEX = re.compile(r'^entrenamiento_(\d+)\.(npz|json)$')
+
+def listar_archivos_entrenamiento(ruta_perfil):
+    """
+    Devuelve las rutas de las sesiones de entrenamiento de un perfil, ordenadas por número.
+    Si una sesión existe en ambos formatos, se usa el binario (.npz).
+    """
+    if not os.path.isdir(ruta_perfil):
+        return []
+
+    sesiones = {}
+    for nombre in os.listdir(ruta_perfil):
+        match = _SESSION_REGEX.match(nombre)
+        if not match:
+            continue
+        numero, extension = int(match.group(1)), '.' + match.group(2)
+        actual = sesiones.get(numero)
+        if actual is None or SESSION_EXTENSIONS.index(extension) < SESSION_EXTENSIONS.index(os.path.splitext(actual)[1]):
+            sesiones[numero] = nombre
+
+    return [os.path.join(ruta_perfil, sesiones[n]) for n in sorted(sesiones)]
+
+def siguiente_numero_sesion(ruta_perfil):
+    """Devuelve el número para la próxima sesión (el mayor existente + 1)."""
+    numeros = [int(_SESSION_REGEX.match(os.path.basename(a)).group(1)) for a in listar_archivos_entrenamiento(ruta_perfil)]
+    return max(numeros, default=0) + 1
+
+def _a_matriz(frames):
+    """Convierte una lista de vectores (o un array) en una matriz float32 contigua 2D."""
+    matriz = np.asarray(frames, dtype=FEATURE_DTYPE)
+    if matriz.size == 0:
+        return np.empty((0, matriz.shape[-1] if matriz.ndim == 2 else 0), dtype=FEATURE_DTYPE)
+    return np.ascontiguousarray(matriz.reshape(len(matriz), -1))
+
+def guardar_sesion_npz(ruta_completa, data_sesion):
+    """Escribe una sesión {clase: frames} en formato .npz sin comprimir (escritura atómica)."""
+    arrays = {clase: _a_matriz(frames) for clase, frames in data_sesion.items()}
+    ruta_temporal = ruta_completa + '.tmp'
+
+    with open(ruta_temporal, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(ruta_temporal, ruta_completa)
+
+def _mapear_miembro_npz(f, ruta, info):
+    """Mapea en memoria un miembro .npy (no comprimido) de un .npz, sin copiar los datos."""
+    # La cabecera local del zip mide 30 bytes + nombre + campo extra
+    f.seek(info.header_offset)
+    cabecera_local = f.read(30)
+    largo_nombre, largo_extra = struct.unpack('<HH', cabecera_local[26:30])
+    f.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(ruta, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+def cargar_sesion_npz(ruta_completa, mmap=True):
+    """
+    Carga una sesión .npz como {clase: array float32}. Con mmap=True los arrays son vistas
+    de solo lectura mapeadas en memoria; los datos se leen del disco solo al usarlos.
+    """
+    if not mmap:
+        with np.load(ruta_completa) as npz:
+            return {clase: npz[clase] for clase in npz.files}
+
+    data_sesion = {}
+    with zipfile.ZipFile(ruta_completa) as zf, open(ruta_completa, 'rb') as f:
+        for info in zf.infolist():
+            clase = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                # Un .npz comprimido (p.ej. creado a mano con savez_compressed) no se puede mapear
+                with np.load(ruta_completa) as npz:
+                    return {c: npz[c] for c in npz.files}
+            data_sesion[clase] = _mapear_miembro_npz(f, ruta_completa, info)
+    return data_sesion
+
+def cargar_sesion_json(ruta_completa):
+    """Carga una sesión en el formato JSON antiguo como {clase: array float32}."""
+    with open(ruta_completa, 'r') as f:
+        data_sesion = json.load(f)
+    return {clase: _a_matriz(frames) for clase, frames in data_sesion.items()}
+
+def cargar_sesion(ruta_completa, mmap=True):
+    """Carga una sesión en cualquiera de los dos formatos."""
+    if ruta_completa.endswith('.npz'):
+        return cargar_sesion_npz(ruta_completa, mmap=mmap)
+    return cargar_sesion_json(ruta_completa)
+
+def convertir_sesion_json(ruta_json, conservar_json=True):
+    """
+    Convierte una sesión JSON a .npz. El JSON original se renombra a .json.bak
+    (o se borra si conservar_json=False). Devuelve la ruta del nuevo archivo.
+    """
+    ruta_npz = os.path.splitext(ruta_json)[0] + '.npz'
+    guardar_sesion_npz(ruta_npz, cargar_sesion_json(ruta_json))
+
+    if conservar_json:
+        os.replace(ruta_json, ruta_json + '.bak')
+    else:
+        os.remove(ruta_json)
+    return ruta_npz
+
+def convertir_perfil_a_npz(ruta_perfil, conservar_json=True):
+    """Convierte todas las sesiones JSON de un perfil al formato binario. Devuelve cuántas convirtió."""
+    convertidas = 0
+    for nombre in sorted(os.listdir(ruta_perfil)):
+        match = _SESSION_REGEX.match(nombre)
+        if not match or match.group(2) != 'json':
+            continue
+        ruta_json = os.path.join(ruta_perfil, nombre)
+        try:
+            convertir_sesion_json(ruta_json, conservar_json=conservar_json)
+            convertidas += 1
+        except Exception as e:
+            log.error(f"No se pudo convertir {ruta_json}: {e}")
+    return convertidas
+
+# --- DATASET CONSOLIDADO INCREMENTAL ---
+#
+# Para no releer todas las sesiones en cada entrenamiento, cada perfil mantiene un dataset
+# consolidado por clase, con cuatro archivos crudos de la misma longitud:
+#   dataset_<CLASE>.f32   filas float32 (n_features)
+#   dataset_<CLASE>.ses   número de la sesión de origen de cada fila (int32)
+#   dataset_<CLASE>.frm   posición de la fila en su sesión (int32), para recalcular features temporales
+#   dataset_<CLASE>.key   clave de reservorio de cada fila (float64)
+# y un manifiesto JSON con las sesiones que ya contiene (nombre, tamaño y mtime) y el CRC32 de
+# cada archivo de columna. Al cargar
+# solo se leen las sesiones nuevas; si una sesión ya incluida cambia o desaparece, se quitan
+# sus filas conservando las del resto. Si el reservorio de una clase había descartado filas de
+# las sesiones que quedan, con quitar no basta (la clase se quedaría por debajo del tope con
+# filas que una reconstrucción sí tendría): en ese caso el dataset se reconstruye desde las sesiones.
+#
+# Tolerancia a cortes: el manifiesto se escribe (de forma atómica) después de los archivos de
+# columna. Si el proceso se corta entre medias, al cargar se recortan las filas añadidas de más y
+# se comprueban los CRC de lo que queda: si no coinciden (columnas reescritas sin que llegara el
+# manifiesto, o de dos generaciones distintas), el dataset se reconstruye desde las sesiones.
+#
+# Compactación, aplicada a cada sesión al incorporarla:
+#   - Se descartan los frames casi idénticos al último conservado (una captura de 10 s son
+#     ~300 frames de la misma postura).
+#   - Cada clase tiene un tope de `max_filas`. Por encima, el dataset es un reservorio ponderado
+#     (Efraimidis-Spirakis): cada fila recibe la clave log(u) / peso con u uniforme, y se quedan
+#     las `max_filas` de mayor clave. El peso de una sesión es 2 ** (número / vida_media): una
+#     sesión `vida_media` sesiones más reciente pesa el doble. Como los pesos relativos entre dos
+#     sesiones no cambian al llegar otras, las claves guardadas siguen valiendo y basta con
+#     fusionarlas con las de la sesión nueva: el coste de guardar una sesión es O(max_filas),
+#     no O(historial), y el tiempo de entrenamiento deja de crecer con el número de sesiones.
+
+DATASET_MANIFEST_FILE = 'dataset_manifest.json'
+DATASET_MANIFEST_VERSION = 4
+REQUIRED_CLASSES = ('PERFECTO', 'MALO')
+
+DATASET_MAX_ROWS_PER_CLASS = 6000 # Tope de filas por clase (None = sin tope)
+DEDUP_THRESHOLD = 0.002 # Cambio absoluto medio mínimo respecto al último frame conservado
+RECENCY_HALF_LIFE = 10 # Sesiones tras las que el peso de una sesión se reduce a la mitad (None = sin ponderar)
+
+_COLUMNAS = {'f32': FEATURE_DTYPE, 'ses': np.int32, 'frm': np.int32, 'key': np.float64}
+
+def _ruta_dataset_clase(ruta_perfil, clase, columna='f32'):
+    return os.path.join(ruta_perfil, f"dataset_{clase}.{columna}")
+
+def _manifiesto_vacio(compactacion):
+    return {'version': DATASET_MANIFEST_VERSION, 'n_features': None, 'filas': {}, 'crc': {}, 'sesiones': [],
+            'compactacion': compactacion}
+
+def _leer_manifiesto(ruta_perfil, compactacion):
+    """
+    Lee el manifiesto del dataset consolidado, o devuelve uno vacío si no existe, no es válido o
+    se creó con otros parámetros de compactación (en ese caso el dataset se reconstruye).
+    """
+    vacio = _manifiesto_vacio(compactacion)
+    ruta_manifiesto = os.path.join(ruta_perfil, DATASET_MANIFEST_FILE)
+    if not os.path.exists(ruta_manifiesto):
+        return vacio
+    try:
+        with open(ruta_manifiesto, 'r') as f:
+            manifiesto = json.load(f)
+    except Exception as e:
+        log.error(f"Manifiesto del dataset ilegible, se reconstruirá: {e}")
+        return vacio
+    if manifiesto.get('version') != DATASET_MANIFEST_VERSION:
+        return vacio
+    if compactacion is not None and manifiesto.get('compactacion') != compactacion:
+        log.info("Parámetros de compactación cambiados; reconstruyendo el dataset consolidado...")
+        return vacio
+    return manifiesto
+
+def _escribir_manifiesto(ruta_perfil, manifiesto):
+    ruta_manifiesto = os.path.join(ruta_perfil, DATASET_MANIFEST_FILE)
+    with open(ruta_manifiesto + '.tmp', 'w') as f:
+        json.dump(manifiesto, f, indent=1)
+    os.replace(ruta_manifiesto + '.tmp', ruta_manifiesto)
+
+def _mapear_dataset_clase(ruta_perfil, clase, filas, n_features, columna='f32'):
+    """Devuelve las primeras `filas` de una columna del dataset de una clase como vista mapeada en memoria."""
+    forma = (filas, n_features or 0) if columna == 'f32' else (filas,)
+    if filas == 0:
+        return np.empty(forma, dtype=_COLUMNAS[columna])
+    return np.memmap(_ruta_dataset_clase(ruta_perfil, clase, columna), dtype=_COLUMNAS[columna], mode='r', shape=forma)
+
+def _mapear_dataset(ruta_perfil, manifiesto):
+    return {clase: _mapear_dataset_clase(ruta_perfil, clase, filas, manifiesto['n_features'])
+            for clase, filas in manifiesto['filas'].items()}
+
+def _bytes_columna(manifiesto, filas, columna):
+    return filas * ((manifiesto['n_features'] or 0) if columna == 'f32' else 1) * np.dtype(_COLUMNAS[columna]).itemsize
+
+def _verificar_dataset(ruta_perfil, manifiesto):
+    """
+    Recorta las filas que una escritura interrumpida añadió tras el último manifiesto y comprueba
+    el CRC32 de cada columna. False si el contenido no es el que describe el manifiesto.
+    """
+    for clase, filas in manifiesto['filas'].items():
+        for columna in _COLUMNAS:
+            ruta_columna = _ruta_dataset_clase(ruta_perfil, clase, columna)
+            bytes_validos = _bytes_columna(manifiesto, filas, columna)
+            if not os.path.exists(ruta_columna) or os.path.getsize(ruta_columna) < bytes_validos:
+                return False
+            if os.path.getsize(ruta_columna) > bytes_validos:
+                with open(ruta_columna, 'r+b') as f:
+                    f.truncate(bytes_validos)
+            with open(ruta_columna, 'rb') as f:
+                crc = zlib.crc32(f.read())
+            if crc != manifiesto['crc'].get(clase, {}).get(columna):
+                return False
+    return True
+
+def _firma_archivo(ruta):
+    st = os.stat(ruta)
+    return st.st_size, st.st_mtime_ns
+
+def _numero_sesion(archivo):
+    return int(_SESSION_REGEX.match(os.path.basename(archivo)).group(1))
+
+def cargar_dataset_consolidado(ruta_perfil, max_filas=DATASET_MAX_ROWS_PER_CLASS, umbral_duplicados=DEDUP_THRESHOLD,
+                               vida_media=RECENCY_HALF_LIFE):
+    """
+    Devuelve {clase: array float32 (N, n_features)} con los datos compactados de todas las
+    sesiones del perfil que tienen las clases requeridas, actualizando el dataset consolidado
+    solo con las sesiones nuevas o modificadas. N <= max_filas por clase.
+    """
+    compactacion = {'max_filas': max_filas, 'umbral_duplicados': umbral_duplicados, 'vida_media': vida_media}
+    manifiesto = _leer_manifiesto(ruta_perfil, compactacion)
+    if not _verificar_dataset(ruta_perfil, manifiesto):
+        log.error("Dataset consolidado inconsistente (escritura interrumpida); reconstruyendo desde las sesiones...")
+        manifiesto = _manifiesto_vacio(compactacion)
+    archivos = listar_archivos_entrenamiento(ruta_perfil)
+    incluidas = {s['nombre']: s for s in manifiesto['sesiones']}
+
+    actuales = {}
+    for archivo in archivos:
+        tamano, mtime_ns = _firma_archivo(archivo)
+        actuales[os.path.basename(archivo)] = (archivo, tamano, mtime_ns)
+
+    # Sesiones ya incluidas que siguen intactas, y si el resto se puede añadir sin quitar nada
+    intactas = [s for s in manifiesto['sesiones']
+                if s['nombre'] in actuales and actuales[s['nombre']][1:] == (s['tamano'], s['mtime_ns'])]
+    solo_anadir = len(intactas) == len(manifiesto['sesiones'])
+    nuevas = [actuales[n] for n in actuales if n not in incluidas]
+
+    if solo_anadir and not nuevas:
+        return _mapear_dataset(ruta_perfil, manifiesto)
+
+    if not solo_anadir:
+        # Alguna sesión ya consolidada cambió o se borró: se quitan sus filas y se conservan las del resto
+        log.info("Sesiones de entrenamiento modificadas; reconstruyendo el dataset consolidado...")
+        if _reservorio_recortado(ruta_perfil, manifiesto, intactas):
+            # Al quitar filas, el reservorio volvería a admitir filas ya descartadas de las sesiones
+            # que quedan: solo releyéndolas el resultado es el mismo que el de una reconstrucción
+            manifiesto = _manifiesto_vacio(compactacion)
+            nuevas = list(actuales.values())
+        else:
+            manifiesto = _conservar_sesiones(ruta_perfil, manifiesto, intactas)
+            nuevas = [actuales[n] for n in actuales if n not in {s['nombre'] for s in intactas}]
+
+    _anadir_sesiones(ruta_perfil, manifiesto, nuevas)
+    _escribir_manifiesto(ruta_perfil, manifiesto)
+    log.info("Dataset consolidado: " + ", ".join(f"{clase} {filas} frames" for clase, filas in manifiesto['filas'].items())
+             + f" ({len(manifiesto['sesiones'])} sesiones).")
+    return _mapear_dataset(ruta_perfil, manifiesto)
+
+def sesiones_dataset_consolidado(ruta_perfil):
+    """
+    Devuelve {clase: array int32 (N,)} con el número de la sesión de origen de cada fila del
+    dataset consolidado, en el mismo orden que cargar_dataset_consolidado() (llamar después).
+    """
+    return _columna_dataset_consolidado(ruta_perfil, 'ses')
+
+def frames_dataset_consolidado(ruta_perfil):
+    """Como sesiones_dataset_consolidado(), con la posición de cada fila dentro de su sesión."""
+    return _columna_dataset_consolidado(ruta_perfil, 'frm')
+
+def _columna_dataset_consolidado(ruta_perfil, columna):
+    manifiesto = _leer_manifiesto(ruta_perfil, None)
+    return {clase: _mapear_dataset_clase(ruta_perfil, clase, filas, manifiesto['n_features'], columna)
+            for clase, filas in manifiesto['filas'].items()}
+
+def archivos_por_numero(ruta_perfil):
+    """{número de sesión: ruta del archivo} de las sesiones de entrenamiento del perfil."""
+    return {_numero_sesion(archivo): archivo for archivo in listar_archivos_entrenamiento(ruta_perfil)}
+
+def filtrar_duplicados(matriz, umbral):
+    """Índices de las filas que difieren de la última conservada en más de `umbral` (cambio absoluto medio)."""
+    if umbral is None or umbral <= 0 or len(matriz) < 2:
+        return np.arange(len(matriz))
+    conservadas = [0]
+    ultima = matriz[0]
+    for i in range(1, len(matriz)):
+        fila = matriz[i]
+        if np.abs(fila - ultima).mean() > umbral:
+            conservadas.append(i)
+            ultima = fila
+    return np.asarray(conservadas, dtype=np.intp)
+
+def claves_reservorio(nombre_sesion, clase, numero, n, vida_media):
+    """Claves log(u) / peso de `n` filas de una sesión (deterministas: dependen solo de la sesión y la clase)."""
+    rng = np.random.default_rng(zlib.crc32(f"{nombre_sesion}/{clase}".encode()))
+    u = 1.0 - rng.random(n)  # En (0, 1]: sin log(0)
+    peso = 1.0 if vida_media is None else 2.0 ** (numero / vida_media)
+    return np.log(u) / peso
+
+def _escribir_filas(ruta_perfil, manifiesto, clase, columnas, anadir):
+    """
+    Añade (o escribe desde cero) las filas de cada columna {columna: array} de una clase y
+    actualiza su CRC en el manifiesto (que el llamador escribe después).
+    """
+    crcs = manifiesto['crc'].setdefault(clase, {})
+    for columna, datos in columnas.items():
+        ruta = _ruta_dataset_clase(ruta_perfil, clase, columna)
+        contenido = np.ascontiguousarray(datos, dtype=_COLUMNAS[columna]).tobytes()
+        with open(ruta if anadir else ruta + '.tmp', 'ab' if anadir else 'wb') as f:
+            f.write(contenido)
+        crcs[columna] = zlib.crc32(contenido, crcs.get(columna, 0) if anadir else 0)
+    if not anadir:
+        # El llamador ya soltó sus mapas de estos archivos (necesario en Windows para reemplazarlos)
+        for columna in columnas:
+            ruta = _ruta_dataset_clase(ruta_perfil, clase, columna)
+            os.replace(ruta + '.tmp', ruta)
+
+def _reservorio_recortado(ruta_perfil, manifiesto, intactas):
+    """True si el reservorio de alguna clase descartó filas de las sesiones `intactas`."""
+    numeros = np.asarray([s['numero'] for s in intactas], dtype=np.int32)
+    for clase, filas in manifiesto['filas'].items():
+        candidatas = sum(s['frames'].get(clase, 0) for s in intactas)
+        if candidatas == 0:
+            continue
+        sesiones = _mapear_dataset_clase(ruta_perfil, clase, filas, manifiesto['n_features'], 'ses')
+        conservadas = int(np.count_nonzero(np.isin(sesiones, numeros)))
+        del sesiones
+        if conservadas < candidatas:
+            return True
+    return False
+
+def _conservar_sesiones(ruta_perfil, manifiesto, intactas):
+    """Reescribe los archivos por clase solo con las filas de las sesiones intactas."""
+    numeros = np.asarray([s['numero'] for s in intactas], dtype=np.int32)
+    nuevo = dict(manifiesto, filas={}, crc={}, sesiones=list(intactas))
+
+    for clase, filas in manifiesto['filas'].items():
+        mapas = {columna: _mapear_dataset_clase(ruta_perfil, clase, filas, manifiesto['n_features'], columna)
+                 for columna in _COLUMNAS}
+        seleccion = np.flatnonzero(np.isin(mapas['ses'], numeros))
+        columnas = {columna: mapa[seleccion] for columna, mapa in mapas.items()}
+        del mapas
+        _escribir_filas(ruta_perfil, nuevo, clase, columnas, anadir=False)
+        nuevo['filas'][clase] = len(seleccion)
+    return nuevo
+
+def _incorporar_clase(ruta_perfil, manifiesto, clase, matriz, numero, frames, claves):
+    """Añade las filas de una sesión (en las posiciones `frames` de la sesión) a una clase respetando el tope del reservorio."""
+    existentes = manifiesto['filas'].get(clase, 0)
+    max_filas = manifiesto['compactacion']['max_filas']
+    sesiones = np.full(len(matriz), numero, dtype=np.int32)
+
+    if max_filas is None or existentes + len(matriz) <= max_filas:
+        # La primera sesión de la clase se escribe desde cero (puede haber restos de un dataset anterior)
+        _escribir_filas(ruta_perfil, manifiesto, clase, {'f32': matriz, 'ses': sesiones, 'frm': frames, 'key': claves}, anadir=existentes > 0)
+        manifiesto['filas'][clase] = existentes + len(matriz)
+        return
+
+    # Reservorio lleno: se quedan las max_filas filas de mayor clave entre las guardadas y las nuevas
+    mapas = {columna: _mapear_dataset_clase(ruta_perfil, clase, existentes, manifiesto['n_features'], columna)
+             for columna in _COLUMNAS}
+    todas = np.concatenate([mapas['key'], claves])
+    elegidas = np.sort(np.argpartition(todas, len(todas) - max_filas)[len(todas) - max_filas:])
+    viejas, nuevas = elegidas[elegidas < existentes], elegidas[elegidas >= existentes] - existentes
+    columnas = {
+        'f32': np.concatenate([mapas['f32'][viejas], matriz[nuevas]]),
+        'ses': np.concatenate([mapas['ses'][viejas], sesiones[nuevas]]),
+        'frm': np.concatenate([mapas['frm'][viejas], frames[nuevas]]),
+        'key': todas[elegidas],
+    }
+    del mapas
+    _escribir_filas(ruta_perfil, manifiesto, clase, columnas, anadir=False)
+    manifiesto['filas'][clase] = max_filas
+
+def _anadir_sesiones(ruta_perfil, manifiesto, nuevas):
+    """Lee las sesiones nuevas, las compacta y las incorpora a los archivos por clase."""
+    compactacion = manifiesto['compactacion']
+    for archivo, tamano, mtime_ns in nuevas:
+        numero = _numero_sesion(archivo)
+        registro = {'nombre': os.path.basename(archivo), 'numero': numero, 'tamano': tamano, 'mtime_ns': mtime_ns, 'frames': {}}
+        try:
+            data_sesion = cargar_sesion(archivo)
+        except Exception as e:
+            log.error(f"Error al leer archivo {archivo}: {e}")
+            continue
+
+        if all(clase in data_sesion for clase in REQUIRED_CLASSES):
+            for clase, matriz in data_sesion.items():
+                if len(matriz) == 0:
+                    continue
+                if manifiesto['n_features'] is None:
+                    manifiesto['n_features'] = matriz.shape[1]
+                if matriz.shape[1] != manifiesto['n_features']:
+                    log.error(f"{archivo}: {matriz.shape[1]} features por frame (se esperaban {manifiesto['n_features']}); se ignora la clase {clase}.")
+                    continue
+
+                matriz = np.asarray(matriz, dtype=FEATURE_DTYPE)
+                frames = filtrar_duplicados(matriz, compactacion['umbral_duplicados'])
+                matriz = matriz[frames]
+                claves = claves_reservorio(registro['nombre'], clase, numero, len(matriz), compactacion['vida_media'])
+                _incorporar_clase(ruta_perfil, manifiesto, clase, matriz, numero, frames, claves)
+                registro['frames'][clase] = len(matriz)
+
+        # Las sesiones sin las clases requeridas se registran igualmente para no releerlas
+        manifiesto['sesiones'].append(registro)
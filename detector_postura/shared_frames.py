@@ -0,0 +1,150 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# --- RING BUFFER DE FRAMES EN MEMORIA COMPARTIDA ---
+#
+# El proceso de captura escribe cada frame directamente en uno de los `n_slots` huecos de un
+# bloque de multiprocessing.shared_memory, y los procesos de inferencia lo leen como una vista
+# NumPy sobre ese mismo bloque: los frames nunca se serializan ni se copian entre procesos.
+#
+# Distribución del bloque:
+#   cabecera  int64[8]          ultimo_seq, alto, ancho, canales, n_slots, cerrado, leido, -
+#   slot_seq  int64[n_slots]    seq del frame en cada hueco (-1 mientras se está escribiendo)
+#   slot_ts   float64[n_slots]  instante de captura de cada frame
+#   frames    uint8[n_slots, alto, ancho, canales] (alineado a 64 bytes)
+#
+# El frame `seq` va al hueco seq % n_slots. Un lector que tarde más de n_slots - 1 frames en usar
+# una vista puede encontrarse el hueco reescrito: `vigente(seq)` permite comprobarlo al terminar.
+
+_HEADER_FIELDS = 8
+_ULTIMO, _ALTO, _ANCHO, _CANALES, _N_SLOTS, _CERRADO, _LEIDO = range(7)
+_ALIGN = 64
+
+def _alinear(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+class SharedFrameRing:
+    """Ring buffer de frames uint8 (alto, ancho, canales) con números de secuencia, en memoria compartida."""
+    def __init__(self, shm, propietario):
+        self._shm = shm
+        self.propietario = propietario
+        buf = shm.buf
+
+        self._cabecera = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self.n_slots = int(self._cabecera[_N_SLOTS])
+        self.shape = (int(self._cabecera[_ALTO]), int(self._cabecera[_ANCHO]), int(self._cabecera[_CANALES]))
+
+        offset = _HEADER_FIELDS * 8
+        self._slot_seq = np.ndarray((self.n_slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += self.n_slots * 8
+        self._slot_ts = np.ndarray((self.n_slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset = _alinear(offset + self.n_slots * 8)
+        self._frames = np.ndarray((self.n_slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=offset)
+        self._seq_escritura = int(self._cabecera[_ULTIMO])
+
+    @property
+    def nombre(self):
+        return self._shm.name
+
+    @classmethod
+    def crear(cls, shape, n_slots=4):
+        """Reserva el bloque compartido para frames de `shape` (alto, ancho, canales)."""
+        alto, ancho, canales = shape
+        tamano = _alinear(_HEADER_FIELDS * 8 + n_slots * 16) + n_slots * alto * ancho * canales
+        shm = shared_memory.SharedMemory(create=True, size=tamano)
+
+        cabecera = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        cabecera[:] = 0
+        cabecera[_ALTO], cabecera[_ANCHO], cabecera[_CANALES], cabecera[_N_SLOTS] = alto, ancho, canales, n_slots
+        np.ndarray((n_slots,), dtype=np.int64, buffer=shm.buf, offset=_HEADER_FIELDS * 8)[:] = -1
+        del cabecera
+        return cls(shm, propietario=True)
+
+    @classmethod
+    def abrir(cls, nombre):
+        """Se conecta a un ring creado por otro proceso."""
+        return cls(shared_memory.SharedMemory(name=nombre), propietario=False)
+
+    # --- Escritura (un único proceso de captura) ---
+
+    def reservar(self):
+        """Devuelve la vista del hueco del siguiente frame para escribir en él. Llamar luego a publicar()."""
+        seq = self._seq_escritura + 1
+        slot = seq % self.n_slots
+        self._slot_seq[slot] = -1
+        return self._frames[slot]
+
+    def publicar(self, timestamp):
+        """Hace visible a los lectores el frame escrito en el hueco reservado. Devuelve su seq."""
+        seq = self._seq_escritura + 1
+        slot = seq % self.n_slots
+        self._slot_ts[slot] = timestamp
+        self._slot_seq[slot] = seq
+        self._cabecera[_ULTIMO] = seq
+        self._seq_escritura = seq
+        return seq
+
+    def esperar_lectura(self, timeout=0.1, sondeo=0.001):
+        """
+        Espera hasta `timeout` a que el lector haya tomado el último frame publicado. Sirve para
+        procesar un vídeo completo sin descartar frames. Devuelve True si ya lo tomó.
+        """
+        limite = time.perf_counter() + timeout
+        while self._cabecera[_LEIDO] < self._seq_escritura:
+            if time.perf_counter() >= limite:
+                return False
+            time.sleep(sondeo)
+        return True
+
+    def cerrar_escritura(self):
+        """Indica a los lectores que la fuente terminó (fin de vídeo o captura detenida)."""
+        self._cabecera[_CERRADO] = 1
+
+    # --- Lectura (uno o varios procesos) ---
+
+    @property
+    def ultimo_seq(self):
+        return int(self._cabecera[_ULTIMO])
+
+    @property
+    def cerrado(self):
+        return bool(self._cabecera[_CERRADO])
+
+    def leer_ultimo(self, despues_de=0, marcar=True):
+        """
+        Devuelve (seq, timestamp, vista) del frame más reciente si es posterior a `despues_de`,
+        o None. La vista apunta a la memoria compartida: no se copia. Con varios lectores,
+        solo uno debe marcar los frames como leídos (ver esperar_lectura()).
+        """
+        seq = int(self._cabecera[_ULTIMO])
+        if seq <= despues_de:
+            return None
+        slot = seq % self.n_slots
+        timestamp = float(self._slot_ts[slot])
+        if int(self._slot_seq[slot]) != seq:
+            return None  # El hueco ya se está reescribiendo con un frame más nuevo
+        if marcar:
+            self._cabecera[_LEIDO] = seq
+        return seq, timestamp, self._frames[slot]
+
+    def esperar(self, despues_de=0, timeout=0.1, sondeo=0.001, marcar=True):
+        """Como leer_ultimo(), pero espera hasta `timeout` segundos a que llegue un frame nuevo."""
+        limite = time.perf_counter() + timeout
+        while True:
+            frame = self.leer_ultimo(despues_de, marcar=marcar)
+            if frame is not None or self.cerrado or time.perf_counter() >= limite:
+                return frame
+            time.sleep(sondeo)
+
+    def vigente(self, seq):
+        """True si el hueco del frame `seq` no se ha reescrito desde que se leyó."""
+        return int(self._slot_seq[seq % self.n_slots]) == seq
+
+    def close(self):
+        """Suelta las vistas y desconecta este proceso del bloque; el propietario además lo libera."""
+        self._cabecera = self._slot_seq = self._slot_ts = self._frames = None
+        self._shm.close()
+        if self.propietario:
+            self._shm.unlink()
@@ -0,0 +1,426 @@
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from app_logging import configurar_logging
+
+log = logging.getLogger(__name__)
+
+# --- MOTOR MULTICÁMARA / MULTIPERFIL ---
+#
+# Ejecuta N fuentes a la vez (cámaras o vídeos), cada una con su perfil y su modelo. Cada stream
+# tiene un proceso de captura y otro de inferencia con su propia instancia de MediaPipe Pose,
+# comunicados por un ring buffer en memoria compartida, así que nada compite por el GIL y el
+# rendimiento escala con los núcleos. Un supervisor en el proceso principal recoge
+# periódicamente el estado, los landmarks, una miniatura y las latencias de cada stream.
+#
+#   python stream_engine.py --fuente 0:Escritorio --fuente 1:Laboratorio
+#   python stream_engine.py --fuente grabacion1.mp4:Escritorio --fuente grabacion2.mp4:Oficina --salida estado.json
+#
+# Los vídeos se procesan completos lo más rápido posible (útil para medir el escalado); con
+# --tiempo-real se leen al ritmo de sus FPS, como si fueran cámaras, y se descartan los frames
+# que la inferencia no alcance a procesar.
+
+STATE_INTERVAL = 0.5     # Segundos entre envíos de estado de cada worker
+METRICS_WINDOW = 10.0    # Segundos por ventana de latencias en cada worker
+
+THUMBNAIL_WIDTH = 160    # Ancho de la miniatura que cada stream envía al supervisor
+RING_SLOTS = 4           # Huecos del ring buffer de frames de cada stream
+DEFAULT_CAMERA_SIZE = (640, 480)
+
+class StreamSpec:
+    """Una fuente (índice de cámara o ruta de vídeo) asociada a un perfil."""
+    __slots__ = ('nombre', 'fuente', 'perfil', 'espejo')
+
+    def __init__(self, nombre, fuente, perfil, espejo=True):
+        self.nombre = nombre
+        self.fuente = fuente
+        self.perfil = perfil
+        self.espejo = espejo
+
+    @property
+    def es_camara(self):
+        return isinstance(self.fuente, int)
+
+    @classmethod
+    def desde_texto(cls, texto, espejo=True):
+        """Interpreta 'FUENTE:PERFIL' (p.ej. '0:Escritorio' o 'videos/a.mp4:Oficina')."""
+        fuente, separador, perfil = texto.rpartition(':')
+        if not separador or not fuente or not perfil:
+            raise ValueError(f"fuente no válida '{texto}' (formato FUENTE:PERFIL)")
+        fuente = int(fuente) if fuente.isdigit() else fuente
+        nombre = f"cam{fuente}" if isinstance(fuente, int) else os.path.basename(fuente)
+        return cls(f"{nombre}@{perfil}", fuente, perfil, espejo=espejo)
+
+
+# --- PROCESOS DE CAPTURA E INFERENCIA (DOS POR STREAM) ---
+#
+# La captura escribe los frames ya espejados en un SharedFrameRing y la inferencia los lee como
+# vistas sobre la memoria compartida. Al supervisor solo vuelven el estado, los landmarks y una
+# miniatura, nunca frames completos.
+
+def _abrir_fuente(spec, config):
+    from posture_logic import abrir_camara
+
+    if spec.es_camara:
+        return abrir_camara(config, indice=spec.fuente)
+    return cv2.VideoCapture(spec.fuente)
+
+def tamano_fuente(spec, config):
+    """(alto, ancho, canales) de los frames de la fuente, para dimensionar su ring buffer."""
+    if not spec.es_camara:
+        cap = cv2.VideoCapture(spec.fuente)
+        ancho, alto = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if ancho <= 0 or alto <= 0:
+            raise ValueError(f"no se pudo abrir el vídeo {spec.fuente}")
+        return alto, ancho, 3
+    ancho, alto = config.get('resolucion_camara') or DEFAULT_CAMERA_SIZE
+    return alto, ancho, 3
+
+def ejecutar_captura(spec, config, nombre_ring, stop_event, tiempo_real=False):
+    """Proceso de captura: lee la fuente y escribe cada frame en el ring sin copias intermedias."""
+    from shared_frames import SharedFrameRing
+
+    configurar_logging() # Proceso 'spawn': arranca sin la configuración de log del supervisor
+    ring = SharedFrameRing.abrir(nombre_ring)
+    alto, ancho = ring.shape[:2]
+    cap = _abrir_fuente(spec, config)
+    if not cap.isOpened():
+        log.error(f"{spec.nombre}: no se pudo abrir la fuente {spec.fuente}")
+    fps_video = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    inicio = time.time()
+    leidos = 0
+    vista = None
+
+    try:
+        while cap.isOpened() and not stop_event.is_set():
+            vista = ring.reservar()
+            # Si la fuente entrega frames del tamaño del ring, OpenCV decodifica directamente en él
+            success, img = cap.read(vista)
+            if not success:
+                if spec.es_camara:
+                    time.sleep(0.01)
+                    continue
+                break  # Fin del vídeo
+
+            if img.shape != vista.shape:
+                cv2.resize(img, (ancho, alto), dst=vista, interpolation=cv2.INTER_AREA)
+            elif not np.shares_memory(img, vista):
+                vista[:] = img
+            if spec.espejo:
+                cv2.flip(vista, 1, dst=vista)
+
+            # En vídeos el tiempo es el del propio vídeo; en cámaras, el reloj real
+            timestamp = time.time() if spec.es_camara else leidos / fps_video
+            leidos += 1
+            if tiempo_real and not spec.es_camara:
+                espera = inicio + timestamp - time.time()
+                if espera > 0:
+                    time.sleep(espera)
+            elif not spec.es_camara:
+                # Vídeo a máxima velocidad: se espera a la inferencia para no descartar ningún frame
+                while not ring.esperar_lectura() and not stop_event.is_set():
+                    pass
+            del img
+            ring.publicar(timestamp)
+    finally:
+        ring.cerrar_escritura()
+        cap.release()
+        del vista
+        ring.close()
+
+def _miniatura(img_rgb):
+    alto, ancho = img_rgb.shape[:2]
+    return cv2.resize(img_rgb, (THUMBNAIL_WIDTH, max(1, alto * THUMBNAIL_WIDTH // ancho)), interpolation=cv2.INTER_AREA)
+
+def _landmarks_a_array(pose_landmarks):
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark], dtype=np.float32)
+
+def _estado_worker(spec, estado, frames, tiempos, metricas, terminado=False, error=None, **extra):
+    return dict({
+        'stream': spec.nombre,
+        'perfil': spec.perfil,
+        'estado': estado,
+        'frames': frames,
+        'tiempo_bueno': tiempos.bueno,
+        'tiempo_malo': tiempos.malo,
+        'metricas': metricas.resumen(),
+        'terminado': terminado,
+        'error': error,
+        'pid': os.getpid(),
+    }, **extra)
+
+def ejecutar_inferencia(spec, clasificador, config, nombre_ring, estados, stop_event):
+    """Proceso de inferencia: pose, features, predicción y filtro sobre los frames del ring."""
+    from instrumentation import DetectorMetrics
+    from feature_pipeline import FeaturePipeline
+    from posture_logic import PoseEstimator, FeatureExtractor, nuevo_filtro_prediccion, ContadorTiempos
+    from shared_frames import SharedFrameRing
+
+    configurar_logging()
+    ring = SharedFrameRing.abrir(nombre_ring)
+    metricas = DetectorMetrics(intervalo_exportacion=METRICS_WINDOW)
+    pose_estimator = PoseEstimator.desde_config(config)
+    extractor = FeatureExtractor()
+    feature_stream = FeaturePipeline.del_modelo(clasificador).flujo()
+    prediction_filter = nuevo_filtro_prediccion(clasificador.classes_)
+
+    tiempos = ContadorTiempos()
+    contadores = {'descartados': 0, 'reescritos': 0}
+    ultimo_envio = 0.0
+    ultimo_seq = 0
+    ultimo_ts = None
+    frames = 0
+    estado = 'Buscando'
+    landmarks = None
+    img_rgb = None
+    reloj = time.perf_counter_ns
+
+    try:
+        while not stop_event.is_set():
+            frame = ring.esperar(ultimo_seq, timeout=0.1)
+            if frame is None:
+                if ring.cerrado and ring.ultimo_seq <= ultimo_seq:
+                    break  # La fuente terminó y no quedan frames por procesar
+                continue
+
+            seq, timestamp, vista = frame
+            t1 = reloj()
+            # La conversión de color es la única lectura del frame compartido (y la copia que usa MediaPipe)
+            img_rgb = cv2.cvtColor(vista, cv2.COLOR_BGR2RGB)
+            del frame, vista
+            if not ring.vigente(seq):
+                contadores['reescritos'] += 1
+                ultimo_seq = seq
+                continue
+            contadores['descartados'] += seq - ultimo_seq - 1
+            ultimo_seq = seq
+            metricas.registrar('captura', reloj() - t1)
+
+            results = pose_estimator.process(img_rgb)
+            t2 = reloj()
+            metricas.registrar('pose', t2 - t1)
+
+            estado = 'Buscando'
+            if results.pose_landmarks:
+                landmarks = results.pose_landmarks
+                features = extractor.extraer(landmarks.landmark)
+                if features is not None:
+                    probabilidades = clasificador.predecir_proba_uno(feature_stream.transformar_uno(features, timestamp))
+                    prediction_filter.add_prediction(clasificador.classes_[probabilidades.argmax()], probabilidades, timestamp)
+                    estado = prediction_filter.get_dominant_prediction()
+                    metricas.registrar('clasificador', reloj() - t2)
+            else:
+                landmarks = None
+
+            # Mismo criterio de conteo que el detector: se acumula el tiempo del frame en el estado
+            # filtrado, y el tiempo sin nadie delante de la cámara no cuenta
+            delta = 0.0 if ultimo_ts is None else timestamp - ultimo_ts
+            ultimo_ts = timestamp
+            if estado != 'Buscando':
+                tiempos.registrar(estado, delta)
+
+            frames += 1
+            metricas.registrar('inferencia', reloj() - t1)
+            metricas.tick()
+
+            ahora = time.time()
+            if ahora - ultimo_envio >= STATE_INTERVAL:
+                ultimo_envio = ahora
+                estados.put(_estado_worker(spec, estado, frames, tiempos, metricas, capturados=seq, **contadores,
+                                           landmarks=_landmarks_a_array(landmarks) if landmarks else None,
+                                           miniatura=_miniatura(img_rgb)))
+    except Exception as e:
+        estados.put(_estado_worker(spec, 'ERROR', frames, tiempos, metricas, terminado=True, error=str(e)))
+        raise
+    finally:
+        pose_estimator.close()
+        ring.close()
+
+    estados.put(_estado_worker(spec, estado, frames, tiempos, metricas, terminado=True, capturados=ultimo_seq,
+                               **contadores, landmarks=None, miniatura=_miniatura(img_rgb) if img_rgb is not None else None))
+
+
+# --- SUPERVISOR (PROCESO PRINCIPAL) ---
+
+class StreamSupervisor:
+    """
+    Crea el ring buffer de cada stream, lanza sus procesos de captura e inferencia y mantiene en
+    `self.estados` el último estado recibido de cada uno.
+    Los modelos se entrenan (o se leen de la caché) aquí, una vez por perfil, y se envían a cada
+    worker como FlatForest, que no necesita sklearn para predecir.
+    """
+    def __init__(self, specs, tiempo_real=False):
+        nombres = [spec.nombre for spec in specs]
+        if len(set(nombres)) != len(nombres):
+            raise ValueError("hay streams repetidos (misma fuente y perfil)")
+        self.specs = specs
+        self.tiempo_real = tiempo_real
+        # 'spawn': cada worker arranca limpio e inicializa su propio MediaPipe
+        self._ctx = mp.get_context('spawn')
+        self._estados_queue = self._ctx.Queue()
+        self._stop_event = self._ctx.Event()
+        self.procesos = {}   # stream -> (proceso de captura, proceso de inferencia)
+        self.rings = {}
+        self.estados = {}
+        self.inicio = None
+
+    def _preparar_perfiles(self):
+        from posture_logic import cargar_config_perfil, cargar_clasificador_perfil
+
+        perfiles = {}
+        for perfil in sorted({spec.perfil for spec in self.specs}):
+            clasificador = cargar_clasificador_perfil(perfil)
+            if clasificador is None:
+                raise ValueError(f"el perfil '{perfil}' no tiene datos suficientes para entrenar")
+            perfiles[perfil] = (clasificador, cargar_config_perfil(perfil))
+        return perfiles
+
+    def start(self):
+        from shared_frames import SharedFrameRing
+
+        perfiles = self._preparar_perfiles()
+        self.inicio = time.time()
+        for spec in self.specs:
+            clasificador, config = perfiles[spec.perfil]
+            ring = SharedFrameRing.crear(tamano_fuente(spec, config), n_slots=RING_SLOTS)
+            self.rings[spec.nombre] = ring
+
+            captura = self._ctx.Process(target=ejecutar_captura, name=f"{spec.nombre}/captura", daemon=True,
+                                        args=(spec, config, ring.nombre, self._stop_event, self.tiempo_real))
+            inferencia = self._ctx.Process(target=ejecutar_inferencia, name=f"{spec.nombre}/inferencia", daemon=True,
+                                           args=(spec, clasificador, config, ring.nombre, self._estados_queue, self._stop_event))
+            inferencia.start()
+            captura.start()
+            self.procesos[spec.nombre] = (captura, inferencia)
+            self.estados[spec.nombre] = {'stream': spec.nombre, 'perfil': spec.perfil, 'estado': 'Iniciando',
+                                         'frames': 0, 'terminado': False}
+            log.info(f"Stream {spec.nombre} iniciado (captura pid {captura.pid}, inferencia pid {inferencia.pid}).")
+
+    def recoger(self, timeout=0.5):
+        """Recibe los estados pendientes (esperando hasta `timeout` al primero). Devuelve cuántos recibió."""
+        recibidos = 0
+        try:
+            estado = self._estados_queue.get(timeout=timeout)
+            while True:
+                self._actualizar(estado)
+                recibidos += 1
+                estado = self._estados_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Un worker que muere sin avisar (p.ej. un fallo nativo de MediaPipe) se marca como error
+        for nombre, (_, inferencia) in self.procesos.items():
+            estado = self.estados[nombre]
+            if not inferencia.is_alive() and not estado['terminado']:
+                estado.update(estado='ERROR', terminado=True, error=f"el proceso terminó con código {inferencia.exitcode}")
+        return recibidos
+
+    def _actualizar(self, estado):
+        anterior = self.estados.get(estado['stream'], {})
+        if estado['estado'] == 'MALO' and anterior.get('estado') != 'MALO':
+            log.warning(f"{estado['stream']}: postura incorrecta.")
+        if estado.get('error'):
+            log.error(f"{estado['stream']}: {estado['error']}")
+        self.estados[estado['stream']] = estado
+
+    def activo(self):
+        return any(not estado['terminado'] for estado in self.estados.values())
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        limite = time.time() + timeout
+        while self.activo() and time.time() < limite:
+            self.recoger(timeout=0.1)
+        for procesos in self.procesos.values():
+            for proceso in procesos:
+                proceso.join(timeout=max(0.0, limite - time.time()))
+                if proceso.is_alive():
+                    proceso.terminate()
+        # Con todos los procesos fuera, se libera la memoria compartida
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+    def resumen(self):
+        """Estado final por stream y rendimiento agregado (frames por segundo de todos los streams)."""
+        duracion = max(time.time() - self.inicio, 1e-6) if self.inicio else 0.0
+        frames = sum(estado.get('frames', 0) for estado in self.estados.values())
+        return {
+            'duracion_s': duracion,
+            'frames_totales': frames,
+            'fps_agregado': frames / duracion if duracion else 0.0,
+            # Landmarks y miniaturas son para la interfaz; no van al resumen
+            'streams': {nombre: {k: v for k, v in estado.items() if k not in ('landmarks', 'miniatura')}
+                        for nombre, estado in self.estados.items()},
+        }
+
+
+def formatear_estados(estados):
+    """Una línea por stream para la consola."""
+    lineas = []
+    for nombre, estado in estados.items():
+        resumen = estado.get('metricas') or {}
+        pose = resumen.get('etapas', {}).get('pose', {})
+        lineas.append(f"{nombre:<28} {estado['estado']:<10} frames {estado.get('frames', 0):>7}"
+                      f"  FPS {resumen.get('fps_inferencia', 0.0):5.1f}  pose p95 {pose.get('p95_ms', 0.0):6.1f} ms")
+    return "\n".join(lineas)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detecta la postura en varias cámaras o vídeos a la vez, cada uno con su perfil.")
+    parser.add_argument('--fuente', action='append', required=True, metavar='FUENTE:PERFIL',
+                        help="Índice de cámara o ruta de vídeo y perfil (repetible).")
+    parser.add_argument('--duracion', type=float, help="Segundos de ejecución (por defecto, hasta Ctrl+C o fin de los vídeos).")
+    parser.add_argument('--tiempo-real', action='store_true', help="Leer los vídeos al ritmo de sus FPS, como cámaras.")
+    parser.add_argument('--sin-espejo', action='store_true', help="No voltear los frames.")
+    parser.add_argument('--salida', help="Guardar el resumen final (estado y latencias por stream) en JSON.")
+    args = parser.parse_args(argv)
+    configurar_logging()
+
+    try:
+        specs = [StreamSpec.desde_texto(texto, espejo=not args.sin_espejo) for texto in args.fuente]
+        supervisor = StreamSupervisor(specs, tiempo_real=args.tiempo_real)
+    except ValueError as e:
+        log.error(e)
+        return 1
+
+    try:
+        supervisor.start()
+    except ValueError as e:
+        log.error(e)
+        supervisor.stop()
+        return 1
+
+    ultimo_informe = 0.0
+    try:
+        while supervisor.activo():
+            supervisor.recoger(timeout=0.5)
+            if args.duracion and time.time() - supervisor.inicio >= args.duracion:
+                break
+            if time.time() - ultimo_informe >= 2.0:
+                ultimo_informe = time.time()
+                print(formatear_estados(supervisor.estados) + "\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+    resumen = supervisor.resumen()
+    print(formatear_estados(supervisor.estados))
+    log.info(f"{resumen['frames_totales']} frames en {resumen['duracion_s']:.1f} s ({resumen['fps_agregado']:.1f} FPS agregados).")
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resumen, f, indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import numpy as np
+
+# --- FEATURES TEMPORALES (VENTANA DESLIZANTE) ---
+#
+# El clasificador ve cada frame por separado; con una ventana de los últimos `ventana` frames se le
+# añade contexto temporal, útil para distinguir un encorvamiento lento de un movimiento puntual:
+#   - media y varianza de cada feature por frame en la ventana,
+#   - velocidad media de la cabeza y de los hombros (anchos de hombro por segundo),
+#   - fracción de la ventana con la cabeza baja (altura de la nariz sobre los hombros por debajo
+#     de `umbral_encorvado` anchos de hombro).
+#
+# En vivo, TemporalWindow guarda la ventana en un ring buffer NumPy preasignado y actualiza sumas,
+# sumas de cuadrados y contadores al entrar y salir cada frame: O(n_features) por frame, sin
+# recorrer la ventana. Para secuencias completas (sesiones de entrenamiento, grabaciones) el mismo
+# cálculo se hace vectorizado con sumas acumuladas. Si entre dos frames pasan más de `hueco_max`
+# segundos (nadie delante de la cámara), la ventana empieza de cero.
+#
+# Señales por frame que necesita la ventana, además de las features (ver FeaturePipeline):
+#   cabeza_x, cabeza_y, hombros_x, hombros_y (coordenadas de imagen), ancho de hombros, encorvado (0/1)
+
+DEFAULT_TEMPORAL_CONFIG = {
+    'ventana': 30,              # Frames de la ventana (~1 s a 30 FPS)
+    'umbral_encorvado': 0.45,   # Altura de la nariz sobre los hombros (anchos de hombro) por debajo de la cual cuenta como encorvado
+    'hueco_max': 2.0,           # Segundos sin frames tras los que la ventana se reinicia
+    'fps_sesiones': 30.0,       # Las sesiones guardadas no tienen timestamps: se asume este ritmo de captura
+}
+
+TEMPORAL_FEATURES = ('velocidad_cabeza', 'velocidad_hombros', 'fraccion_encorvado')
+N_SENALES = 6
+
+TEMPORAL_RESYNC_WRAPS = 100 # Vueltas del ring tras las que se recalculan las sumas desde cero (deriva de coma flotante)
+
+def pasos(senales, anterior=None):
+    """
+    Desplazamiento de cabeza y hombros respecto al frame anterior, en anchos de hombro: (N, 2).
+    `anterior` son las señales del frame previo a la secuencia (None = la secuencia empieza aquí).
+    """
+    posiciones = senales[:, :4]
+    previas = np.empty_like(posiciones)
+    previas[1:] = posiciones[:-1]
+    previas[0] = posiciones[0] if anterior is None else anterior[:4]
+    delta = (posiciones - previas).reshape(len(senales), 2, 2)
+    return np.linalg.norm(delta, axis=2) / senales[:, 4:5]
+
+def features_ventana(base, pasos_frame, encorvado, timestamps, ventana, hueco_max, n_contexto=0):
+    """
+    Features temporales de cada frame de una secuencia ordenada, vectorizado: (N - n_contexto, 2 * n + 3).
+    Las primeras `n_contexto` filas son frames anteriores que solo aportan ventana (no se devuelven).
+    """
+    n_total = len(base)
+    indices = np.arange(n_total)
+    pasos_frame = np.array(pasos_frame, dtype=np.float64)
+
+    # Inicio de cada tramo sin huecos; el primer frame de un tramo no se desplaza desde el anterior
+    corte = np.zeros(n_total, dtype=bool)
+    corte[0] = True
+    corte[1:] = np.diff(timestamps) > hueco_max
+    pasos_frame[corte] = 0.0
+    inicio_tramo = np.maximum.accumulate(np.where(corte, indices, 0))
+    inicio = np.maximum(indices - ventana + 1, inicio_tramo)[n_contexto:]
+    fin = indices[n_contexto:] + 1
+    n = (fin - inicio)[:, None]
+
+    base = np.asarray(base, dtype=np.float64)
+    suma = _acumulada(base)
+    cuadrados = _acumulada(base * base)
+    media = (suma[fin] - suma[inicio]) / n
+    varianza = np.maximum((cuadrados[fin] - cuadrados[inicio]) / n - media * media, 0.0)
+
+    # Desplazamiento dentro de la ventana: los pasos de (inicio, fin], sin el que llega al más antiguo
+    recorrido = _acumulada(pasos_frame)
+    desplazamiento = recorrido[fin] - recorrido[inicio + 1]
+    duracion = (timestamps[fin - 1] - timestamps[inicio])[:, None]
+    velocidad = np.divide(desplazamiento, duracion, out=np.zeros_like(desplazamiento), where=duracion > 0)
+
+    encorvados = _acumulada(np.asarray(encorvado, dtype=np.float64)[:, None])
+    fraccion = (encorvados[fin] - encorvados[inicio]) / n
+    return np.concatenate([media, varianza, velocidad, fraccion], axis=1).astype(np.float32)
+
+def _acumulada(x):
+    """Suma acumulada con una fila de ceros delante: la suma de [i, j) es s[j] - s[i]."""
+    s = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, out=s[1:])
+    return s
+
+
+class TemporalWindow:
+    """Ring buffer de los últimos `ventana` frames con estadísticas incrementales."""
+    def __init__(self, n_base, ventana=DEFAULT_TEMPORAL_CONFIG['ventana'], hueco_max=DEFAULT_TEMPORAL_CONFIG['hueco_max']):
+        self.n_base = n_base
+        self.ventana = ventana
+        self.hueco_max = hueco_max
+        self.n_features = 2 * n_base + len(TEMPORAL_FEATURES)
+
+        self._base = np.zeros((ventana, n_base))
+        self._pasos = np.zeros((ventana, 2))
+        self._encorvado = np.zeros(ventana)
+        self._timestamps = np.zeros(ventana)
+        self._suma = np.zeros(n_base)
+        self._cuadrados = np.zeros(n_base)
+        self._suma_pasos = np.zeros(2)
+        self._anterior = np.zeros(4)  # Posiciones de cabeza y hombros del último frame (válidas si n > 0)
+        self._salida = np.zeros(self.n_features, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self._pos = 0          # Hueco donde entra el próximo frame
+        self._vueltas = 0
+        self._recalcular()
+
+    def _orden(self):
+        """Índices del ring del frame más antiguo al más reciente."""
+        return (self._pos - self.n + np.arange(self.n)) % self.ventana
+
+    def _recalcular(self):
+        orden = self._orden()
+        base = self._base[orden]
+        self._suma[:] = base.sum(axis=0)
+        self._cuadrados[:] = (base * base).sum(axis=0)
+        self._suma_pasos[:] = self._pasos[orden].sum(axis=0)
+        self._n_encorvado = float(self._encorvado[orden].sum())
+
+    def actualizar(self, base, senales, timestamp):
+        """
+        Añade un frame (features por frame y señales) y devuelve sus features temporales. El vector
+        devuelto se sobrescribe en la siguiente llamada.
+        """
+        i = self._pos
+        if self.n and timestamp - self._timestamps[i - 1] > self.hueco_max:
+            self.reset()
+            i = 0
+
+        anterior = self._anterior
+        if self.n == 0:
+            paso_cabeza = paso_hombros = 0.0
+        else:
+            ancho = senales[4]
+            paso_cabeza = np.hypot(senales[0] - anterior[0], senales[1] - anterior[1]) / ancho
+            paso_hombros = np.hypot(senales[2] - anterior[2], senales[3] - anterior[3]) / ancho
+
+        if self.n == self.ventana:
+            # Sale el frame más antiguo (ocupa el hueco donde entra el nuevo)
+            viejo = self._base[i]
+            self._suma -= viejo
+            self._cuadrados -= viejo * viejo
+            self._suma_pasos -= self._pasos[i]
+            self._n_encorvado -= self._encorvado[i]
+        else:
+            self.n += 1
+
+        nuevo = self._base[i]
+        nuevo[:] = base
+        self._suma += nuevo
+        self._cuadrados += nuevo * nuevo
+        self._pasos[i] = (paso_cabeza, paso_hombros)
+        self._suma_pasos += self._pasos[i]
+        self._encorvado[i] = senales[5]
+        self._n_encorvado += senales[5]
+        self._timestamps[i] = timestamp
+        anterior[:] = senales[:4]
+
+        self._pos = (i + 1) % self.ventana
+        if self._pos == 0:
+            self._vueltas += 1
+            if self._vueltas % TEMPORAL_RESYNC_WRAPS == 0:
+                self._recalcular()
+        return self._calcular_salida(timestamp)
+
+    def _calcular_salida(self, timestamp):
+        n, n_base, salida = self.n, self.n_base, self._salida
+        media = self._suma / n
+        salida[:n_base] = media
+        salida[n_base:2 * n_base] = np.maximum(self._cuadrados / n - media * media, 0.0)
+
+        # El paso que llevó al frame más antiguo ya no cae dentro de la ventana
+        antiguo = (self._pos - n) % self.ventana
+        duracion = timestamp - self._timestamps[antiguo]
+        if duracion > 0:
+            salida[2 * n_base:2 * n_base + 2] = (self._suma_pasos - self._pasos[antiguo]) / duracion
+        else:
+            salida[2 * n_base:2 * n_base + 2] = 0.0
+        salida[-1] = self._n_encorvado / n
+        return salida
+
+    def actualizar_lote(self, base, senales, timestamps):
+        """
+        Como actualizar() frame a frame, pero vectorizado sobre un lote ordenado (N, ...): los frames
+        que ya hay en la ventana sirven de contexto. Devuelve (N, n_features).
+        """
+        if len(base) == 0:
+            return np.empty((0, self.n_features), dtype=np.float32)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        senales = np.asarray(senales, dtype=np.float64)
+        pasos_lote = pasos(senales, self._anterior if self.n else None)
+
+        # Los frames que ya estaban en la ventana van delante como contexto
+        orden = self._orden()
+        todos_base = np.concatenate([self._base[orden], base])
+        todos_pasos = np.concatenate([self._pasos[orden], pasos_lote])
+        todos_encorvado = np.concatenate([self._encorvado[orden], senales[:, 5]])
+        todos_ts = np.concatenate([self._timestamps[orden], timestamps])
+        salida = features_ventana(todos_base, todos_pasos, todos_encorvado, todos_ts,
+                                  self.ventana, self.hueco_max, n_contexto=len(orden))
+
+        # La ventana queda con los últimos frames del último tramo sin huecos. El paso del frame
+        # más antiguo no se usa, así que no importa que cruce un hueco
+        huecos = np.flatnonzero(np.diff(todos_ts) > self.hueco_max)
+        primero = max(len(todos_ts) - self.ventana, huecos[-1] + 1 if len(huecos) else 0)
+        k = len(todos_ts) - primero
+        self._base[:k] = todos_base[primero:]
+        self._pasos[:k] = todos_pasos[primero:]
+        self._encorvado[:k] = todos_encorvado[primero:]
+        self._timestamps[:k] = todos_ts[primero:]
+        self.n = k
+        self._pos = k % self.ventana
+        self._anterior[:] = senales[-1, :4]
+        self._recalcular()
+        return salida
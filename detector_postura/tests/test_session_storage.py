@@ -0,0 +1,126 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import session_storage
+from session_storage import (cargar_dataset_consolidado, sesiones_dataset_consolidado, frames_dataset_consolidado,
+                             guardar_sesion_npz, claves_reservorio, filtrar_duplicados)
+
+MAX_FILAS = 300
+N_FEATURES = 6
+
+def _guardar_sesion(ruta_perfil, numero, filas=200, semilla=None):
+    rng = np.random.default_rng(numero if semilla is None else semilla)
+    datos = {clase: rng.random((filas, N_FEATURES)).astype(np.float32) for clase in ('PERFECTO', 'MALO')}
+    guardar_sesion_npz(os.path.join(ruta_perfil, f"entrenamiento_{numero}.npz"), datos)
+
+def _contenido(ruta_perfil):
+    """{clase: (ses, frm, filas)} ordenado por sesión y frame: el orden de las filas no importa."""
+    datos = cargar_dataset_consolidado(ruta_perfil, max_filas=MAX_FILAS)
+    sesiones, frames = sesiones_dataset_consolidado(ruta_perfil), frames_dataset_consolidado(ruta_perfil)
+    contenido = {}
+    for clase in datos:
+        orden = np.lexsort((frames[clase], sesiones[clase]))
+        contenido[clase] = (np.array(sesiones[clase][orden]), np.array(frames[clase][orden]), np.array(datos[clase][orden]))
+    return contenido
+
+def _reconstruido(ruta_perfil, tmp_path):
+    """Contenido de un dataset construido desde cero con las mismas sesiones."""
+    limpio = tmp_path / 'desde_cero'
+    shutil.rmtree(limpio, ignore_errors=True)
+    limpio.mkdir()
+    for nombre in os.listdir(ruta_perfil):
+        if nombre.startswith('entrenamiento_'):
+            shutil.copy2(os.path.join(ruta_perfil, nombre), limpio / nombre)
+    return _contenido(str(limpio))
+
+def _iguales(a, b):
+    assert a.keys() == b.keys()
+    for clase in a:
+        for columna_a, columna_b in zip(a[clase], b[clase]):
+            np.testing.assert_array_equal(columna_a, columna_b)
+
+@pytest.fixture
+def perfil(tmp_path):
+    ruta = tmp_path / 'perfil'
+    ruta.mkdir()
+    for numero in (1, 2, 3):
+        _guardar_sesion(str(ruta), numero)
+    return str(ruta)
+
+
+def test_incremental_igual_a_reconstruccion(perfil, tmp_path):
+    _contenido(perfil)
+
+    _guardar_sesion(perfil, 4)
+    _iguales(_contenido(perfil), _reconstruido(perfil, tmp_path))
+
+    os.remove(os.path.join(perfil, 'entrenamiento_2.npz'))
+    _iguales(_contenido(perfil), _reconstruido(perfil, tmp_path))
+
+    _guardar_sesion(perfil, 3, filas=150, semilla=99)
+    _iguales(_contenido(perfil), _reconstruido(perfil, tmp_path))
+
+def test_tope_por_clase(perfil):
+    for numero in range(4, 9):
+        _guardar_sesion(perfil, numero)
+        for ses, _, filas in _contenido(perfil).values():
+            assert len(filas) == MAX_FILAS
+    # Las sesiones recientes pesan más: la última aporta más filas que la primera
+    ses = _contenido(perfil)['MALO'][0]
+    assert np.count_nonzero(ses == 8) > np.count_nonzero(ses == 1)
+
+def test_claves_y_duplicados_deterministas():
+    np.testing.assert_array_equal(claves_reservorio('entrenamiento_1.npz', 'MALO', 1, 50, 10),
+                                  claves_reservorio('entrenamiento_1.npz', 'MALO', 1, 50, 10))
+    matriz = np.repeat(np.arange(4, dtype=np.float32)[:, None], 3, axis=0).repeat(2, axis=1)
+    np.testing.assert_array_equal(filtrar_duplicados(matriz, 0.5), [0, 3, 6, 9])
+
+def test_recupera_escritura_interrumpida_antes_del_manifiesto(perfil, tmp_path, monkeypatch):
+    _contenido(perfil)
+    _guardar_sesion(perfil, 4)
+
+    def cortar(*args):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(session_storage, '_escribir_manifiesto', cortar)
+        with pytest.raises(KeyboardInterrupt):
+            cargar_dataset_consolidado(perfil, max_filas=MAX_FILAS)
+
+    # Las columnas ya se reescribieron (mismo tamaño) pero el manifiesto es el anterior
+    _iguales(_contenido(perfil), _reconstruido(perfil, tmp_path))
+
+def test_recupera_columnas_de_dos_generaciones(perfil, tmp_path, monkeypatch):
+    _contenido(perfil)
+    _guardar_sesion(perfil, 4)
+
+    reemplazar = os.replace
+    def cortar_en_la_segunda(origen, destino):
+        if str(destino).endswith('.ses'):
+            raise KeyboardInterrupt
+        reemplazar(origen, destino)
+    with monkeypatch.context() as m:
+        m.setattr(session_storage.os, 'replace', cortar_en_la_segunda)
+        with pytest.raises(KeyboardInterrupt):
+            cargar_dataset_consolidado(perfil, max_filas=MAX_FILAS)
+
+    _iguales(_contenido(perfil), _reconstruido(perfil, tmp_path))
+
+def test_recorta_filas_anadidas_sin_manifiesto(tmp_path, monkeypatch):
+    ruta = tmp_path / 'perfil'
+    ruta.mkdir()
+    perfil = str(ruta)
+    _guardar_sesion(perfil, 1, filas=50)
+    _contenido(perfil)
+    _guardar_sesion(perfil, 2, filas=50)
+
+    with monkeypatch.context() as m:
+        m.setattr(session_storage, '_escribir_manifiesto', lambda *args: None)
+        cargar_dataset_consolidado(perfil, max_filas=MAX_FILAS)
+
+    # Por debajo del tope las filas se añaden al final: se recortan y la sesión se añade una sola vez
+    contenido = _contenido(perfil)
+    assert len(contenido['MALO'][2]) == 100
+    _iguales(contenido, _reconstruido(perfil, tmp_path))